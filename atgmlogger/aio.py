@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import os
+import time
+import signal
+import asyncio
+import logging
+import threading
+
+from .dispatcher import Dispatcher, Batch, AppContext
+from .cpusched import apply_policy
+
+__all__ = ['AsyncDispatcher']
+LOG = logging.getLogger(__name__)
+
+
+class _LoopQueue:
+    """
+    Collector for the AsyncDispatcher, items are dispatched on the event
+    loop. Items put before the loop is running are held until it starts.
+
+    """
+    def __init__(self, dispatcher):
+        self._dispatcher = dispatcher
+        self._pending = []
+
+    def put_nowait(self, item):
+        dispatcher = self._dispatcher
+        loop = dispatcher.loop
+        if loop is None:
+            self._pending.append(item)
+        elif threading.get_ident() == dispatcher.loop_thread:
+            loop.call_soon(dispatcher.dispatch, item)
+        else:
+            loop.call_soon_threadsafe(dispatcher.dispatch, item)
+
+    put = put_nowait
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        for item in pending:
+            self._dispatcher.dispatch(item)
+
+    def task_done(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class AsyncDispatcher(Dispatcher):
+    """
+    Single threaded asyncio runtime for the dispatcher and plugins.
+
+    The serial port of each attached SerialListener is registered with the
+    event loop (loop.add_reader), so reading, framing and routing all happen
+    in the thread calling :meth:`run` (normally the main thread).
+
+    Plugins which define a coroutine `handle(item)` method (e.g. the
+    DataLogger) are run as tasks on the loop, and do not get a thread of
+    their own. Other (blocking) plugins are started in their own thread as
+    with the threaded Dispatcher, and as there daemon plugins are run by
+    the dispatcher's persistent worker pool.
+
+    As a threaded Dispatcher can only be started once, an AsyncDispatcher
+    can only be run once: on exit it closes the attached serial ports and
+    shuts down its worker pool. Create a new dispatcher to restart.
+
+    Parameters
+    ----------
+    max_workers : int, Optional
+        Size of the thread pool used to run daemon plugins
+    read_size : int, Optional
+        Maximum bytes read from a serial port per wakeup
+
+    See :class:`Dispatcher` for other parameters.
+
+    """
+    def __init__(self, collector=None, sigExit=None, encoding='utf-8',
+                 private_registry=False, name=None, max_workers=2,
+                 read_size=4096):
+        super().__init__(collector=collector, sigExit=sigExit,
+                         encoding=encoding, private_registry=private_registry,
+                         name=name, daemon_workers=max_workers)
+        if collector is None:
+            self._queue = _LoopQueue(self)
+            self._context = AppContext(self._queue, encoding=encoding)
+        self.read_size = read_size
+        self.loop = None  # type: asyncio.AbstractEventLoop
+        self.loop_thread = None
+        self._sources = []
+        self._tasks = []
+        self._coroutine_plugins = []
+        self._stopped = None  # type: asyncio.Event
+        self._timer = None  # type: asyncio.TimerHandle
+        self._timer_deadline = None
+        self._ran = False
+
+    def __call__(self, *args, **kwargs):
+        return self.run()
+
+    def get_instance_of(self, klass):
+        for obj in self._coroutine_plugins:
+            if isinstance(obj, klass):
+                return obj
+        return super().get_instance_of(klass)
+
+    def attach(self, listener):
+        """Attach a SerialListener, its port is read by the event loop.
+        The listener's collector should be this dispatcher's
+        message_queue."""
+        self._sources.append(listener)
+
+    def stats(self) -> dict:
+        return dict(items=self._tick, tasks=len(self._tasks),
+                    threads=len([t for t in self._threads if t.is_alive()]),
+                    daemons=self._workers.in_flight, wakeups=self.wakeups)
+
+    def exit(self, join=False):
+        self.sigExit.set()
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._stopped.set)
+            except RuntimeError:
+                pass
+        self._exit_threads(join=join)
+        if join and self.is_alive():
+            self.join()
+
+    def run(self):
+        if self._ran:
+            raise RuntimeError("An AsyncDispatcher can only be run once")
+        self._ran = True
+        self.acquire_lock(blocking=True)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main(loop))
+        finally:
+            loop.close()
+            self.loop = None
+            asyncio.set_event_loop(None)
+            self.release_lock()
+
+    async def _main(self, loop):
+        apply_policy('dispatcher')
+        self._stopped = asyncio.Event()
+        self.loop_thread = threading.get_ident()
+        self.loop = loop
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, self.exit)
+
+        for instance in self._create_plugins():
+            if asyncio.iscoroutinefunction(instance.handle):
+                instance.queue = asyncio.Queue()
+                self._tasks.append(loop.create_task(self._consume(instance)))
+                self._coroutine_plugins.append(instance)
+            else:
+                instance.start()
+                self._threads.add(instance)
+        LOG.debug("Async dispatcher running %d plugin tasks and %d plugin "
+                  "threads", len(self._tasks), len(self._threads))
+        self._setup_scheduler()
+        self._arm_timer()
+
+        fds = []
+        for listener in self._sources:
+            fd = listener.fileno()
+            os.set_blocking(fd, False)
+            loop.add_reader(fd, self._read, listener, fd)
+            fds.append(fd)
+        if isinstance(self._queue, _LoopQueue):
+            self._queue.flush()
+
+        if not self.sigExit.is_set():
+            await self._stopped.wait()
+
+        self._scheduler.stop_sources()
+        if self._timer is not None:
+            self._timer.cancel()
+        for fd in fds:
+            loop.remove_reader(fd)
+        for listener in self._sources:
+            listener.close()
+        for instance in self._coroutine_plugins:
+            instance.queue.put_nowait(None)
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+        self._exit_threads(join=False)
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+
+    async def _consume(self, instance):
+        queue = instance.queue
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            try:
+                await instance.handle(item)
+            except Exception:
+                LOG.exception("Exception in plugin %s handler",
+                              instance.__class__.__name__)
+        instance.close()
+
+    def _read(self, listener, fd):
+        self.wakeups += 1
+        try:
+            data = os.read(fd, self.read_size)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            LOG.error("Serial port %s disconnected, exiting.", listener.port)
+            self.loop.remove_reader(fd)
+            self.exit()
+            return
+        listener.ingest(data)
+
+    def dispatch(self, item):
+        """Route an item to the plugins (called on the event loop)"""
+        if item is None:
+            return
+        self._tick += 1
+        self._route(item)
+        self._count(item)
+        if self._scheduler.due():
+            self._poll_scheduler()
+        if not self._legacy_daemons:
+            return
+        if isinstance(item, Batch):
+            for line in item:
+                self._run_daemons(line)
+        else:
+            self._run_daemons(item)
+
+    def fire(self, event, data=None):
+        self._scheduler.fire(event, data)
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._on_event)
+
+    def _on_event(self):
+        self.wakeups += 1
+        self._poll_scheduler()
+
+    def _poll_scheduler(self):
+        for daemon, data in self._scheduler.poll():
+            self._start_daemon(daemon, data)
+        self._arm_timer()
+
+    def _arm_timer(self):
+        """(Re)schedule the loop callback for the next scheduler timer"""
+        deadline = self._scheduler.next_deadline()
+        if deadline == self._timer_deadline:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._timer_deadline = deadline
+        if deadline is not None:
+            self._timer = self.loop.call_later(
+                max(0, deadline - time.monotonic()), self._on_timer)
+
+    def _on_timer(self):
+        self.wakeups += 1
+        self._timer = None
+        self._timer_deadline = None
+        self._poll_scheduler()
+
+    def _run_daemons(self, item):
+        for daemon in self._legacy_daemons:
+            if not self._workers.busy(daemon) and daemon.condition(item):
+                self._start_daemon(daemon, item)
@@ -8,25 +8,46 @@ Gravity Systems' (DGS) AT1A and AT1M advanced technology gravity meters.
 
 """
 
+import os
 import time
 import queue
-import itertools
+import collections
 import logging
 import logging.config
 import signal
+import selectors
 import threading
 from pathlib import Path
 
 import serial
 
 from .runconfig import rcParams
-from .dispatcher import Dispatcher
+from .dispatcher import Dispatcher, Batch
+from .channels import PriorityChannel
+from .capture import RawCapture
+from .framing import LineFramer, get_framer, framer_text
+from .readers import InWaitingReader, get_reader
+from .sanitize import Sanitizer, ILLEGAL_BYTES
 from .plugins import load_plugin
+from .cpusched import apply_policy
+from .autotune import AutoTuner
 from . import POSIX, LOG_FMT, TRACE_LOG_FMT, DATE_FMT
 
 
 LOG = logging.getLogger('atgmlogger.main')
-ILLEGAL_CHARS = list(itertools.chain(range(0, 32), [255, 256]))
+_monotonic_ns = getattr(time, 'monotonic_ns',
+                        lambda: int(time.monotonic() * 1e9))
+_time_ns = getattr(time, 'time_ns', lambda: int(time.time() * 1e9))
+# Keys of the 'serial' config section consumed by the listener, these are not
+# passed through to the serial handle
+LISTENER_PARAMS = {'batch', 'binary', 'encoding', 'framer', 'sanitize',
+                   'reader', 'read_size', 'read_gap', 'vmin', 'process',
+                   'ring_size'}
+# Values of the 'logging.timestamps' setting (see DataLogger)
+TIMESTAMP_MODES = ('prefix', 'sidecar')
+# Keys of the 'logging' config section passed through to the DataLogger
+LOGGER_PARAMS = ('flush_lines', 'flush_bytes', 'flush_interval',
+                 'sync_interval', 'segments', 'compression')
 
 
 class SerialListener:
@@ -46,20 +67,57 @@ class SerialListener:
     handle : serial.Serial
     collector : queue.Queue, Optional
     sigExit : threading.Event, Optional
+    framer : Framer, Optional
+        Framer used to extract records from the raw data, default frames
+        newline terminated lines. Records from binary (non-text) framers are
+        pushed to the collector as bytes without sanitizing.
+    reader : InWaitingReader or PollReader, Optional
+        Read strategy used to retrieve data from the handle, default
+        queries in_waiting before each read
+    sanitizer : Sanitizer, Optional
+        Sanitize policy and encoding used to decode lines, default strips
+        illegal characters and decodes as utf-8
+    batch : bool, Optional
+        If True all lines framed from a single read are pushed to the
+        collector as one :class:`Batch`, instead of one item per line.
+    binary : bool, Optional
+        If True lines are sanitized but not decoded, and are pushed to the
+        collector as bytes. Decoding is left to the consumers which require
+        text.
+    timestamps : bool, Optional
+        If True the host monotonic and wall clock time is recorded
+        immediately after each read, and attached to the Batch of lines from
+        that read. Enabling timestamps implies batch mode.
+    capture : RawCapture, Optional
+        If specified every raw chunk read from the handle is passed to the
+        capture (with its receive timestamp) before framing or sanitizing.
+        The capture thread is stopped when the listener exits.
 
     """
 
-    def __init__(self, handle, collector=None, sigExit=None):
+    def __init__(self, handle, collector=None, sigExit=None, framer=None,
+                 reader=None, sanitizer=None, batch=False, binary=False,
+                 timestamps=False, capture=None):
         self._handle = handle
-        self._queue = collector or queue.Queue()
+        self._queue = collector or PriorityChannel()
         self.sigExit = sigExit or threading.Event()
-        self.buffer = bytearray()
+        self.framer = framer or LineFramer()
+        self.reader = reader or InWaitingReader(handle)
+        self.sanitizer = sanitizer or Sanitizer()
+        self.batch = batch or timestamps
+        self.binary = binary
+        self.timestamps = timestamps
+        self.capture = capture
+        self.rx_mono_ns = None
+        self.rx_wall_ns = None
+        self._pending = collections.deque()
 
         if not self._handle.is_open:
             self._handle.open()
 
     def exit(self):
         self.sigExit.set()
+        self.reader.wakeup()
         self._queue.put(None)
 
     @property
@@ -84,53 +142,442 @@ class SerialListener:
         separate thread to be processed.
 
         """
+        apply_policy('listener')
         while not self.exiting:
-            data = self.decode(self.readline())
-            if data is None or data == '':
-                continue
-            self._queue.put_nowait(data)
+            lines = self.readlines()
+            if lines:
+                self.emit(lines)
 
         LOG.debug("Exiting listener.listen() method, and closing serial "
                   "handle.")
-        self._handle.close()
+        self.close()
 
-    def readline(self):
+    def readlines(self):
         """
-        This method drastically reduces CPU usage of the utility (from ~50%
-        when reading 10hz gravity data to ~27% on a raspberry pi zero)
+        Perform a single read from the serial handle and return a list of all
+        complete lines which are now available (may be empty).
 
-        Credit for this function to skoehler (https://github.com/skoehler) from
+        Reading as many bytes as are available (rather than a line at a time)
+        drastically reduces CPU usage of the utility (from ~50% when reading
+        10hz gravity data to ~27% on a raspberry pi zero)
+
+        Credit for the original readline to skoehler
+        (https://github.com/skoehler) from
         https://github.com/pyserial/pyserial/issues/216
 
         """
-        i = self.buffer.find(b"\n")
-        if i >= 0:
-            line = self.buffer[:i + 1]
-            self.buffer = self.buffer[i + 1:]
-            return line
-        while True:
-            i = max(1, min(2048, self._handle.in_waiting))
-            data = self._handle.read(i)
-            i = data.find(b"\n")
-            if i >= 0:
-                line = self.buffer + data[:i + 1]
-                self.buffer[0:] = data[i + 1:]
-                return line
-            else:
-                self.buffer.extend(data)
+        return self.frame(self.reader.read())
+
+    def frame(self, data):
+        """Stamp and capture (if enabled) a chunk of raw data read from the
+        handle, and return the complete lines framed from it."""
+        if self.timestamps or self.capture is not None:
+            self.rx_mono_ns = _monotonic_ns()
+            self.rx_wall_ns = _time_ns()
+            if self.capture is not None and data:
+                self.capture.capture(data, self.rx_mono_ns, self.rx_wall_ns)
+        return self.framer.feed(data)
+
+    def emit(self, lines):
+        """Sanitize/decode framed lines and push them to the collector,
+        either individually or as a Batch."""
+        if not self.framer.text:
+            decode = bytes
+            item_type = bytes
+        elif self.binary:
+            decode = self.sanitizer.clean
+            item_type = bytes
+        else:
+            decode = self.sanitizer.decode
+            item_type = str
+        if self.batch:
+            batch = Batch((item for item in map(decode, lines) if item),
+                          item_type=item_type, rx_mono_ns=self.rx_mono_ns,
+                          rx_wall_ns=self.rx_wall_ns)
+            if batch:
+                self._queue.put_nowait(batch)
+            return
+        for line in lines:
+            data = decode(line)
+            if not data:
+                continue
+            self._queue.put_nowait(data)
+
+    def ingest(self, data):
+        """Frame a chunk of raw data read externally (e.g. by a
+        SerialMultiplexer) and push the resulting lines to the collector."""
+        lines = self.frame(data)
+        if lines:
+            self.emit(lines)
+
+    @property
+    def port(self):
+        return getattr(self._handle, 'port', None)
+
+    def fileno(self) -> int:
+        return self._handle.fileno()
+
+    def close(self):
+        self.reader.close()
+        self._handle.close()
+        if self.capture is not None:
+            self.capture.exit(join=True)
+
+    def readline(self):
+        """Block until a complete line is available and return it."""
+        while not self._pending:
+            self._pending.extend(self.readlines())
+        return self._pending.popleft()
 
     @staticmethod
     def decode(bytearr, encoding='utf-8'):
         if isinstance(bytearr, str):
             return bytearr
         try:
-            raw = bytes([c for c in bytearr if c not in ILLEGAL_CHARS])
-            decoded = raw.decode(encoding, errors='ignore').strip('\r\n')
-        except AttributeError:
+            raw = bytes(bytearr).translate(None, ILLEGAL_BYTES)
+            decoded = raw.decode(encoding, errors='ignore')
+        except TypeError:
             decoded = None
         return decoded
 
 
+class SerialMultiplexer:
+    """
+    Read several serial ports from a single thread.
+
+    All port file descriptors are registered with a selector, and data read
+    from a ready port is passed to that port's SerialListener (which frames,
+    sanitizes and pushes lines to its own collector/Dispatcher).
+
+    Parameters
+    ----------
+    listeners : List[SerialListener]
+        Listeners for each port, the handles must have a file descriptor
+    sigExit : threading.Event, Optional
+    read_size : int, Optional
+        Maximum bytes read from a port per wakeup
+
+    """
+    def __init__(self, listeners, sigExit=None, read_size=4096):
+        self.listeners = list(listeners)
+        self.sigExit = sigExit or threading.Event()
+        self.read_size = read_size
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        for listener in self.listeners:
+            fd = listener.fileno()
+            # Reads must never block the other ports
+            os.set_blocking(fd, False)
+            self._selector.register(fd, selectors.EVENT_READ, listener)
+        self.wakeups = 0
+
+    @property
+    def exiting(self) -> bool:
+        return self.sigExit.is_set()
+
+    def exit(self):
+        self.sigExit.set()
+        try:
+            os.write(self._wake_w, b'\x00')
+        except OSError:
+            pass
+        for listener in self.listeners:
+            listener.collector.put(None)
+
+    def __call__(self, *args, **kwargs):
+        return self.listen()
+
+    def listen(self):
+        apply_policy('listener')
+        while not self.exiting:
+            events = self._selector.select()
+            self.wakeups += 1
+            for key, _ in events:
+                listener = key.data
+                if listener is None:
+                    os.read(self._wake_r, 512)
+                    continue
+                try:
+                    data = os.read(key.fd, self.read_size)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b''
+                if not data:
+                    LOG.error("Serial port %s disconnected, it will no longer "
+                              "be read.", listener.port)
+                    self._selector.unregister(key.fd)
+                    continue
+                listener.ingest(data)
+
+        LOG.debug("Exiting multiplexer listen() method, and closing serial "
+                  "handles.")
+        self._selector.close()
+        for fd in (self._wake_r, self._wake_w):
+            os.close(fd)
+        for listener in self.listeners:
+            listener.close()
+
+
+class _RingCollector:
+    """Collector used by the listener process, which writes each line of the
+    Batches pushed by the listener to the shared ring, then rings the
+    doorbell (a pipe) to wake the main process."""
+    def __init__(self, ring, doorbell):
+        self.ring = ring
+        self.doorbell = doorbell
+
+    def put_nowait(self, batch):
+        if batch is None:
+            return
+        put = self.ring.put
+        for line in batch:
+            put(line, batch.rx_mono_ns, batch.rx_wall_ns)
+        try:
+            os.write(self.doorbell, b'\x00')
+        except BlockingIOError:
+            # The pipe is full, the main process has a wakeup pending
+            pass
+        except BrokenPipeError:
+            LOG.error("Main process closed the doorbell, stopping listener "
+                      "process.")
+            raise SystemExit(0)
+
+    put = put_nowait
+
+
+def _watch_parent(lifeline):
+    """Block until the main process closes (or exits without closing) its
+    end of the lifeline pipe, then stop the listener process.
+
+    The listener process is a child of the forkserver, not of the main
+    process, so its parent pid cannot be used to detect the main process
+    exiting.
+
+    """
+    try:
+        lifeline.recv()
+    except (EOFError, OSError):
+        pass
+    # Interrupt a blocking read in the main thread, see _listener_process
+    signal.pthread_kill(threading.main_thread().ident, signal.SIGTERM)
+
+
+def _listener_process(params, config, ring_name, doorbell, lifeline, ready):
+    """Entry point of the listener process, see :class:`ProcessListener`"""
+    from .shmring import ShmRing
+
+    def _terminate(sig, frame):
+        raise SystemExit(0)
+
+    # Interrupts are handled by the main process, which stops this process
+    # with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _terminate)
+    # The child does not inherit the main process' runtime configuration
+    for key, value in config.items():
+        if value is not None:
+            rcParams[key] = value
+    threading.Thread(target=_watch_parent, args=(lifeline,),
+                     name='ListenerLifeline', daemon=True).start()
+
+    ring = ShmRing(name=ring_name)
+    bell = doorbell.fileno()
+    os.set_blocking(bell, False)
+    params = dict(params, batch=True, binary=True)
+    listener = None
+    try:
+        listener = _get_listener(collector=_RingCollector(ring, bell),
+                                 params=params)
+        ready.set()
+        listener.listen()
+    except (serial.SerialException, ValueError):
+        LOG.exception("Serial port error in listener process.")
+        raise SystemExit(1)
+    finally:
+        if listener is not None:
+            listener.close()
+        doorbell.close()
+        ring.close()
+
+
+class ProcessListener:
+    """
+    Read the serial port in a dedicated process, so that serial reads never
+    wait for the GIL while plugin or daemon threads run Python code.
+
+    The listener process opens the port, frames and sanitizes lines as the
+    SerialListener does, and passes them (with their receive timestamps) to
+    the main process through a :class:`ShmRing` in shared memory. A pipe is
+    used as a doorbell to wake the main process when new lines are
+    available; the main process decodes the lines and pushes them to the
+    collector, so the rest of the pipeline is unchanged.
+
+    If the ring fills because the main process falls behind, lines are
+    dropped by the listener process and counted, see :meth:`stats`.
+
+    The process is started when the ProcessListener is created. It is not
+    forked from the (multithreaded) logger process but started from the
+    forkserver, as isolated plugins are (see :mod:`atgmlogger.isolation`);
+    the serial parameters and the 'logging' and 'scheduling' configuration
+    sections are passed to it. The listener process exits when the main
+    process exits or closes the ProcessListener, even if it is killed.
+
+    Parameters
+    ----------
+    params : dict
+        Serial port and listener parameters (as the 'serial' config section)
+    collector : queue.Queue, Optional
+    sigExit : threading.Event, Optional
+    ring_size : int, Optional
+        Size of the shared memory ring in bytes
+    timestamps : bool, Optional
+        Push Batches with the receive timestamps recorded in the listener
+        process
+
+    """
+    def __init__(self, params, collector=None, sigExit=None,
+                 ring_size=1024 ** 2, timestamps=False):
+        from .shmring import ShmRing
+        from .isolation import _get_context
+
+        self.params = dict(params)
+        self._queue = collector or PriorityChannel()
+        self.sigExit = sigExit or threading.Event()
+        self.timestamps = timestamps
+        self.batch = bool(params.get('batch')) or timestamps
+        self.encoding = params.get('encoding') or 'utf-8'
+        self.text = framer_text(params.get('framer'))
+        self.binary = bool(params.get('binary')) or not self.text
+
+        self.ring = ShmRing(ring_size)
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+
+        ctx = _get_context()
+        bell_r, bell_w = ctx.Pipe(duplex=False)
+        # Never written, the listener process exits when it is closed
+        life_r, self._lifeline = ctx.Pipe(duplex=False)
+        self._bell = bell_r
+        self._bell_r = bell_r.fileno()
+        os.set_blocking(self._bell_r, False)
+        config = {key: rcParams[key] for key in ('logging', 'scheduling')}
+        # Set by the listener process once the serial port is open
+        self.ready = ctx.Event()
+        self.process = ctx.Process(target=_listener_process,
+                                   name='SerialListenerProcess',
+                                   args=(self.params, config, self.ring.name,
+                                         bell_w, life_r, self.ready),
+                                   daemon=True)
+        self.process.start()
+        # Close the child's ends, so that they are closed when it exits
+        bell_w.close()
+        life_r.close()
+        LOG.info("Started listener process (pid %d) for port %s",
+                 self.process.pid, self.params.get('port'))
+
+    @property
+    def collector(self) -> queue.Queue:
+        return self._queue
+
+    @property
+    def exiting(self) -> bool:
+        return self.sigExit.is_set()
+
+    def stats(self) -> dict:
+        return self.ring.stats()
+
+    def exit(self):
+        self.sigExit.set()
+        try:
+            os.write(self._wake_w, b'\x00')
+        except OSError:
+            pass
+        self._queue.put(None)
+
+    def __call__(self, *args, **kwargs):
+        return self.listen()
+
+    def listen(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._bell_r, selectors.EVENT_READ, 'doorbell')
+        selector.register(self._wake_r, selectors.EVENT_READ, 'wakeup')
+        selector.register(self.process.sentinel, selectors.EVENT_READ,
+                          'process')
+        try:
+            while not self.exiting:
+                for key, _ in selector.select():
+                    if key.data == 'process':
+                        LOG.error("Listener process exited with code %s.",
+                                  self.process.exitcode)
+                        selector.unregister(key.fd)
+                        self.sigExit.set()
+                        continue
+                    try:
+                        os.read(key.fd, 4096)
+                    except BlockingIOError:
+                        pass
+                self.drain()
+            self.drain()
+        finally:
+            LOG.debug("Exiting listener.listen() method, stopping listener "
+                      "process.")
+            selector.close()
+            self.close()
+            self._queue.put(None)
+
+    def drain(self):
+        """Push all lines available in the ring to the collector"""
+        records = self.ring.get()
+        if not records:
+            return
+        if not self.binary:
+            encoding = self.encoding
+            records = [(line.decode(encoding, errors='ignore'), mono, wall)
+                       for line, mono, wall in records]
+        item_type = bytes if self.binary else str
+        if not self.batch:
+            for line, _, _ in records:
+                self._queue.put_nowait(line)
+            return
+
+        # Lines framed from one read share their timestamps
+        batch = None
+        for line, mono, wall in records:
+            if batch is None or (mono, wall) != (batch.rx_mono_ns,
+                                                 batch.rx_wall_ns):
+                if batch:
+                    self._queue.put_nowait(batch)
+                batch = Batch(item_type=item_type, rx_mono_ns=mono or None,
+                              rx_wall_ns=wall or None)
+            batch.append(line)
+        if batch:
+            self._queue.put_nowait(batch)
+
+    def close(self):
+        self._lifeline.close()
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self._bell.close()
+        for fd in (self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        stats = self.ring.stats()
+        if stats['dropped']:
+            LOG.warning("Listener process dropped %d lines (%d bytes) while "
+                        "the ring was full.", stats['dropped'],
+                        stats['dropped_bytes'])
+        self.ring.close()
+
+
 def _configure_applog(log_format):
     logdir = Path(rcParams['logging.logdir'])
     if not logdir.exists():
@@ -151,21 +598,75 @@ def _configure_applog(log_format):
     LOG.debug("Application log configured, log path: %s", str(logdir))
 
 
-def _get_dispatcher(collector=None, plugins=None, verbosity=0, exclude=None):
-    """Loads plugin and returns instance of Dispatcher"""
-    dispatcher = Dispatcher(collector=collector)
+def _get_dispatcher(collector=None, plugins=None, verbosity=0, exclude=None,
+                    params=None, logfile=None, private_registry=False,
+                    name=None, runtime=None):
+    """
+    Loads plugin and returns instance of Dispatcher
+
+    Parameters
+    ----------
+    params : dict, Optional
+        Serial port parameters, default is the rcParams 'serial' section
+    logfile : str, Optional
+        Data file name (in the logging directory), default gravdata.dat
+    private_registry : bool, Optional
+        Register plugins in a registry private to this dispatcher instead of
+        the shared class level registry
+    runtime : str, Optional
+        'asyncio' to create an AsyncDispatcher, default is the threaded
+        Dispatcher
+
+    """
+    params = params or rcParams['serial'] or {}
+    encoding = params.get('encoding') or 'utf-8'
+    timestamps = _get_timestamps()
+    fanout = rcParams['dispatcher.fanout'] or 'queue'
+    spill = rcParams['logging.spill']
+    if spill and (runtime == 'asyncio' or fanout != 'queue'):
+        # The DataLogger does not consume from its queue in these modes
+        LOG.warning("logging.spill is only supported with the threaded "
+                    "runtime and the 'queue' dispatcher fanout, spilling "
+                    "is disabled.")
+        spill = None
+    if runtime == 'asyncio':
+        from .aio import AsyncDispatcher
+        dispatcher = AsyncDispatcher(collector=collector, encoding=encoding,
+                                     private_registry=private_registry,
+                                     name=name)
+    else:
+        dispatcher = Dispatcher(collector=collector, encoding=encoding,
+                                private_registry=private_registry, name=name,
+                                fanout=fanout,
+                                ring_size=rcParams['dispatcher.ring_size'] or
+                                1024)
 
     # Explicitly import and register the DataLogger 'plugin'
     from .logger import DataLogger
 
-    logfile = Path(rcParams['logging.logdir']).joinpath('gravdata.dat')
-    dispatcher.register(DataLogger, logfile=logfile)
+    logfile = Path(rcParams['logging.logdir']).joinpath(
+        logfile or 'gravdata.dat')
+    options = _get_logger_options()
+    if framer_text(params.get('framer')):
+        dispatcher.register(DataLogger, logfile=logfile, encoding=encoding,
+                            binary=bool(params.get('binary')),
+                            timestamps=timestamps, spill=spill, **options)
+    else:
+        # Binary records are written back to back without a line terminator
+        dispatcher.register(DataLogger, logfile=logfile, binary=True,
+                            terminator='', timestamps=timestamps, spill=spill,
+                            **options)
 
-    plugins = plugins or rcParams['plugins']
+    if plugins is None:
+        plugins = rcParams['plugins']
     if plugins is not None:
         for plugin in plugins:
             try:
-                load_plugin(plugin, register=True, **plugins[plugin])
+                klass = load_plugin(plugin, register=False)
+                options = dict(plugins[plugin] or {})
+                if options.pop('isolate', False):
+                    klass = _isolate(klass, plugin)
+                dispatcher.register(klass, **options)
                 LOG.info("Loaded plugin: %s", plugin)
             except ImportError:  # ModuleNotFoundError not implemented until py3.6
                 if verbosity is not None and verbosity >= 2:
@@ -175,16 +676,191 @@ def _get_dispatcher(collector=None, plugins=None, verbosity=0, exclude=None):
     return dispatcher
 
 
-def _get_handle():
-    if '://' in str(rcParams['serial.port']).lower():
-        params = rcParams['serial']
+def _isolate(klass, name):
+    """Return the process isolated variant of a plugin class, or the class
+    itself if plugins cannot be isolated on this platform"""
+    from .isolation import isolated
+    try:
+        return isolated(klass)
+    except (ValueError, TypeError):
+        LOG.warning("Plugin <%s> cannot be isolated, running it in the "
+                    "logger process.", name)
+        return klass
+
+
+def _get_logger_options():
+    """Return the DataLogger options (LOGGER_PARAMS) which are set in the
+    'logging' section"""
+    options = {}
+    for key in LOGGER_PARAMS:
+        value = rcParams['logging.' + key]
+        if value is not None:
+            options[key] = value
+    return options
+
+
+def _get_timestamps():
+    """Return the 'logging.timestamps' mode, or None if disabled
+
+    Raises
+    ------
+    ValueError
+        If the mode is not one of TIMESTAMP_MODES
+
+    """
+    mode = rcParams['logging.timestamps']
+    if not mode:
+        return None
+    if mode not in TIMESTAMP_MODES:
+        raise ValueError("Invalid logging.timestamps mode: {}, expected one "
+                         "of {}".format(mode, ', '.join(TIMESTAMP_MODES)))
+    return mode
+
+
+def _get_handle(params=None):
+    params = params or rcParams['serial']
+    params = {k: v for k, v in params.items() if k not in LISTENER_PARAMS}
+    if '://' in str(params['port']).lower():
         url = params.pop('port')
         hdl = serial.serial_for_url(url=url, **params)
     else:
-        hdl = serial.Serial(**rcParams['serial'])
+        hdl = serial.Serial(**params)
     return hdl
 
 
+def _get_capture(params=None, filename='rawcapture.bin'):
+    """Create and start a RawCapture if enabled by logging.capture, which
+    may be True or a dict with the keys filename and max_bytes"""
+    if params is None:
+        params = rcParams['logging.capture']
+    if not params:
+        return None
+    if not isinstance(params, dict):
+        params = {}
+    params = dict(params)
+    path = Path(rcParams['logging.logdir']).joinpath(
+        params.pop('filename', filename))
+    try:
+        capture = RawCapture(path, **params)
+    except TypeError:
+        LOG.exception("Invalid raw capture parameters, capture disabled.")
+        return None
+    capture.start()
+    return capture
+
+
+def _get_listener(handle=None, collector=None, params=None, capture=None,
+                  external=False):
+    """Create the SerialListener of the port configured by params. If
+    `external` the port is read by a SerialMultiplexer or AsyncDispatcher,
+    so the listener gets no reader of its own (see get_reader), and is never
+    moved to a listener process."""
+    params = params or rcParams['serial']
+    if params.get('process') and handle is None and not external:
+        return ProcessListener(dict(params, process=False),
+                               collector=collector,
+                               ring_size=params.get('ring_size') or 1024 ** 2,
+                               timestamps=bool(_get_timestamps()))
+    handle = handle or _get_handle(params)
+    if capture is None:
+        capture = _get_capture()
+    reader = None
+    if not external:
+        reader = get_reader(handle, strategy=params.get('reader'),
+                            read_size=params.get('read_size'),
+                            read_gap=params.get('read_gap'),
+                            vmin=params.get('vmin'))
+    sanitizer = Sanitizer(policy=params.get('sanitize') or 'strip',
+                          encoding=params.get('encoding') or 'utf-8')
+    return SerialListener(handle, collector=collector, reader=reader,
+                          framer=get_framer(params.get('framer')),
+                          sanitizer=sanitizer,
+                          batch=bool(params.get('batch')),
+                          binary=bool(params.get('binary')),
+                          timestamps=bool(_get_timestamps()),
+                          capture=capture or None)
+
+
+def _get_multiport(verbosity=0):
+    """
+    Create a SerialMultiplexer and one Dispatcher (with a private plugin
+    registry) per port configured in the rcParams 'ports' list.
+
+    Each port entry contains serial/listener parameters, which default to the
+    values of the 'serial' section, and optionally:
+    name : used to name the dispatcher thread, and the default data file
+    (<name>.dat)
+    logfile : data file name, the first port defaults to gravdata.dat
+    plugins : plugins for this port, the first port defaults to the global
+    'plugins' section, other ports default to no plugins
+    capture : raw capture parameters for this port, the first port defaults
+    to the 'logging.capture' setting
+
+    All ports are read by the multiplexer thread, the 'process' listener
+    parameter is not supported and is ignored (with a warning).
+
+    """
+    listeners = []
+    dispatchers = []
+    for i, cfg in enumerate(rcParams['ports']):
+        params = dict(rcParams['serial'] or {})
+        params.update(cfg)
+        name = str(params.pop('name', 'port%d' % i))
+        logfile = params.pop('logfile', 'gravdata.dat' if i == 0
+                             else '%s.dat' % name)
+        plugins = params.pop('plugins', None if i == 0 else {})
+        capture = _get_capture(params.pop('capture', None if i == 0
+                                          else False),
+                               filename='%s.raw.bin' % name)
+        if params.pop('process', False):
+            LOG.warning("Listener processes are not supported with multiple "
+                        "ports, port %s will be read by the multiplexer.",
+                        name)
+
+        listener = _get_listener(params=params, capture=capture or False,
+                                 external=True)
+        dispatcher = _get_dispatcher(collector=listener.collector,
+                                     plugins=plugins, verbosity=verbosity,
+                                     params=params, logfile=logfile,
+                                     private_registry=True,
+                                     name='Dispatcher-%s' % name)
+        LOG.info("Configured port %s (%s) logging to %s", name,
+                 params.get('port'), logfile)
+        listeners.append(listener)
+        dispatchers.append(dispatcher)
+    return SerialMultiplexer(listeners), dispatchers
+
+
+def _get_async_runtime(handle=None, verbosity=0):
+    """Create an AsyncDispatcher which reads the serial port on its event
+    loop, the dispatcher is both the listener and the (only) dispatcher."""
+    dispatcher = _get_dispatcher(verbosity=verbosity, runtime='asyncio')
+    listener = _get_listener(handle, collector=dispatcher.message_queue,
+                             external=True)
+    dispatcher.attach(listener)
+    return dispatcher
+
+
+def _get_autotuner(listener, dispatchers, params=None):
+    """Create an AutoTuner if enabled by the 'autotune' section, which may
+    be True or a dict with the keys target_latency, interval and warmup."""
+    if params is None:
+        params = rcParams['autotune']
+    if not params:
+        return None
+    if not isinstance(params, dict):
+        params = {}
+    # The listener's reader, or the SerialMultiplexer/AsyncDispatcher which
+    # read the port(s) themselves. A ProcessListener reads in its child
+    # process, which cannot be tuned.
+    reader = getattr(listener, 'reader', listener)
+    try:
+        return AutoTuner(dispatchers, readers=[reader], **params)
+    except TypeError:
+        LOG.exception("Invalid autotune parameters, auto-tuning disabled.")
+        return None
+
+
 def atgmlogger(args, listener=None, handle=None, dispatcher=None):
     """
     Main execution method, expects args passed from a Namespace created
@@ -208,26 +884,45 @@ def atgmlogger(args, listener=None, handle=None, dispatcher=None):
 
     _configure_applog(TRACE_LOG_FMT if args.trace else LOG_FMT)
 
-    if listener is None:
-        listener = SerialListener(handle or _get_handle())
-    dispatcher = dispatcher or _get_dispatcher(collector=listener.collector,
-                                               verbosity=args.verbose)
+    serial_params = rcParams['serial'] or {}
+    if listener is None and dispatcher is None and rcParams['ports']:
+        listener, dispatchers = _get_multiport(verbosity=args.verbose)
+    elif listener is None and dispatcher is None and \
+            rcParams['dispatcher.runtime'] == 'asyncio' and \
+            not serial_params.get('process'):
+        listener = _get_async_runtime(handle, verbosity=args.verbose)
+        dispatchers = [listener]
+    else:
+        if listener is None:
+            listener = _get_listener(handle)
+        dispatchers = [dispatcher or _get_dispatcher(
+            collector=listener.collector, verbosity=args.verbose)]
 
     # End Init Performance Counter
     t_end = time.perf_counter()
+    tuner = _get_autotuner(listener, dispatchers)
     if args.verbose:
         LOG.info("ATGMLogger started. Initialization time: %.4f", t_end - t_start)
     try:
         if POSIX:
             # Listen for SIGHUP to tell logger that files have been rotated.
             # Note: Signal handler must be defined in main thread
-            signal.signal(signal.SIGHUP, lambda sig, frame: dispatcher.log_rotate())
-        dispatcher.start()
+            signal.signal(signal.SIGHUP, lambda sig, frame: [
+                dispatcher.log_rotate() for dispatcher in dispatchers])
+        for dispatcher in dispatchers:
+            if dispatcher is not listener:
+                dispatcher.start()
+        if tuner is not None:
+            tuner.start()
         listener()
     except KeyboardInterrupt:
         LOG.info("Keyboard Interrupt intercepted, cleaning up and exiting.")
         listener.exit()
-        dispatcher.exit(join=False)
+        for dispatcher in dispatchers:
+            dispatcher.exit(join=False)
         LOG.debug("Dispatcher exited.")
+    finally:
+        if tuner is not None:
+            tuner.exit()
 
     return 0
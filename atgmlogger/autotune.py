@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+"""
+Self calibrating settings of the serial read size and of the DataLogger
+write batching.
+
+Enabled by the rcParams 'autotune' section, e.g.
+
+    "autotune": {"target_latency": 0.5, "warmup": 10, "interval": 300}
+
+target_latency - maximum seconds between a line being received and it
+being written to the data file
+warmup - seconds of data measured before the first tuning
+interval - seconds between later tunings
+
+"""
+
+import math
+import time
+import logging
+import threading
+
+from .logger import DataLogger
+
+__all__ = ['AutoTuner']
+LOG = logging.getLogger(__name__)
+
+MIN_READ_SIZE = 64
+MAX_READ_SIZE = 4096
+# Lower bound of the flush interval (seconds)
+MIN_FLUSH_INTERVAL = 0.05
+# Seconds between the attempts to take the baseline, until a DataLogger runs
+BASELINE_RETRY = 0.1
+
+
+def _power_of_two(size, lower=MIN_READ_SIZE, upper=MAX_READ_SIZE) -> int:
+    size = max(lower, min(upper, int(math.ceil(size))))
+    return min(upper, 1 << (size - 1).bit_length())
+
+
+class AutoTuner(threading.Thread):
+    """
+    Measure the data rate and file write latency of the running DataLoggers,
+    and choose the settings which meet a latency target with the fewest
+    syscalls.
+
+    After `warmup` seconds, then every `interval` seconds, the line rate,
+    mean line size and mean flush latency observed since the previous
+    tuning are used to choose:
+
+    flush_lines - lines written per flush, i.e. the lines expected to arrive
+    within the latency target (less the flush latency). At 1 Hz this is 1
+    (every line is flushed as it arrives), at 20 Hz with a 0.5 s target
+    lines are written 10 at a time.
+    flush_interval - seconds after which unflushed lines are written
+    regardless, so a slowing meter still meets the target.
+    read_size - maximum bytes per serial read, the next power of two which
+    holds the data expected within the target (at least two lines), between
+    64 and 4096 bytes.
+
+    The chosen settings are logged, and exposed by :attr:`settings` and
+    :meth:`stats`. Loggers which received no data keep their settings.
+
+    Parameters
+    ----------
+    dispatchers : List[Dispatcher]
+        Dispatchers running the DataLogger plugins to tune
+    readers : List, Optional
+        Objects with a `read_size` attribute (serial readers, the
+        SerialMultiplexer, the asyncio runtime) to tune
+    target_latency : float, Optional
+        Latency target in seconds
+    interval : float, Optional
+        Seconds between tunings
+    warmup : float, Optional
+        Seconds before the first tuning
+    max_flush_lines : int, Optional
+        Upper bound of flush_lines
+
+    """
+    def __init__(self, dispatchers, readers=(), target_latency=0.5,
+                 interval=300.0, warmup=10.0, max_flush_lines=1024,
+                 clock=time.monotonic):
+        super().__init__(name=self.__class__.__name__, daemon=True)
+        self.dispatchers = list(dispatchers)
+        self.readers = [reader for reader in readers
+                        if hasattr(reader, 'read_size')]
+        self.target_latency = float(target_latency)
+        self.interval = float(interval)
+        self.warmup = float(warmup)
+        self.max_flush_lines = int(max_flush_lines)
+        self._clock = clock
+        self._exit = threading.Event()
+        self._samples = {}
+        self.settings = {}
+        self.measured = {}
+        self.tunings = 0
+
+    def exit(self, join=False):
+        self._exit.set()
+        if join and self.is_alive():
+            self.join()
+
+    def run(self):
+        # Baseline of the counters, the first tuning measures the warmup.
+        # The DataLoggers may be started after the tuner (the asyncio
+        # runtime creates its plugins in run()), so wait for one to exist.
+        while not self._loggers():
+            if self._exit.wait(BASELINE_RETRY):
+                return
+        try:
+            self.tune()
+        except Exception:
+            LOG.exception("Auto-tuning failed.")
+        if self._exit.wait(self.warmup):
+            return
+        while not self._exit.is_set():
+            try:
+                self.tune()
+            except Exception:
+                LOG.exception("Auto-tuning failed.")
+            if self._exit.wait(self.interval):
+                break
+
+    def _loggers(self):
+        loggers = []
+        for dispatcher in self.dispatchers:
+            logger = dispatcher.get_instance_of(DataLogger)
+            if logger is not None:
+                loggers.append(logger)
+        return loggers
+
+    def choose(self, rate, line_size, flush_latency) -> dict:
+        """
+        Return the settings for a data rate.
+
+        Parameters
+        ----------
+        rate : float
+            Lines per second
+        line_size : float
+            Mean bytes per line
+        flush_latency : float
+            Mean seconds per flush
+
+        Returns
+        -------
+        dict : flush_lines, flush_interval and read_size
+
+        """
+        budget = max(MIN_FLUSH_INTERVAL, self.target_latency - flush_latency)
+        flush_lines = max(1, min(self.max_flush_lines, int(rate * budget)))
+        read_size = _power_of_two(max(2 * line_size,
+                                      rate * budget * line_size))
+        return dict(flush_lines=flush_lines,
+                    flush_interval=round(budget, 3), read_size=read_size)
+
+    def tune(self) -> dict:
+        """Measure the loggers since the previous call and apply the chosen
+        settings, returns the settings applied"""
+        now = self._clock()
+        read_size = 0
+        for logger in self._loggers():
+            name = str(logger.logfile)
+            counters = (logger.lines_written, logger.bytes_written,
+                        logger.flushes, logger.flush_time)
+            previous = self._samples.get(name)
+            self._samples[name] = (now, counters)
+            if previous is None:
+                continue
+            elapsed = now - previous[0]
+            lines, nbytes, flushes, flush_time = [
+                current - last for current, last in zip(counters, previous[1])]
+            if elapsed <= 0 or lines <= 0:
+                continue
+
+            rate = lines / elapsed
+            latency = flush_time / flushes if flushes else 0.0
+            settings = self.choose(rate, nbytes / lines, latency)
+            logger.configure(flush_lines=settings['flush_lines'],
+                             flush_interval=settings['flush_interval'])
+            read_size = max(read_size, settings['read_size'])
+            self.measured[name] = dict(rate=rate, line_size=nbytes / lines,
+                                       flush_latency=latency)
+            self.settings[name] = settings
+            LOG.info("Auto-tuned %s: %.1f lines/s of %.0f bytes, flush "
+                     "latency %.2f ms; flushing every %d lines or %.2f s, "
+                     "read size %d", name, rate, nbytes / lines,
+                     latency * 1000, settings['flush_lines'],
+                     settings['flush_interval'], settings['read_size'])
+
+        if read_size:
+            # Readers shared by several ports use the largest read size
+            for reader in self.readers:
+                reader.read_size = read_size
+            self.tunings += 1
+        return self.settings
+
+    def stats(self) -> dict:
+        return dict(tunings=self.tunings, settings=dict(self.settings),
+                    measured=dict(self.measured))
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import time
+import queue
+import logging
+import threading
+import collections
+
+from .dispatcher import Batch
+
+__all__ = ['BroadcastRing', 'Cursor']
+LOG = logging.getLogger(__name__)
+
+
+class BroadcastRing:
+    """
+    Single producer broadcast ring buffer (in the style of the LMAX
+    disruptor) used to fan items out from the Dispatcher to its plugins.
+
+    The producer writes each item once into a fixed size ring of slots and
+    advances the published sequence number; every consumer reads the ring
+    through its own :class:`Cursor`. Publishing does not depend on the number
+    of consumers (except for lossless cursors, see below), so adding another
+    consumer plugin is close to free for the dispatcher.
+
+    A consumer whose cursor falls more than `size` items behind the producer
+    is lagging: a lossy cursor skips ahead to the oldest item still in the
+    ring, and counts the items it missed. A lossless cursor instead gates the
+    producer, which waits for the cursor to free a slot (use this for the
+    data logger, which must never lose lines). While it waits the producer
+    checks the consumer thread of each gating cursor every `check_interval`
+    seconds; a cursor whose thread has died no longer gates the producer
+    (it becomes lossy), so a crashed plugin cannot stall the dispatcher.
+
+    Parameters
+    ----------
+    size : int, Optional
+        Number of slots, rounded up to a power of two
+    check_interval : float, Optional
+        Seconds between checks of the lossless consumer threads while the
+        producer is waiting
+
+    """
+    def __init__(self, size=1024, check_interval=0.5):
+        size = 1 << max(1, int(size) - 1).bit_length()
+        self.size = size
+        self.check_interval = check_interval
+        self._mask = size - 1
+        self._slots = [None] * size
+        # Sequence being written, and last published sequence
+        self._claim = -1
+        self._published = -1
+        self._cursors = []
+        self._lossless = ()
+        self._gate = -1  # Cached minimum sequence of the lossless cursors
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._space = threading.Condition(self._lock)
+        self._waiters = 0
+        self._producer_waiting = False
+        self.stalls = 0
+        self.released = 0
+
+    @property
+    def published(self) -> int:
+        return self._published
+
+    def subscribe(self, types=None, batched=False, lossless=False,
+                  encoding='utf-8', name=None, thread=None) -> 'Cursor':
+        """
+        Create a cursor positioned after the last published item.
+
+        Parameters
+        ----------
+        types : set, Optional
+            Item types delivered to the cursor (other items are skipped),
+            default is all items
+        batched : bool, Optional
+            Deliver Batches as a single item, otherwise their items are
+            delivered individually
+        lossless : bool, Optional
+            Gate the producer on this cursor instead of skipping items
+        encoding : str, Optional
+            Encoding used to decode bytes items for cursors which consume
+            str but not bytes
+        name : str, Optional
+        thread : threading.Thread, Optional
+            Consumer thread of the cursor, default is the first thread which
+            gets an item from it
+
+        """
+        cursor = Cursor(self, types=types, batched=batched, lossless=lossless,
+                        encoding=encoding, name=name, thread=thread)
+        with self._lock:
+            self._cursors.append(cursor)
+            self._lossless = tuple(c for c in self._cursors if c.lossless)
+            self._gate = -1
+        return cursor
+
+    def stats(self) -> dict:
+        return dict(size=self.size, published=self._published + 1,
+                    stalls=self.stalls, released=self.released,
+                    cursors={c.name: c.stats() for c in self._cursors})
+
+    def publish(self, item):
+        seq = self._claim + 1
+        wrap = seq - self.size
+        if self._lossless and wrap > self._gate:
+            self._wait_for_space(wrap)
+        self._claim = seq
+        self._slots[seq & self._mask] = item
+        self._published = seq
+        if self._waiters:
+            with self._lock:
+                self._available.notify_all()
+
+    def _min_lossless(self) -> int:
+        if not self._lossless:
+            return self._published
+        return min(c.sequence for c in self._lossless)
+
+    def _release_dead(self):
+        """Stop gating the producer on lossless cursors whose consumer
+        thread has died, called with the lock held"""
+        dead = [c for c in self._lossless if c.thread is not None and
+                c.thread.ident is not None and not c.thread.is_alive()]
+        for cursor in dead:
+            cursor.lossless = False
+            self.released += 1
+            LOG.error("Consumer %s of a lossless cursor has exited, it no "
+                      "longer gates the producer.", cursor.name)
+        if dead:
+            self._lossless = tuple(c for c in self._lossless if c.lossless)
+
+    def _wait_for_space(self, wrap):
+        gate = self._min_lossless()
+        if wrap > gate:
+            self.stalls += 1
+            with self._lock:
+                self._producer_waiting = True
+                gate = self._min_lossless()
+                while wrap > gate:
+                    if not self._space.wait(self.check_interval):
+                        self._release_dead()
+                    gate = self._min_lossless()
+                self._producer_waiting = False
+        self._gate = gate
+
+    def _notify_space(self):
+        with self._lock:
+            self._space.notify()
+
+    def notify(self):
+        """Wake all waiting consumers"""
+        with self._lock:
+            self._available.notify_all()
+
+
+class Cursor:
+    """
+    A consumer's position in a :class:`BroadcastRing`.
+
+    Cursor implements the subset of the :class:`queue.Queue` interface used
+    by plugins, so it can replace a plugin's queue. Items put directly on the
+    cursor (e.g. the exit sentinel None) are delivered before ring items.
+
+    """
+    def __init__(self, ring, types=None, batched=False, lossless=False,
+                 encoding='utf-8', name=None, thread=None):
+        self._ring = ring
+        self.types = frozenset(types) if types is not None else None
+        self.decode = self.types is not None and str in self.types and \
+            bytes not in self.types
+        self.batched = batched
+        self.lossless = lossless
+        self.encoding = encoding
+        self.name = name or 'cursor%d' % id(self)
+        self.thread = thread
+        # Sequence of the last item consumed
+        self.sequence = ring.published
+        self._pending = collections.deque()
+        self._inbox = collections.deque()
+        self._outstanding = 0
+
+        self.received = 0
+        self.dropped = 0
+        self.high_water = 0
+        self._lagging = False
+
+    @property
+    def policy(self) -> str:
+        return 'lossless' if self.lossless else 'lossy'
+
+    @property
+    def lag(self) -> int:
+        """Number of published items not yet consumed by this cursor"""
+        return self._ring.published - self.sequence
+
+    def stats(self) -> dict:
+        return dict(policy=self.policy, received=self.received,
+                    dropped=self.dropped, lag=self.lag,
+                    high_water=self.high_water)
+
+    def qsize(self) -> int:
+        return self.lag + len(self._pending) + len(self._inbox)
+
+    def empty(self) -> bool:
+        return not self.qsize()
+
+    def put(self, item, block=True, timeout=None):
+        ring = self._ring
+        with ring._lock:
+            self._inbox.append(item)
+            self._outstanding += 1
+            ring._available.notify_all()
+
+    put_nowait = put
+
+    def _accept(self, item):
+        """Filter/convert a ring item, returns a list of items to deliver"""
+        types = self.types
+        if isinstance(item, Batch):
+            item_type = item.item_type
+            if types is not None and item_type not in types:
+                if not (self.decode and item_type is bytes):
+                    return ()
+                item = Batch((line.decode(self.encoding, errors='ignore')
+                              for line in item), item_type=str,
+                             rx_mono_ns=item.rx_mono_ns,
+                             rx_wall_ns=item.rx_wall_ns)
+            return (item, ) if self.batched else item
+        if types is not None and type(item) not in types:
+            if not (self.decode and type(item) is bytes):
+                return ()
+            item = item.decode(self.encoding, errors='ignore')
+        return (item, )
+
+    def _next(self):
+        """Advance through the ring until an accepted item is found, returns
+        False if the end of the ring was reached."""
+        ring = self._ring
+        size = ring.size
+        while self.sequence < ring._published:
+            seq = self.sequence + 1
+            lag = ring._published - self.sequence
+            if lag > self.high_water:
+                self.high_water = lag
+            item = ring._slots[seq & ring._mask]
+            if ring._claim - seq >= size:
+                # Overrun - the slot may have been overwritten, skip to the
+                # oldest item still in the ring
+                oldest = ring._claim - size + 1
+                self.dropped += oldest - seq
+                self.sequence = oldest - 1
+                if not self._lagging:
+                    self._lagging = True
+                    LOG.warning("Consumer %s is lagging by more than %d "
+                                "items, items were dropped.", self.name, size)
+                continue
+            self._lagging = False
+            self.sequence = seq
+            if self.lossless and ring._producer_waiting:
+                ring._notify_space()
+            accepted = self._accept(item)
+            if accepted:
+                self._pending.extend(accepted)
+                return True
+        return False
+
+    def get(self, block=True, timeout=None):
+        ring = self._ring
+        if self.thread is None:
+            self.thread = threading.current_thread()
+        deadline = None
+        while True:
+            if self._inbox:
+                item = self._inbox.popleft()
+                break
+            if self._pending or self._next():
+                item = self._pending.popleft()
+                self._outstanding += 1
+                break
+            if not block:
+                raise queue.Empty
+            with ring._lock:
+                # Register as a waiter before re-checking the sequence, so a
+                # publish cannot be missed
+                ring._waiters += 1
+                try:
+                    if self.sequence < ring._published or self._inbox:
+                        continue
+                    if timeout is None:
+                        ring._available.wait()
+                    else:
+                        if deadline is None:
+                            deadline = time.monotonic() + timeout
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise queue.Empty
+                        ring._available.wait(remaining)
+                finally:
+                    ring._waiters -= 1
+        self.received += 1
+        return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def task_done(self):
+        ring = self._ring
+        with ring._lock:
+            self._outstanding -= 1
+            if self._outstanding <= 0:
+                self._outstanding = 0
+                ring._available.notify_all()
+
+    def join(self):
+        """Block until every item published (or put) so far has been
+        consumed and marked done"""
+        ring = self._ring
+        target = ring.published
+        with ring._lock:
+            ring._waiters += 1
+            try:
+                while self._outstanding or self._inbox or self._pending or \
+                        (self.sequence < target and
+                         ring._claim - target < ring.size):
+                    ring._available.wait(0.1)
+            finally:
+                ring._waiters -= 1
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import time
+import struct
+import logging
+import threading
+import collections
+from pathlib import Path
+
+__all__ = ['RawCapture', 'read_capture']
+LOG = logging.getLogger(__name__)
+
+# Capture file: magic, followed by one record per read of
+# (wall clock ns, monotonic ns, length) and the raw chunk
+CAPTURE_MAGIC = b'ATGMRAW1'
+CHUNK_HEADER = struct.Struct('<qqI')
+
+
+def read_capture(path):
+    """
+    Read a raw capture file, yielding a (wall clock ns, monotonic ns, data)
+    tuple for each chunk read from the serial port, in order.
+
+    A truncated final record (e.g. after a crash) is ignored.
+
+    """
+    with Path(path).open('rb') as fd:
+        if fd.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError("{} is not a raw capture file.".format(path))
+        while True:
+            header = fd.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                break
+            wall, mono, length = CHUNK_HEADER.unpack(header)
+            data = fd.read(length)
+            if len(data) < length:
+                break
+            yield wall, mono, data
+
+
+class RawCapture(threading.Thread):
+    """
+    Record every raw chunk read from the serial port, with its receive
+    timestamp, to an append-only binary file before any framing or
+    sanitizing is applied.
+
+    :meth:`capture` is called from the serial read loop and only appends the
+    chunk to an in-memory deque; the file is written from this thread through
+    a large buffered writer.
+    Once the file reaches `max_bytes`, or if more than `max_pending` bytes are
+    waiting to be written, further chunks are dropped (and counted) so that
+    capture can never stall or exhaust the memory of the logger.
+
+    Parameters
+    ----------
+    path : str or Path
+        Capture file path, data is appended if the file exists
+    max_bytes : int, Optional
+        Maximum size of the capture file
+    max_pending : int, Optional
+        Maximum number of bytes buffered in memory waiting to be written
+    flush_interval : float, Optional
+        Maximum time (seconds) captured data is held in the write buffer
+
+    """
+    def __init__(self, path, max_bytes=64 * 1024 ** 2, max_pending=1024 ** 2,
+                 flush_interval=1.0):
+        super().__init__(name=self.__class__.__name__, daemon=True)
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+
+        self._pending = collections.deque()
+        self._ready = threading.Event()
+        self._exitSig = threading.Event()
+        self._full = False
+
+        # Each counter is only modified by one thread
+        self.chunks = 0
+        self.captured = 0  # bytes accepted (read loop)
+        self.written = 0  # bytes written (writer thread)
+        self.dropped_chunks = 0
+        self.dropped_bytes = 0  # dropped by the read loop
+        self.discarded = 0  # dropped by the writer at the size limit
+
+    @property
+    def exiting(self) -> bool:
+        return self._exitSig.is_set()
+
+    def stats(self) -> dict:
+        return dict(chunks=self.chunks, captured=self.captured,
+                    written=self.written, dropped_chunks=self.dropped_chunks,
+                    dropped_bytes=self.dropped_bytes + self.discarded,
+                    full=self._full)
+
+    def capture(self, data, mono_ns, wall_ns):
+        """Queue a raw chunk for capture, this never blocks."""
+        if self._full or self.captured - self.written > self.max_pending:
+            self.dropped_chunks += 1
+            self.dropped_bytes += len(data)
+            return
+        self._pending.append((wall_ns, mono_ns, data))
+        self.chunks += 1
+        self.captured += len(data)
+        if not self._ready.is_set():
+            self._ready.set()
+
+    def exit(self, join=False):
+        self._exitSig.set()
+        self._ready.set()
+        if join and self.is_alive():
+            self.join()
+
+    def run(self):
+        try:
+            fd = self.path.open('ab', buffering=256 * 1024)
+        except (IOError, OSError):
+            LOG.exception("Unable to open raw capture file %s",
+                          str(self.path))
+            self._full = True
+            return
+        size = fd.tell()
+        if size == 0:
+            fd.write(CAPTURE_MAGIC)
+            size = len(CAPTURE_MAGIC)
+        LOG.info("Raw serial capture started, writing to %s", str(self.path))
+
+        pending = self._pending
+        dirty = False
+        last_flush = time.monotonic()
+        try:
+            while True:
+                timeout = None
+                if dirty:
+                    timeout = max(0, last_flush + self.flush_interval -
+                                  time.monotonic())
+                self._ready.wait(timeout)
+                self._ready.clear()
+                while pending:
+                    wall, mono, data = pending.popleft()
+                    length = CHUNK_HEADER.size + len(data)
+                    if size + length > self.max_bytes:
+                        if not self._full:
+                            LOG.warning("Raw capture file has reached the "
+                                        "size limit (%d bytes), capture "
+                                        "stopped.", self.max_bytes)
+                        self._full = True
+                        self.discarded += len(data)
+                    else:
+                        fd.write(CHUNK_HEADER.pack(wall, mono, len(data)))
+                        fd.write(data)
+                        size += length
+                        dirty = True
+                    self.written += len(data)
+                now = time.monotonic()
+                if dirty and now - last_flush >= self.flush_interval:
+                    fd.flush()
+                    dirty = False
+                    last_flush = now
+                if self.exiting:
+                    break
+        except (IOError, OSError):
+            LOG.exception("Error writing raw capture file, capture stopped.")
+            self._full = True
+        finally:
+            fd.close()
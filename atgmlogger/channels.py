@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import time
+import heapq
+import queue
+import logging
+import threading
+import collections
+
+__all__ = ['Channel', 'PriorityChannel', 'POLICIES', 'get_channel']
+LOG = logging.getLogger(__name__)
+
+POLICIES = ('block', 'drop-oldest', 'drop-newest', 'coalesce')
+
+
+class _Slot:
+    """Holder for a pending item in a coalescing channel, so that a newer
+    item with the same key can replace it in place."""
+    __slots__ = ['item']
+
+    def __init__(self, item):
+        self.item = item
+
+
+class Channel:
+    """
+    Bounded FIFO channel between the Dispatcher and a plugin, with an
+    explicit overflow policy.
+
+    Channel implements the subset of the :class:`queue.Queue` interface used
+    by plugins (put/put_nowait, get/get_nowait, task_done, join, qsize), using
+    a deque and a single lock.
+
+    When the channel holds `maxsize` items:
+    'block' - put waits for space (put_nowait raises queue.Full)
+    'drop-oldest' - the oldest pending item is discarded
+    'drop-newest' - the new item is discarded
+    'coalesce' - as drop-oldest, except that items for which `key` returns
+    None are never dropped
+
+    With the 'coalesce' policy an item replaces (in place) any pending item
+    with the same key, whether or not the channel is full, e.g. several
+    pending data LED blinks are reduced to one.
+
+    A None item (the exit sentinel) is never dropped or coalesced, and is
+    accepted even if the channel is full.
+
+    Parameters
+    ----------
+    maxsize : int, Optional
+        Maximum number of pending items, 0 for unbounded
+    policy : str, Optional
+        Overflow policy, one of POLICIES
+    key : Callable[[item], Hashable], Optional
+        Coalescing key of an item ('coalesce' policy only)
+
+    """
+    def __init__(self, maxsize=0, policy='block', key=None):
+        policy = str(policy).lower().replace('_', '-')
+        if policy not in POLICIES:
+            raise ValueError("Invalid channel policy: {}".format(policy))
+        self.maxsize = int(maxsize or 0)
+        self.policy = policy
+        self._key = key if policy == 'coalesce' else None
+        self._items = collections.deque()
+        self._slots = {}  # Dict[key: _Slot] of pending coalescable items
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        self._unfinished = 0
+
+        self.received = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_water = 0
+
+    def stats(self) -> dict:
+        return dict(policy=self.policy, maxsize=self.maxsize,
+                    pending=len(self._items), received=self.received,
+                    dropped=self.dropped, coalesced=self.coalesced,
+                    high_water=self.high_water)
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= len(self._items)
+
+    def put(self, item, block=True, timeout=None):
+        with self._lock:
+            self.received += 1
+            if item is not None and self._key is not None:
+                key = self._key(item)
+                if key is not None:
+                    slot = self._slots.get(key)
+                    if slot is not None:
+                        slot.item = item
+                        self.coalesced += 1
+                        return
+                    slot = _Slot(item)
+                    if self.full() and not self._make_room(key):
+                        self.dropped += 1
+                        return
+                    self._slots[key] = slot
+                    self._append(slot)
+                    return
+
+            if item is not None and self.full():
+                if self.policy == 'drop-newest':
+                    self.dropped += 1
+                    return
+                elif self.policy == 'block':
+                    if not block:
+                        self.received -= 1
+                        raise queue.Full
+                    self._wait_not_full(timeout)
+                else:
+                    # drop-oldest, or coalesce for items without a key
+                    self._make_room(None)
+            self._append(item)
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def _wait_not_full(self, timeout):
+        if timeout is None:
+            while self.full():
+                self._not_full.wait()
+            return
+        deadline = time.monotonic() + timeout
+        while self.full():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.received -= 1
+                raise queue.Full
+            self._not_full.wait(remaining)
+
+    def _make_room(self, key) -> bool:
+        """Discard the oldest droppable item, returns False if there is no
+        droppable item (and the new item keyed `key` should be dropped
+        instead)."""
+        items = self._items
+        for i, pending in enumerate(items):
+            if pending is None:
+                continue
+            if isinstance(pending, _Slot):
+                del self._slots[self._key(pending.item)]
+            elif self.policy == 'coalesce':
+                # Items without a coalescing key are never dropped
+                continue
+            del items[i]
+            self.dropped += 1
+            self._task_done()
+            return True
+        if key is None:
+            # Nothing can be dropped, accept the item over the limit
+            return True
+        return False
+
+    def _append(self, item):
+        self._items.append(item)
+        self._unfinished += 1
+        if len(self._items) > self.high_water:
+            self.high_water = len(self._items)
+        self._not_empty.notify()
+
+    def get(self, block=True, timeout=None):
+        with self._not_empty:
+            if not block:
+                if not self._items:
+                    raise queue.Empty
+            elif timeout is None:
+                while not self._items:
+                    self._not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self._items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._not_empty.wait(remaining)
+            item = self._items.popleft()
+            if isinstance(item, _Slot):
+                del self._slots[self._key(item.item)]
+                item = item.item
+            if self.maxsize:
+                self._not_full.notify()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def _task_done(self):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            if self._unfinished < 0:
+                self._unfinished = 0
+                raise ValueError('task_done() called too many times')
+            self._all_done.notify_all()
+
+    def task_done(self):
+        with self._lock:
+            self._task_done()
+
+    def join(self):
+        with self._all_done:
+            while self._unfinished:
+                self._all_done.wait()
+
+
+def get_channel(spec=None, key=None) -> Channel:
+    """
+    Create a Channel from a plugin 'channel' configuration value.
+
+    Parameters
+    ----------
+    spec : dict or int, Optional
+        dict with the keys maxsize and policy, or an int maxsize (with the
+        'drop-oldest' policy). Default is an unbounded channel.
+    key : Callable, Optional
+        Coalescing key function, see :class:`Channel`
+
+    Raises
+    ------
+    ValueError
+        If the policy is invalid
+
+    """
+    if not spec:
+        return Channel()
+    if isinstance(spec, int):
+        return Channel(maxsize=spec, policy='drop-oldest')
+    return Channel(maxsize=spec.get('maxsize', 0),
+                   policy=spec.get('policy', 'block'), key=key)
+
+
+class PriorityChannel:
+    """
+    Dispatcher message queue with two priority classes (lanes).
+
+    'data' - data lines, Batches and Commands (and the None exit sentinel),
+    delivered in FIFO order. This lane is unbounded and never drops.
+    'indicator' - items which declare `lane = 'indicator'` (LED Blinks),
+    delivered only when no data is waiting, ordered by their `priority`
+    (lowest first). The lane is bounded; when it is full new indicator items
+    are dropped, and a pending item equal to a new one (see `key`) absorbs
+    it. Continuous blinks (`until_stopped`) are never dropped.
+
+    So under a burst the latency of data lines does not depend on how many
+    indicator items are waiting.
+
+    Implements the :class:`queue.Queue` interface used by the listener and
+    Dispatcher.
+
+    Parameters
+    ----------
+    indicator_maxsize : int, Optional
+        Maximum number of pending indicator items
+
+    """
+    LANES = ('data', 'indicator')
+
+    def __init__(self, indicator_maxsize=16):
+        self.indicator_maxsize = indicator_maxsize
+        self._data = collections.deque()
+        self._indicators = []  # heap of (priority, seq, item)
+        self._keys = set()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        self._unfinished = 0
+
+        self.received = dict.fromkeys(self.LANES, 0)
+        self.dropped = dict.fromkeys(self.LANES, 0)
+        self.coalesced = dict.fromkeys(self.LANES, 0)
+        self.high_water = dict.fromkeys(self.LANES, 0)
+
+    @staticmethod
+    def _key(item):
+        """Indicator items with the same key are redundant while pending,
+        continuous blinks have no key"""
+        if getattr(item, 'until_stopped', False):
+            return None
+        return getattr(item, 'led', None), getattr(item, 'frequency', None)
+
+    def stats(self) -> dict:
+        depth = dict(data=len(self._data), indicator=len(self._indicators))
+        return {lane: dict(depth=depth[lane], received=self.received[lane],
+                           dropped=self.dropped[lane],
+                           coalesced=self.coalesced[lane],
+                           high_water=self.high_water[lane])
+                for lane in self.LANES}
+
+    def qsize(self) -> int:
+        return len(self._data) + len(self._indicators)
+
+    def empty(self) -> bool:
+        return not self.qsize()
+
+    def full(self) -> bool:
+        return False
+
+    def put(self, item, block=True, timeout=None):
+        with self._lock:
+            if getattr(item, 'lane', 'data') != 'indicator':
+                self.received['data'] += 1
+                self._data.append(item)
+                if len(self._data) > self.high_water['data']:
+                    self.high_water['data'] = len(self._data)
+            else:
+                self.received['indicator'] += 1
+                key = self._key(item)
+                if key is not None:
+                    if key in self._keys:
+                        self.coalesced['indicator'] += 1
+                        return
+                    if len(self._indicators) >= self.indicator_maxsize:
+                        self.dropped['indicator'] += 1
+                        return
+                    self._keys.add(key)
+                self._seq += 1
+                heapq.heappush(self._indicators,
+                               (getattr(item, 'priority', 0), self._seq, item))
+                if len(self._indicators) > self.high_water['indicator']:
+                    self.high_water['indicator'] = len(self._indicators)
+            self._unfinished += 1
+            self._not_empty.notify()
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def _pop(self):
+        if self._data:
+            return self._data.popleft()
+        item = heapq.heappop(self._indicators)[2]
+        self._keys.discard(self._key(item))
+        return item
+
+    def get(self, block=True, timeout=None):
+        with self._not_empty:
+            if not block:
+                if not self.qsize():
+                    raise queue.Empty
+            elif timeout is None:
+                while not self.qsize():
+                    self._not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self.qsize():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._not_empty.wait(remaining)
+            return self._pop()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def task_done(self):
+        with self._lock:
+            self._unfinished -= 1
+            if self._unfinished <= 0:
+                if self._unfinished < 0:
+                    self._unfinished = 0
+                    raise ValueError('task_done() called too many times')
+                self._all_done.notify_all()
+
+    def join(self):
+        with self._all_done:
+            while self._unfinished:
+                self._all_done.wait()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import bz2
+import lzma
+import time
+import zlib
+import logging
+from pathlib import Path
+
+from .writers import GroupCommitWriter
+
+__all__ = ['CompressingWriter', 'read_compressed', 'SUFFIXES']
+LOG = logging.getLogger(__name__)
+
+SUFFIXES = {'gzip': '.gz', 'bz2': '.bz2', 'lzma': '.xz'}
+# Default compression levels, chosen for CPU cost on a Pi Zero
+LEVELS = {'gzip': 6, 'bz2': 9, 'lzma': 1}
+
+
+def _compressor(method, level=None):
+    if level is None:
+        level = LEVELS[method]
+    if method == 'gzip':
+        # wbits 31: gzip header and trailer
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    if method == 'bz2':
+        return bz2.BZ2Compressor(level)
+    return lzma.LZMACompressor(preset=level)
+
+
+def _decompressor(method):
+    if method == 'gzip':
+        return zlib.decompressobj(31)
+    if method == 'bz2':
+        return bz2.BZ2Decompressor()
+    return lzma.LZMADecompressor()
+
+
+def _method_of(path):
+    for method, suffix in SUFFIXES.items():
+        if str(path).endswith(suffix):
+            return method
+    raise ValueError("Unknown compression suffix of {}".format(path))
+
+
+def read_compressed(path, method=None, terminator=b'\n') -> bytes:
+    """
+    Decompress a file written by :class:`CompressingWriter`, up to its last
+    flush point.
+
+    A file which was not closed (the logger crashed) ends in an incomplete
+    flush block, which is ignored; if `terminator` is set the data is
+    truncated after its last complete line.
+
+    Parameters
+    ----------
+    path : str or Path
+    method : str, Optional
+        gzip, bz2 or lzma, default is chosen by the file suffix
+    terminator : bytes, Optional
+        Line terminator, None returns all the data decompressed
+
+    """
+    method = method or _method_of(path)
+    data = Path(str(path)).read_bytes()
+    output = bytearray()
+    complete = True
+    # bz2 and lzma files are a series of streams, one per flush block
+    while data:
+        decompressor = _decompressor(method)
+        try:
+            output += decompressor.decompress(data)
+        except (OSError, EOFError, zlib.error, lzma.LZMAError):
+            complete = False
+            break
+        if not decompressor.eof:
+            complete = False
+            break
+        data = decompressor.unused_data
+    if not complete and terminator:
+        del output[output.rfind(terminator) + len(terminator):]
+    return bytes(output)
+
+
+class CompressingWriter(GroupCommitWriter):
+    """
+    Group commit writer which compresses the file with gzip, bz2 or lzma.
+
+    Each commit is a flush point: the data is compressed and the compressor
+    flushed, so that everything committed can be decompressed. gzip uses a
+    sync flush, which keeps the compression dictionary across flush points.
+    bz2 and lzma have no sync flush, so each commit ends a compressed
+    stream and the file is a series of streams (which bzip2, xz and the
+    Python modules read as one); they compress well only with large flush
+    blocks (e.g. a flush_interval of a minute).
+
+    A crash loses at most the flush block in progress, the file can be read
+    up to its last flush point with :func:`read_compressed`. The file name
+    gets the method's suffix (.gz, .bz2 or .xz).
+
+    Parameters
+    ----------
+    path : str or Path
+        File to write
+    method : str, Optional
+        gzip, bz2 or lzma
+    level : int, Optional
+        Compression level (preset for lzma)
+
+    Other keyword arguments are passed to :class:`GroupCommitWriter`.
+
+    """
+    def __init__(self, path, method='gzip', level=None, **kwargs):
+        if method not in SUFFIXES:
+            raise ValueError("Unknown compression method {}".format(method))
+        self.method = method
+        self.level = level
+        self._compressor = None
+        self.compressed_bytes = 0
+        self.compress_time = 0.0
+        path = Path(str(path))
+        if not path.name.endswith(SUFFIXES[method]):
+            path = path.with_name(path.name + SUFFIXES[method])
+        super().__init__(path, **kwargs)
+
+    def open(self):
+        super().open()
+        self._compressor = _compressor(self.method, self.level)
+
+    def _write(self, view):
+        start = time.perf_counter()
+        data = self._compressor.compress(view)
+        if self.method == 'gzip':
+            data += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            data += self._compressor.flush()
+            self._compressor = _compressor(self.method, self.level)
+        self.compress_time += time.perf_counter() - start
+        self.compressed_bytes += len(data)
+        super()._write(memoryview(data))
+
+    def close(self):
+        if self._fd is None:
+            return
+        try:
+            self.flush()
+            if self.method == 'gzip':
+                # End the stream with the gzip trailer
+                tail = self._compressor.flush()
+                super()._write(memoryview(tail))
+                self.compressed_bytes += len(tail)
+        finally:
+            super().close()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(method=self.method,
+                     compressed_bytes=self.compressed_bytes,
+                     compress_time=self.compress_time,
+                     ratio=self.bytes_written / self.compressed_bytes
+                     if self.compressed_bytes else 0.0)
+        return stats
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+"""
+CPU affinity and scheduling class of the pipeline threads.
+
+Policies are configured in the rcParams 'scheduling' section, keyed by
+thread name, e.g.
+
+    "scheduling": {
+        "listener": {"cpus": [3], "policy": "fifo", "priority": 50},
+        "dispatcher": {"cpus": [0, 1, 2]},
+        "plugins": {"cpus": [0, 1, 2], "nice": 5},
+        "usb": {"policy": "idle"}
+    }
+
+'listener' applies to the serial reader thread (or listener process),
+'dispatcher' to the Dispatcher thread, 'plugins' to every PluginInterface
+thread and 'daemons' to the worker threads running PluginDaemon jobs. A
+plugin can be configured individually by its class name or module name
+(e.g. 'datalogger' or 'logger', 'usb'), which takes precedence over
+'plugins' and 'daemons'; a daemon with a policy of its own runs on a
+dedicated worker thread. Policies are applied once by each thread when it
+starts.
+
+Each policy may set:
+cpus - list of CPUs the thread may run on (sched_setaffinity)
+policy - scheduling class: other, batch, idle, fifo or rr
+priority - real-time priority for fifo/rr (1-99)
+nice - nice level of the thread
+
+Settings which cannot be applied (missing permissions, e.g. real-time
+scheduling without CAP_SYS_NICE, or an unsupported platform) are logged
+once and skipped, the thread runs with its inherited settings.
+
+"""
+
+import os
+import logging
+import contextlib
+
+from .runconfig import rcParams
+
+__all__ = ['apply_policy', 'policy', 'get_policy', 'thread_names']
+LOG = logging.getLogger(__name__)
+
+
+_POLICIES = {name: getattr(os, 'SCHED_' + name.upper(), None)
+             for name in ('other', 'batch', 'idle', 'fifo', 'rr')}
+_warned = set()
+
+
+def thread_names(obj, default) -> list:
+    """Configuration names of a plugin instance or class, most specific
+    first"""
+    klass = obj if isinstance(obj, type) else obj.__class__
+    # Process isolated plugins (atgmlogger.isolation) use the names of the
+    # plugin they run, their child process inherits the thread's policy
+    klass = getattr(klass, 'target', None) or klass
+    while klass.__name__.startswith('Isolated') and klass.__bases__:
+        klass = klass.__bases__[0]
+    return [klass.__name__.lower(),
+            klass.__module__.rsplit('.', 1)[-1].lower(), default]
+
+
+def get_policy(names, config=None):
+    """Return the first policy (dict) configured for one of names, or
+    None"""
+    if config is None:
+        config = rcParams['scheduling']
+    if not config:
+        return None
+    if isinstance(names, str):
+        names = [names]
+    for name in names:
+        spec = config.get(name)
+        if spec:
+            return spec
+    return None
+
+
+def _warn(name, setting, error):
+    if (name, setting) not in _warned:
+        _warned.add((name, setting))
+        LOG.warning("Unable to apply %s scheduling setting to the %s "
+                    "thread: %s", setting, name, error)
+
+
+def _apply(name, spec, tid) -> dict:
+    applied = {}
+    cpus = spec.get('cpus')
+    if cpus is not None:
+        try:
+            os.sched_setaffinity(tid, set(int(cpu) for cpu in cpus))
+            applied['cpus'] = sorted(cpus)
+        except (OSError, AttributeError, ValueError) as e:
+            _warn(name, 'cpus', e)
+
+    sched = spec.get('policy')
+    if sched is not None:
+        try:
+            policy_id = _POLICIES[str(sched).lower()]
+            if policy_id is None:
+                raise AttributeError("policy {} is not supported on this "
+                                     "platform".format(sched))
+            priority = int(spec.get('priority') or 0) \
+                if str(sched).lower() in ('fifo', 'rr') else 0
+            os.sched_setscheduler(tid, policy_id, os.sched_param(priority))
+            applied['policy'] = str(sched).lower()
+            applied['priority'] = priority
+        except (OSError, AttributeError, KeyError, ValueError) as e:
+            _warn(name, 'policy', e)
+
+    nice = spec.get('nice')
+    if nice is not None:
+        try:
+            # On Linux the nice level is per thread
+            os.setpriority(os.PRIO_PROCESS, tid, int(nice))
+            applied['nice'] = int(nice)
+        except (OSError, AttributeError, ValueError) as e:
+            _warn(name, 'nice', e)
+    return applied
+
+
+def apply_policy(names, tid=0, config=None) -> dict:
+    """
+    Apply the scheduling policy configured for the thread `tid` (0 for the
+    calling thread).
+
+    Parameters
+    ----------
+    names : str or List[str]
+        Configuration names of the thread, the first configured is used
+    tid : int, Optional
+        Native thread id
+    config : dict, Optional
+        Policies, default is the rcParams 'scheduling' section
+
+    Returns
+    -------
+    dict : the settings which were applied
+
+    """
+    spec = get_policy(names, config)
+    if spec is None:
+        return {}
+    name = names if isinstance(names, str) else names[0]
+    applied = _apply(name, spec, tid)
+    if applied:
+        LOG.debug("Applied scheduling policy %s to the %s thread", applied,
+                  name)
+    return applied
+
+
+def _current(tid=0) -> dict:
+    current = {}
+    try:
+        current['cpus'] = sorted(os.sched_getaffinity(tid))
+        policy_id = os.sched_getscheduler(tid)
+        current['policy'] = {v: k for k, v in _POLICIES.items()
+                             if v is not None}.get(policy_id, 'other')
+        current['priority'] = os.sched_getparam(tid).sched_priority
+        current['nice'] = os.getpriority(os.PRIO_PROCESS, tid)
+    except (OSError, AttributeError):
+        pass
+    return current
+
+
+@contextlib.contextmanager
+def policy(names, config=None):
+    """Apply a policy to the calling thread for the duration of the context,
+    restoring the previous settings after.
+
+    Restoring a priority which the policy lowered (e.g. the idle class or a
+    higher nice level) requires CAP_SYS_NICE, without it the thread keeps
+    the policy."""
+    spec = get_policy(names, config)
+    if spec is None:
+        yield {}
+        return
+    previous = _current()
+    name = names if isinstance(names, str) else names[0]
+    try:
+        yield _apply(name, spec, 0)
+    finally:
+        _apply(name, {k: v for k, v in previous.items() if k in spec or
+                      (k == 'priority' and 'policy' in spec)}, 0)
+
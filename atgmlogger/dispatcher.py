@@ -1,24 +1,61 @@
 # -*- coding: utf-8 -*-
 # This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
 
+import time
 import queue
+import types
 import logging
+import functools
 import threading
-from weakref import WeakSet
 
 from .plugins import PluginInterface, PluginDaemon
+from .channels import PriorityChannel
+from .scheduler import Scheduler
+from .workers import WorkerPool
+from . import cpusched
 
 LOG = logging.getLogger(__name__)
 POLL_INTV = 1
 
 
+class _registrymethod:
+    """
+    Decorator for Dispatcher registry methods - the method is bound to the
+    class when called on the class (e.g. @Dispatcher.register), or to the
+    instance when called on an instance, so that instances created with a
+    private registry operate on their own plugin set.
+
+    """
+    def __init__(self, func):
+        self.__func__ = func
+        functools.update_wrapper(self, func)
+
+    def __get__(self, obj, objtype=None):
+        return types.MethodType(self.__func__,
+                                obj if obj is not None else objtype)
+
+
 class Dispatcher(threading.Thread):
+    """
+    Route items from the collector queue to registered plugins.
+
+    By default all Dispatcher instances share the class level plugin
+    registry. An instance created with `private_registry=True` has its own
+    registry and run lock, allowing several independent pipelines (e.g. one
+    per serial port) in one process.
+
+    The run loop blocks until an item arrives or a scheduler timer expires,
+    it does not poll. To stop the dispatcher call :meth:`exit`, which wakes
+    the loop with an exit sentinel; setting `sigExit` alone is only noticed
+    on the next wakeup. The number of wakeups is reported by :meth:`stats`.
+
+    """
     _listeners = set()  # Registered Regular Plugins
     _daemons = set()  # Registered Daemon Plugins
     _params = {}
     _runlock = threading.Lock()
 
-    @classmethod
+    @_registrymethod
     def register(cls, klass, **params):
         cls.acquire_lock()
         assert klass is not None
@@ -40,7 +77,7 @@ class Dispatcher(threading.Thread):
         cls.release_lock()
         return klass
 
-    @classmethod
+    @_registrymethod
     def detach(cls, klass):
         LOG.debug("Attempting to detach %s", str(klass))
         if klass in cls._listeners:
@@ -49,30 +86,55 @@ class Dispatcher(threading.Thread):
         elif klass in cls._daemons:
             cls._daemons.remove(klass)
 
-    @classmethod
+    @_registrymethod
     def detach_all(cls):
         cls._listeners.clear()
         cls._daemons.clear()
-        cls._params = {}
+        cls._params.clear()
 
-    @classmethod
+    @_registrymethod
     def acquire_lock(cls, blocking=True):
         return cls._runlock.acquire(blocking=blocking)
 
-    @classmethod
+    @_registrymethod
     def release_lock(cls):
         cls._runlock.release()
 
-    def __init__(self, collector=None, sigExit=None):
-        super().__init__(name=self.__class__.__name__)
+    def __init__(self, collector=None, sigExit=None, encoding='utf-8',
+                 private_registry=False, name=None, fanout='queue',
+                 ring_size=1024, daemon_workers=2):
+        super().__init__(name=name or self.__class__.__name__)
+        if private_registry:
+            self._listeners = set()
+            self._daemons = set()
+            self._params = {}
+            self._runlock = threading.Lock()
+        # Encoding used to decode bytes items for text (str) only plugins
+        self.encoding = encoding
         self.sigExit = sigExit or threading.Event()
-        self._queue = collector or queue.Queue()
+        self._queue = collector or PriorityChannel()
         self._threads = set()
-        self._active_daemons = WeakSet()
-        self._context = AppContext(self.message_queue)
+        # Daemon plugin jobs are run by a persistent pool of threads
+        self._workers = WorkerPool(daemon_workers,
+                                   initializer=self._init_worker)
+        self._context = AppContext(self.message_queue, encoding=encoding)
+        self._routes = {}
+        self._text_routes = ()
         self._tick = 0
-
-    @classmethod
+        # Number of times the run loop woke up (for an item or a timer)
+        self.wakeups = 0
+        # 'queue' puts each item on the queue of every subscriber,
+        # 'broadcast' publishes each item once to a BroadcastRing read by
+        # every plugin through its own cursor
+        if fanout not in ('queue', 'broadcast'):
+            raise ValueError("Invalid fanout mode: {}".format(fanout))
+        self.fanout = fanout
+        self.ring_size = ring_size
+        self._ring = None
+        self._scheduler = Scheduler()
+        self._legacy_daemons = ()
+
+    @_registrymethod
     def __contains__(cls, item):
         return item in cls._listeners or item in cls._daemons
 
@@ -83,12 +145,11 @@ class Dispatcher(threading.Thread):
     def put(self, item):
         self._queue.put_nowait(item)
 
-    def run(self):
-        self.acquire_lock(blocking=True)
-        LOG.debug("Dispatcher run acquired runlock")
-
-        # Create perpetual listener threads
-        listener_map = {}
+    def _create_plugins(self) -> list:
+        """Instantiate and configure the registered plugins, and build the
+        routing table. Returns the list of plugin instances (not started)."""
+        instances = []
+        routes = {}  # Dict[item type: List[subscriber]]
         for listener in self._listeners:
             try:
                 instance = listener()
@@ -100,44 +161,184 @@ class Dispatcher(threading.Thread):
             else:
                 ctypes = instance.consumer_type()
                 for ctype in ctypes:
-                    consumer_set = listener_map.setdefault(ctype, WeakSet())
-                    consumer_set.add(instance)
+                    routes.setdefault(ctype, []).append(instance)
+                instances.append(instance)
+        # Routing table is fixed for the lifetime of the run loop
+        self._routes = {k: tuple(v) for k, v in routes.items()}
+        # Plugins which consume text but not bytes, bytes items are decoded
+        # for these plugins only
+        self._text_routes = tuple(sub for sub in self._routes.get(str, ())
+                                  if sub not in self._routes.get(bytes, ()))
+        return instances
 
-                instance.start()
-                self._threads.add(instance)
+    def run(self):
+        self.acquire_lock(blocking=True)
+        LOG.debug("Dispatcher run acquired runlock")
+        cpusched.apply_policy('dispatcher')
+
+        instances = self._create_plugins()
+        if self.fanout == 'broadcast':
+            from .broadcast import BroadcastRing
+            self._ring = BroadcastRing(self.ring_size)
+            for instance in instances:
+                channel = instance.queue
+                if getattr(channel, 'maxsize', 0):
+                    # Cursors read every item from the ring, the plugin's
+                    # bounded channel (and its coalescing) is not used
+                    LOG.warning("Plugin %s channel (policy %s, maxsize %d) "
+                                "is ignored with broadcast fanout.",
+                                instance.__class__.__name__, channel.policy,
+                                channel.maxsize)
+                instance.queue = self._ring.subscribe(
+                    types=instance.consumer_type(), batched=instance.batched,
+                    lossless=instance.lossless, encoding=self.encoding,
+                    name=instance.__class__.__name__, thread=instance)
 
-        daemons = {}  # Dict[daemon: instance of daemon]
+        # Create perpetual listener threads
+        for instance in instances:
+            instance.start()
+            self._threads.add(instance)
+
+        scheduler = self._setup_scheduler()
+        # The loop is tickless: it only wakes for an item, the next scheduler
+        # timer, or the exit sentinel (see exit). Daemons without triggers
+        # are polled every POLL_INTV seconds, as they may expect to be.
+        idle = POLL_INTV if self._legacy_daemons else None
         while not self.sigExit.is_set():
             self._tick += 1
+            timeout = idle
+            deadline = scheduler.next_deadline()
+            if deadline is not None:
+                timeout = max(0, deadline - time.monotonic())
+                if idle is not None:
+                    timeout = min(timeout, idle)
             try:
-                item = self._queue.get(block=True, timeout=POLL_INTV)
+                item = self._queue.get(block=True, timeout=timeout)
             except queue.Empty:
                 item = None
+                self.wakeups += 1
             else:
-                for subscriber in listener_map.get(type(item), set()):
-                    subscriber.put(item)
+                self.wakeups += 1
+                self._route(item)
                 self._queue.task_done()
-
-            # Check if a daemon needs to be spawned
-            for daemon in self._daemons:
-                if daemon not in daemons and daemon.condition(item):
-                    try:
-                        inst = daemon(context=self._context, data=item)
-                        inst.start()
-                        daemons[daemon] = inst
-                    except TypeError:
-                        LOG.exception("Type error when instantiating "
-                                      "daemon: %s", str(daemon))
-            # Prune finished daemon threads from the dict
-            daemons = {k: v for k, v in daemons.items() if v.is_alive()}
-
+                self._count(item)
+
+            if scheduler.due():
+                for daemon, data in scheduler.poll():
+                    self._start_daemon(daemon, data)
+            if self._legacy_daemons:
+                if isinstance(item, Batch):
+                    for line in item:
+                        self._spawn_daemons(line)
+                else:
+                    self._spawn_daemons(item)
+
+        scheduler.stop_sources()
         self.release_lock()
 
+    def _setup_scheduler(self) -> Scheduler:
+        """Add the triggers of each registered daemon to the scheduler,
+        daemons which declare no triggers have their condition() evaluated
+        for every item (legacy behavior)."""
+        legacy = []
+        for daemon in self._daemons:
+            triggers = daemon.triggers()
+            if triggers is None:
+                legacy.append(daemon)
+                continue
+            for trigger in triggers:
+                self._scheduler.add(daemon, trigger)
+        self._legacy_daemons = tuple(legacy)
+        self._scheduler.start_sources(self.fire)
+        return self._scheduler
+
+    def _count(self, item):
+        """Count data lines for Rate triggers"""
+        if isinstance(item, Batch):
+            if item and item.item_type in (str, bytes):
+                self._scheduler.count(len(item), item[-1])
+        elif type(item) in (str, bytes):
+            self._scheduler.count(1, item)
+
+    def fire(self, event, data=None):
+        """Fire a named event, starting daemons with an Event trigger for
+        it. This may be called from any thread."""
+        self._scheduler.fire(event, data)
+        self._queue.put_nowait(None)
+
+    def _route(self, item):
+        if self._ring is not None:
+            item_type = item.item_type if isinstance(item, Batch) \
+                else type(item)
+            if item_type in self._routes or \
+                    (item_type is bytes and self._text_routes):
+                self._ring.publish(item)
+            return
+        if isinstance(item, Batch):
+            for subscriber in self._routes.get(item.item_type, ()):
+                subscriber.put_batch(item)
+            if item.item_type is bytes and self._text_routes:
+                text = Batch((line.decode(self.encoding, errors='ignore')
+                              for line in item), item_type=str)
+                for subscriber in self._text_routes:
+                    subscriber.put_batch(text)
+        else:
+            for subscriber in self._routes.get(type(item), ()):
+                subscriber.put(item)
+            if type(item) is bytes and self._text_routes:
+                text = item.decode(self.encoding, errors='ignore')
+                for subscriber in self._text_routes:
+                    subscriber.put(text)
+
+    def _spawn_daemons(self, item):
+        # Check if a daemon needs to be spawned
+        for daemon in self._legacy_daemons:
+            if not self._workers.busy(daemon) and daemon.condition(item):
+                self._start_daemon(daemon, item)
+
+    def _start_daemon(self, daemon, data):
+        if self._workers.busy(daemon):
+            # The previous run has not finished
+            return
+        try:
+            inst = daemon(context=self._context, data=data)
+        except TypeError:
+            LOG.exception("Type error when instantiating "
+                          "daemon: %s", str(daemon))
+            return
+        self._workers.submit(daemon, inst.run, self._daemon_done,
+                             lane=self._daemon_lane(daemon))
+
+    @staticmethod
+    def _daemon_lane(daemon):
+        """Return the worker lane of a daemon: daemons with a scheduling
+        policy of their own (by class or module name) run on a dedicated
+        worker with that policy, others share the workers running the
+        'daemons' policy."""
+        for name in cpusched.thread_names(daemon, 'daemons')[:-1]:
+            if cpusched.get_policy(name) is not None:
+                return name
+        return None
+
+    @staticmethod
+    def _init_worker(lane):
+        cpusched.apply_policy(lane or 'daemons')
+
+    @staticmethod
+    def _daemon_done(daemon, error):
+        LOG.debug("Daemon %s finished", daemon.__name__)
+
     def _exit_threads(self, join=False):
         for thread in self._threads:
+            stats = thread.stats()
+            if stats.get('dropped'):
+                LOG.warning("Plugin %s dropped %d of %d items (channel "
+                            "policy %s, high water mark %d)",
+                            thread.__class__.__name__, stats['dropped'],
+                            stats['received'], stats['policy'],
+                            stats['high_water'])
             thread.exit(join=join)
-        for daemon in self._active_daemons:
-            daemon.exit(join=join)
+        self._workers.shutdown(wait=join, timeout=1)
 
     def exit(self, join=False):
         self.sigExit.set()
@@ -150,6 +351,18 @@ class Dispatcher(threading.Thread):
         if join:
             self.join()
 
+    def stats(self) -> dict:
+        """Return the channel statistics of each running plugin, and the
+        per priority class statistics of the message queue ('collector')"""
+        stats = {obj.__class__.__name__: obj.stats() for obj in self._threads}
+        stats['daemons'] = self._workers.stats()
+        stats['wakeups'] = self.wakeups
+        try:
+            stats['collector'] = self._queue.stats()
+        except AttributeError:
+            stats['collector'] = dict(depth=self._queue.qsize())
+        return stats
+
     def get_instance_of(self, klass):
         for obj in self._threads:
             if isinstance(obj, klass):
@@ -161,7 +374,32 @@ class Dispatcher(threading.Thread):
         self.put(Command('rotate'))
 
 
+class Batch(list):
+    """
+    A list of items of a single type (e.g. every line framed from one serial
+    read) which is passed through the dispatcher as one queue item.
+
+    Batches are routed to the subscribers of `item_type`; plugins which set
+    `batched = True` receive the Batch itself, other plugins receive the
+    items individually.
+
+    `rx_mono_ns` and `rx_wall_ns` are the host monotonic and wall clock
+    times (nanoseconds) at which the data was read, if timestamps are
+    enabled in the listener.
+
+    """
+    def __init__(self, items=(), item_type=str, rx_mono_ns=None,
+                 rx_wall_ns=None):
+        super().__init__(items)
+        self.item_type = item_type
+        self.rx_mono_ns = rx_mono_ns
+        self.rx_wall_ns = rx_wall_ns
+
+
 class Blink:
+    # Dispatched after data, and droppable under load (see PriorityChannel)
+    lane = 'indicator'
+
     def __init__(self, led, priority=5, frequency=0.1, continuous=False):
         self.led = led
         self.priority = priority
@@ -180,8 +418,13 @@ class Command:
 
 
 class AppContext:
-    def __init__(self, listener_queue):
+    def __init__(self, listener_queue, encoding='utf-8'):
         self._queue = listener_queue
+        # Encoding of the serial data, for plugins which decode bytes lines
+        self.encoding = encoding
+
+    def put(self, item):
+        self._queue.put_nowait(item)
 
     def blink(self, led='data', freq=0.04):
         cmd = Blink(led=led, frequency=freq)
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import abc
+import zlib
+import logging
+import binascii
+
+__all__ = ['Framer', 'LineFramer', 'FixedLengthFramer', 'DelimitedFramer',
+           'FRAMERS', 'get_framer', 'framer_text']
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 4096
+
+
+def _xor8(data) -> int:
+    """XOR of all bytes in data, computed by folding a single integer rather
+    than iterating bytes in Python."""
+    value = int.from_bytes(data, 'little')
+    nbits = len(data) * 8
+    while nbits > 8:
+        half = ((nbits // 8 + 1) // 2) * 8
+        value = (value & ((1 << half) - 1)) ^ (value >> half)
+        nbits = half
+    return value
+
+
+def _as_bytes(value) -> bytes:
+    """Convert a configuration value (str or bytes) to bytes, str values are
+    encoded as latin-1 so that e.g. "\\u0002" in JSON is STX (0x02)"""
+    if isinstance(value, str):
+        return value.encode('latin-1')
+    return bytes(value)
+
+
+class Framer(metaclass=abc.ABCMeta):
+    """
+    Base class for framers which extract records from a stream of raw serial
+    reads.
+
+    Incoming data is copied into a fixed capacity buffer which is allocated
+    once; every complete frame contained in a chunk is returned from a single
+    call to :meth:`feed`. Only the trailing partial frame is ever moved (to
+    the front of the buffer) so the per-frame cost does not depend on how
+    much data is pending.
+
+    If the buffer fills without a frame being completed (e.g. line noise or
+    a mis-configured baudrate) the pending bytes are discarded and the framer
+    re-synchronizes on the next frame boundary, so memory use is capped at
+    `capacity` bytes.
+
+    Subclasses implement :meth:`_extract`, and set `text` to indicate whether
+    frames are text lines (which are sanitized and decoded) or binary
+    records.
+
+    Parameters
+    ----------
+    capacity : int, Optional
+        Size of the framing buffer in bytes, this is also the maximum length
+        of a frame.
+
+    """
+    text = True
+
+    @classmethod
+    def is_text(cls, **params) -> bool:
+        """Whether frames of a framer created with params are text"""
+        return cls.text
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity < 2:
+            raise ValueError("Framer capacity must be at least 2 bytes.")
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._capacity = capacity
+        self._start = 0
+        self._end = 0
+        self._resync = False
+
+        self.frames = 0
+        self.errors = 0
+        self.overflows = 0
+        self.discarded = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def __len__(self):
+        """Return the number of pending (un-framed) bytes"""
+        return self._end - self._start
+
+    def reset(self):
+        self._start = self._end = 0
+        self._resync = False
+
+    def stats(self) -> dict:
+        return dict(frames=self.frames, errors=self.errors,
+                    overflows=self.overflows, discarded=self.discarded,
+                    pending=len(self))
+
+    def feed(self, data) -> list:
+        """
+        Add a chunk of raw data to the framer, and return a list of all
+        complete frames now available.
+
+        """
+        frames = []
+        if not data:
+            return frames
+        src = memoryview(data)
+        offset = 0
+        total = len(src)
+        while offset < total:
+            if self._end == self._capacity:
+                self._compact()
+            count = min(self._capacity - self._end, total - offset)
+            end = self._end + count
+            self._view[self._end:end] = src[offset:offset + count]
+            scan_from = self._end
+            self._end = end
+            offset += count
+            self._extract(frames, scan_from)
+            if self._start == self._end:
+                self._start = self._end = 0
+        return frames
+
+    @abc.abstractmethod
+    def _extract(self, frames, pos):
+        """
+        Append all complete frames in the pending region of the buffer
+        (`_start` to `_end`) to frames, and advance `_start` past them.
+
+        Parameters
+        ----------
+        frames : list
+        pos : int
+            Offset of the first byte added by the current chunk, data before
+            this has already been scanned.
+
+        """
+        pass
+
+    def _compact(self):
+        pending = self._end - self._start
+        if self._start == 0:
+            # Buffer is full and contains no complete frame - drop the data
+            # and re-synchronize on the next frame boundary.
+            self.overflows += 1
+            self.discarded += pending
+            self._resync = True
+            self._start = self._end = 0
+            LOG.warning("Framing buffer overflow, discarded %d bytes without "
+                        "a complete frame.", pending)
+            return
+        self._buf[:pending] = self._buf[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+
+class LineFramer(Framer):
+    """
+    Frame text lines terminated by `delimiter` (default newline), lines are
+    returned including the delimiter.
+
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, delimiter=b'\n'):
+        super().__init__(capacity=capacity)
+        self._delim = _as_bytes(delimiter)
+
+    def _extract(self, frames, pos):
+        buf = self._buf
+        delim = self._delim
+        dlen = len(delim)
+        start = self._start
+        end = self._end
+        # A multi-byte delimiter may straddle the previous chunk boundary
+        pos = max(start, pos - dlen + 1)
+
+        i = buf.find(delim, pos, end)
+        if self._resync:
+            if i < 0:
+                self.discarded += end - start
+                self._start = self._end
+                return
+            self.discarded += i + dlen - start
+            start = i + dlen
+            self._resync = False
+            i = buf.find(delim, start, end)
+
+        view = self._view
+        while i >= 0:
+            frames.append(bytes(view[start:i + dlen]))
+            self.frames += 1
+            start = i + dlen
+            i = buf.find(delim, start, end)
+        self._start = start
+
+
+class FixedLengthFramer(Framer):
+    """
+    Frame fixed length binary records.
+
+    If a `sync` pattern is specified each record must begin with it; when a
+    record does not, bytes are discarded up to the next occurrence of the
+    pattern.
+
+    Parameters
+    ----------
+    size : int
+        Record length in bytes (including any sync pattern)
+    sync : bytes, Optional
+        Pattern marking the start of each record
+    capacity : int, Optional
+
+    """
+    text = False
+
+    def __init__(self, size, sync=None, capacity=DEFAULT_CAPACITY):
+        size = int(size)
+        if size < 1 or size > capacity:
+            raise ValueError("Record size must be between 1 and the framer "
+                             "capacity ({}).".format(capacity))
+        sync = _as_bytes(sync) if sync else b''
+        if len(sync) > size:
+            raise ValueError("Sync pattern must not be longer than the "
+                             "record size.")
+        super().__init__(capacity=capacity)
+        self.size = size
+        self._sync = sync
+
+    def _extract(self, frames, pos):
+        buf = self._buf
+        view = self._view
+        size = self.size
+        sync = self._sync
+        start = self._start
+        end = self._end
+        while end - start >= size:
+            if sync and not buf.startswith(sync, start):
+                i = buf.find(sync, start + 1, end)
+                if i < 0:
+                    # Keep a possible partial sync pattern at the end
+                    i = max(start, end - len(sync) + 1)
+                self.errors += 1
+                self.discarded += i - start
+                start = i
+                continue
+            frames.append(bytes(view[start:start + size]))
+            self.frames += 1
+            start += size
+        self._start = start
+
+
+class DelimitedFramer(Framer):
+    """
+    Frame records enclosed by start and end delimiters and followed by a
+    checksum, e.g. STX/ETX framed binary records or NMEA style sentences
+    ($...*CS). Frames with an invalid checksum are counted and dropped.
+
+    Returned frames include the delimiters and checksum.
+
+    Delimiters are not escaped: a frame ends at the first end delimiter
+    after its start, so payloads must not contain the end delimiter (e.g.
+    ETX in STX/ETX framed records). The checksum following it may contain
+    any bytes.
+
+    Parameters
+    ----------
+    start : bytes, Optional
+        Start of frame delimiter, default '$'
+    end : bytes, Optional
+        End of payload delimiter, default '*'
+    checksum : str, Optional
+        Checksum following the end delimiter, calculated over the payload
+        between the delimiters:
+        'nmea' two hex digits of the XOR of the payload bytes,
+        'xor' single byte XOR of the payload bytes,
+        'crc16' two byte (big-endian) CRC-16/CCITT,
+        'crc32' four byte (big-endian) CRC-32,
+        or None for no checksum
+    text : bool, Optional
+        Whether frames are text (default True for 'nmea' or no checksum)
+    capacity : int, Optional
+
+    """
+    CHECKSUMS = {
+        None: 0,
+        'nmea': 2,
+        'xor': 1,
+        'crc16': 2,
+        'crc32': 4
+    }
+
+    def __init__(self, start=b'$', end=b'*', checksum='nmea', text=None,
+                 capacity=DEFAULT_CAPACITY):
+        super().__init__(capacity=capacity)
+        if checksum is not None:
+            checksum = str(checksum).lower()
+        if checksum not in self.CHECKSUMS:
+            raise ValueError("Invalid checksum type: {}".format(checksum))
+        self._sof = _as_bytes(start)
+        self._eof = _as_bytes(end)
+        if not self._sof or not self._eof:
+            raise ValueError("Start and end delimiters must not be empty.")
+        self.checksum = checksum
+        self._trailer = self.CHECKSUMS[checksum]
+        self.text = self.is_text(checksum=checksum, text=text)
+
+    @classmethod
+    def is_text(cls, checksum='nmea', text=None, **params) -> bool:
+        if text is not None:
+            return bool(text)
+        if checksum is not None:
+            checksum = str(checksum).lower()
+        return checksum in (None, 'nmea')
+
+    def _verify(self, payload, trailer) -> bool:
+        if self.checksum is None:
+            return True
+        elif self.checksum == 'nmea':
+            try:
+                return int(bytes(trailer), 16) == _xor8(payload)
+            except ValueError:
+                return False
+        elif self.checksum == 'xor':
+            return trailer[0] == _xor8(payload)
+        elif self.checksum == 'crc16':
+            return int.from_bytes(trailer, 'big') == \
+                binascii.crc_hqx(payload, 0xFFFF)
+        else:
+            return int.from_bytes(trailer, 'big') == \
+                zlib.crc32(payload) & 0xFFFFFFFF
+
+    def _extract(self, frames, pos):
+        buf = self._buf
+        view = self._view
+        sof, eof = self._sof, self._eof
+        slen, elen = len(sof), len(eof)
+        start = self._start
+        end = self._end
+
+        # Any data preceding a start of frame delimiter is discarded, which
+        # also re-synchronizes the framer after an overflow
+        while start < end:
+            i = buf.find(sof, start, end)
+            if i < 0:
+                keep = max(start, end - slen + 1)
+                self.discarded += keep - start
+                start = keep
+                break
+            self.discarded += i - start
+            start = i
+            # Data before pos has already been searched for the end delimiter
+            # (allowing for a delimiter and trailer split across chunks)
+            scan = max(start + slen, pos - elen - self._trailer + 1)
+            j = buf.find(eof, scan, end)
+            if j < 0:
+                break
+            frame_end = j + elen + self._trailer
+            if frame_end > end:
+                break
+            payload = view[start + slen:j]
+            if self._verify(payload, view[j + elen:frame_end]):
+                frames.append(bytes(view[start:frame_end]))
+                self.frames += 1
+            else:
+                self.errors += 1
+                self.discarded += frame_end - start
+            start = frame_end
+        self._start = start
+
+
+FRAMERS = {
+    'newline': LineFramer,
+    'fixed': FixedLengthFramer,
+    'delimited': DelimitedFramer
+}
+
+
+def _framer_class(spec):
+    if isinstance(spec, str):
+        spec = {'type': spec}
+    params = dict(spec)
+    name = str(params.pop('type', 'newline')).lower()
+    try:
+        return name, FRAMERS[name], params
+    except KeyError:
+        raise ValueError("Unknown framer type: {}".format(name))
+
+
+def framer_text(spec=None) -> bool:
+    """Whether the framer configured by spec (see :func:`get_framer`)
+    produces text frames, without creating the framer"""
+    if spec is None:
+        return LineFramer.text
+    _, klass, params = _framer_class(spec)
+    return klass.is_text(**params)
+
+
+def get_framer(spec=None) -> Framer:
+    """
+    Create a framer from a configuration value.
+
+    Parameters
+    ----------
+    spec : str or dict, Optional
+        Framer type name (one of FRAMERS), or a dict with a 'type' key and
+        keyword parameters for the framer. Default is a newline framer.
+
+    Raises
+    ------
+    ValueError
+        If the framer type is unknown or parameters are invalid
+
+    """
+    if spec is None:
+        return LineFramer()
+    name, klass, params = _framer_class(spec)
+    try:
+        return klass(**params)
+    except TypeError as e:
+        raise ValueError("Invalid parameters for {} framer: {}"
+                         .format(name, e))
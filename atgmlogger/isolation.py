@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import time
+import queue
+import pickle
+import signal
+import logging
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+
+from .plugins import PluginInterface, PluginDaemon
+from .dispatcher import AppContext
+
+__all__ = ['IsolatedPlugin', 'isolated']
+LOG = logging.getLogger(__name__)
+
+
+class _PipeQueue:
+    """Stand-in for the dispatcher queue in a child process, items put by
+    the plugin context (LED blinks, commands) are sent back to the parent
+    over a pipe."""
+    def __init__(self, conn):
+        self._conn = conn
+        self._lock = threading.Lock()
+
+    def put_nowait(self, item):
+        with self._lock:
+            try:
+                self._conn.send(item)
+            except (OSError, ValueError):
+                pass
+
+    put = put_nowait
+
+
+def _get_context():
+    """Return the multiprocessing context used to start isolated plugins.
+
+    The logger process is multithreaded, and a child forked from it may
+    inherit locks (e.g. of the logging module) held by another thread at
+    the time of the fork, and deadlock. Children are instead started by the
+    forkserver (a single threaded server process), or spawned where it is
+    unavailable; so their targets and arguments must be picklable.
+
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _relay(conn, context):
+    """Forward context items sent by a child process to the parent's
+    context, until the child closes its end of the pipe"""
+    while True:
+        try:
+            item = conn.recv()
+        except (EOFError, OSError):
+            break
+        if context is not None:
+            context.put(item)
+    conn.close()
+
+
+def _plugin_process(target, options, encoding, inbox, outbox):
+    # The parent process handles shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    instance = target()
+    instance.set_context(AppContext(_PipeQueue(outbox), encoding=encoding))
+    instance.configure(**options)
+    instance.start()
+    try:
+        while True:
+            try:
+                batch = inbox.recv()
+            except EOFError:
+                break
+            if batch is None:
+                break
+            for item in batch:
+                instance.put(item)
+    finally:
+        instance.exit(join=True)
+        outbox.close()
+
+
+def _daemon_process(klass, options, encoding, data, outbox):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Daemon options are class attributes, which the child does not inherit
+    klass.configure(**options)
+    instance = klass(context=AppContext(_PipeQueue(outbox), encoding=encoding),
+                     data=data)
+    try:
+        instance.run()
+    finally:
+        outbox.close()
+
+
+class IsolatedPlugin(PluginInterface):
+    """
+    Proxy which runs a plugin (`target`) in a child process, so a CPU heavy
+    or blocking plugin cannot hold the GIL or delay the DataLogger.
+
+    The proxy is registered with the dispatcher in place of the plugin, and
+    receives the plugin's item types on a bounded drop-oldest channel; so if
+    the child falls behind, items for the child are dropped instead of
+    backing up the dispatcher. The proxy thread sends the pending items to
+    the child in batches (one pickled list per pipe message). Items the
+    child puts on its context (e.g. LED blinks) are relayed back to the
+    parent dispatcher.
+
+    If the child process dies it is restarted, with an exponential backoff
+    if it keeps failing; items received while waiting to restart are
+    dropped and counted.
+
+    The child is not forked from the (multithreaded) logger process, see
+    :func:`_get_context`. It imports the plugin's module, and gets the
+    plugin's options but not the logger's runtime state (e.g. a
+    configuration file given on the command line).
+
+    Use :func:`isolated` to create the proxy class for a plugin.
+
+    """
+    target = None  # type: type
+    channel = {'maxsize': 4096, 'policy': 'drop-oldest'}
+    # Maximum items per message to the child
+    batch_size = 256
+    # Restart backoff in seconds, doubled after each failure up to the max
+    min_backoff = 0.5
+    max_backoff = 30.0
+    # A child which ran for this long resets the backoff
+    stable_time = 10.0
+
+    def __init__(self):
+        super().__init__()
+        self._options = {}
+        self._ctx = _get_context()
+        self.process = None
+        self._inbox = None
+        self._spawned = 0.0
+        self._next_start = 0.0
+        self._backoff = self.min_backoff
+        self.restarts = 0
+        self.batches = 0
+        self.lost = 0
+
+    @classmethod
+    def condition(cls, *args):
+        return False
+
+    def configure(self, **options):
+        # The 'channel' option applies to the proxy, every other option is
+        # passed on to the plugin in the child process
+        if 'channel' in options:
+            super().configure(channel=options.pop('channel'))
+        else:
+            super().configure()
+        self._options = options
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(restarts=self.restarts, batches=self.batches,
+                     lost=self.lost,
+                     pid=self.process.pid if self.process else None)
+        return stats
+
+    def _spawn(self):
+        inbox_r, inbox_w = self._ctx.Pipe(duplex=False)
+        outbox_r, outbox_w = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_plugin_process, name='Isolated' + self.target.__name__,
+            args=(self.target, self._options,
+                  getattr(self.context, 'encoding', 'utf-8'), inbox_r,
+                  outbox_w), daemon=True)
+        process.start()
+        # Close the child's ends, so that a dead child is detected as a
+        # broken pipe
+        inbox_r.close()
+        outbox_w.close()
+        threading.Thread(target=_relay, args=(outbox_r, self.context),
+                         name=process.name + 'Relay', daemon=True).start()
+        self.process = process
+        self._inbox = inbox_w
+        self._spawned = time.monotonic()
+        LOG.info("Started plugin %s in process %d", self.target.__name__,
+                 process.pid)
+
+    def _alive(self) -> bool:
+        if self.process is not None and self.process.is_alive():
+            return True
+        now = time.monotonic()
+        if self.process is not None:
+            LOG.error("Isolated plugin %s exited with code %s",
+                      self.target.__name__, self.process.exitcode)
+            self._reap()
+            if now - self._spawned >= self.stable_time:
+                self._backoff = self.min_backoff
+            self._next_start = now + self._backoff
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+        if now < self._next_start:
+            return False
+        self.restarts += 1
+        self._spawn()
+        return True
+
+    def _reap(self):
+        if self._inbox is not None:
+            self._inbox.close()
+            self._inbox = None
+        self.process.join(timeout=1)
+        self.process = None
+
+    def _send(self, batch):
+        if not self._alive():
+            self.lost += len(batch)
+            return
+        try:
+            self._inbox.send(batch)
+            self.batches += 1
+        except (OSError, ValueError):
+            self.lost += len(batch)
+
+    def run(self):
+        self._spawn()
+        exiting = False
+        while not exiting:
+            batch = []
+            item = self.get()
+            while True:
+                if item is None:
+                    exiting = True
+                else:
+                    batch.append(item)
+                self.task_done()
+                if exiting or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._send(batch)
+            exiting = exiting or self.exiting
+
+        if self.process is not None and self.process.is_alive():
+            try:
+                self._inbox.send(None)
+            except (OSError, ValueError):
+                pass
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+        if self.process is not None:
+            self._reap()
+
+
+def _isolated_daemon_run(self):
+    """Run the wrapped daemon class in a child process, relaying its context
+    items until it exits"""
+    ctx = _get_context()
+    conn_r, conn_w = ctx.Pipe(duplex=False)
+    klass = self._isolated_target
+    options = {key: getattr(self, key) for key in klass.options
+               if hasattr(self, key)}
+    process = ctx.Process(target=_daemon_process,
+                          args=(klass, options,
+                                getattr(self.context, 'encoding', 'utf-8'),
+                                self.data, conn_w),
+                          name=self.__class__.__name__, daemon=True)
+    process.start()
+    conn_w.close()
+    pending = [conn_r, process.sentinel]
+    while pending:
+        for ready in wait(pending):
+            if ready is conn_r:
+                try:
+                    item = conn_r.recv()
+                except EOFError:
+                    pending.remove(conn_r)
+                    continue
+                if self.context is not None:
+                    self.context.put(item)
+            else:
+                pending.remove(ready)
+    conn_r.close()
+    process.join()
+    if process.exitcode:
+        raise RuntimeError("Isolated daemon {} exited with code {}".format(
+            self.__class__.__name__, process.exitcode))
+
+
+def isolated(klass) -> type:
+    """
+    Return a class which runs the plugin `klass` in a child process.
+
+    A PluginInterface plugin is wrapped by an :class:`IsolatedPlugin` proxy
+    with the same consumer types. A PluginDaemon is subclassed so that each
+    run executes an instance of `klass` in a new child process (started by
+    the dispatcher's worker pool as usual).
+
+    The class is pickled to the child process, so it must be importable
+    from its module.
+
+    Raises
+    ------
+    TypeError
+        If the class is not a plugin, or cannot be pickled
+
+    """
+    if not issubclass(klass, (PluginDaemon, PluginInterface)):
+        raise TypeError("Cannot isolate {}".format(klass))
+    try:
+        pickle.dumps(klass)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        raise TypeError("Cannot isolate {}, the class cannot be pickled: "
+                        "{}".format(klass, e))
+    name = 'Isolated' + klass.__name__
+    if issubclass(klass, PluginDaemon):
+        return type(name, (klass, ), {'run': _isolated_daemon_run,
+                                      '_isolated_target': klass})
+    return type(name, (IsolatedPlugin, ), {
+        'target': klass,
+        'consumer_type': staticmethod(klass.consumer_type),
+        'coalesce_key': staticmethod(klass.coalesce_key),
+        'batched': klass.batched,
+        'channel': klass.channel or IsolatedPlugin.channel,
+    })
@@ -1,33 +1,255 @@
 # -*- coding: utf-8 -*-
 # This file is part of ATGMLogger https://github.com/DynamicGravitySystems/atgmlogger
 
-import io
+import os
+import time
+import queue
+import asyncio
+import threading
+import struct
 import logging
 from pathlib import Path
 
 from .plugins import PluginInterface
-from .dispatcher import Command
+from .dispatcher import Batch, Command
+from .spill import SpillChannel
+from .writers import GroupCommitWriter
+from .segments import SegmentWriter, SEGMENT_SIZE
+from .compression import CompressingWriter
 
-__all__ = ['DataLogger']
+__all__ = ['DataLogger', 'read_timestamps']
 LOG = logging.getLogger(__name__)
 
+# Timestamp sidecar: magic, followed by one record per write of
+# (wall clock ns, monotonic ns, number of lines)
+TS_MAGIC = b'ATGMTS01'
+TS_RECORD = struct.Struct('<qqI')
+
+
+def read_timestamps(path):
+    """
+    Read a timestamp sidecar file, yielding a (wall clock ns, monotonic ns)
+    tuple for each line of the corresponding data file, in order.
+
+    Lines for which no receive time was recorded have timestamps of 0.
+
+    """
+    with Path(path).open('rb') as fd:
+        if fd.read(len(TS_MAGIC)) != TS_MAGIC:
+            raise ValueError("{} is not a timestamp sidecar file."
+                             .format(path))
+        while True:
+            record = fd.read(TS_RECORD.size)
+            if len(record) < TS_RECORD.size:
+                break
+            wall, mono, count = TS_RECORD.unpack(record)
+            for _ in range(count):
+                yield wall, mono
+
 
 class DataLogger(PluginInterface):
-    options = ['logfile']
+    """
+    Write data lines to the gravity data file.
+
+    In binary mode (option `binary`) the file is opened as a binary stream
+    and bytes lines from the listener are written as-is, without being
+    decoded to str and re-encoded. str lines are accepted in either mode.
+
+    Each item is followed by `terminator` (default newline), this may be set
+    to an empty string to log binary records back to back.
+
+    Host receive times of each line (recorded by the listener) can be
+    written with the option `timestamps`:
+    'prefix' writes them as two leading columns (wall clock ns, monotonic
+    ns) of each line,
+    'sidecar' writes them to a compact binary file alongside the logfile
+    (logfile + '.ts'), see :func:`read_timestamps`. When the logfile is
+    rotated the sidecar is renamed to the rotated logfile name + '.ts', or
+    if that is not found (e.g. with segments) suffixed with the time of the
+    rotation, so the timestamps of the rotated data are kept.
+
+    If the file writes stall, the option `spill` (a directory, or a dict with
+    the keys path, threshold and max_bytes) spills the backlog to disk in
+    that directory rather than holding it in memory, see
+    :class:`atgmlogger.spill.SpillChannel`. This applies to the 'queue'
+    dispatcher fanout of the threaded runtime, the logger disables it (with
+    a warning) otherwise.
+
+    Files are written by a :class:`atgmlogger.writers.GroupCommitWriter`,
+    which commits the buffered data after `flush_lines` lines or
+    `flush_bytes` bytes, or `flush_interval` seconds after the first
+    unflushed line, whichever is first, and fdatasyncs the file every
+    `sync_interval` seconds if set. The default commits every item (one
+    write per line or batch) and does not sync. The data at risk after a
+    power cut is bounded by flush_interval + sync_interval, see the writer.
+    :class:`atgmlogger.autotune.AutoTuner` can choose flush_lines and
+    flush_interval for the observed data rate.
+
+    With the option `segments` (True, or a dict with the key size) the data
+    file is stored as preallocated segment files, which are recovered after
+    a crash and sealed on rotation, see
+    :class:`atgmlogger.segments.SegmentWriter`.
+
+    With the option `compression` ('gzip', 'bz2', 'lzma', or a dict with the
+    keys method and level) the data file is compressed as it is written,
+    with a flush point at every commit, see
+    :class:`atgmlogger.compression.CompressingWriter`. The file name gets
+    the method's suffix (e.g. gravdata.dat.gz). Compression does not apply
+    to segments.
+
+    """
+    options = ['logfile', 'binary', 'encoding', 'terminator', 'timestamps',
+               'spill', 'flush_lines', 'flush_bytes', 'flush_interval',
+               'sync_interval', 'segments', 'compression']
+    batched = True
+    lossless = True
 
     def __init__(self):
         super().__init__()
         self.logfile = Path('gravdata.dat')
-        self._hdl = None  # type: io.TextIOBase
-        self._params = dict(mode='w+', buffering=1, encoding='utf-8',
-                            newline='\n')
+        self.binary = False
+        self.encoding = 'utf-8'
+        self.terminator = '\n'
+        self.timestamps = None
+        self.spill = None
+        self.flush_lines = 1
+        self.flush_bytes = 64 * 1024
+        self.flush_interval = 1.0
+        self.sync_interval = None
+        self.segments = None
+        self.compression = None
+        # Clock of the time based commits
+        self.clock = time.monotonic
+        self._hdl = None  # type: GroupCommitWriter
+        self._ts_hdl = None  # type: GroupCommitWriter
+        # asyncio runtime: timer of the time based commits, and the lock
+        # serializing the executor writes with them
+        self._service_timer = None  # type: asyncio.TimerHandle
+        self._io_lock = threading.Lock()
+        # Write statistics, sampled by the auto-tuner
+        self.lines_written = 0
+        self.bytes_written = 0
 
     @staticmethod
     def consumer_type():
-        return {str, Command}
+        return {str, bytes, Command}
+
+    @property
+    def flushes(self) -> int:
+        return self._hdl.flushes if self._hdl is not None else 0
+
+    @property
+    def flush_time(self) -> float:
+        return self._hdl.write_time if self._hdl is not None else 0.0
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(lines_written=self.lines_written,
+                     bytes_written=self.bytes_written)
+        if self._hdl is not None:
+            stats['writer'] = self._hdl.stats()
+        return stats
+
+    def _get_writer(self, path, segmented=False,
+                    compressed=False) -> GroupCommitWriter:
+        options = dict(flush_bytes=self.flush_bytes,
+                       flush_lines=self.flush_lines,
+                       flush_interval=self.flush_interval,
+                       sync_interval=self.sync_interval, clock=self.clock)
+        if segmented:
+            spec = self.segments if isinstance(self.segments, dict) else {}
+            return SegmentWriter(
+                path, segment_size=spec.get('size') or SEGMENT_SIZE,
+                terminator=self.terminator.encode(self.encoding),
+                text=not self.binary, **options)
+        if compressed:
+            spec = self.compression if isinstance(self.compression, dict) \
+                else {'method': self.compression}
+            method = spec.get('method')
+            return CompressingWriter(
+                path, method=method if isinstance(method, str) else 'gzip',
+                level=spec.get('level'), **options)
+        return GroupCommitWriter(path, **options)
+
+    def _writers(self):
+        return [hdl for hdl in (self._hdl, self._ts_hdl) if hdl is not None]
 
     def _get_fhandle(self):
-        self._hdl = self.logfile.open(**self._params)
+        if self._hdl is None:
+            if self.segments and self.compression:
+                LOG.warning("Data file compression is not supported with "
+                            "segments, writing uncompressed segments.")
+            self._hdl = self._get_writer(self.logfile,
+                                         segmented=bool(self.segments),
+                                         compressed=bool(self.compression))
+        else:
+            self._hdl.reopen()
+        self._get_ts_handle()
+
+    def _get_ts_handle(self):
+        if self.timestamps == 'sidecar':
+            if self._ts_hdl is None:
+                self._ts_hdl = self._get_writer(self.tsfile)
+            else:
+                self._ts_hdl.reopen()
+            self._ts_hdl.write(TS_MAGIC, lines=0)
+
+    @property
+    def tsfile(self) -> Path:
+        """Path of the binary timestamp sidecar file"""
+        return self.logfile.with_name(self.logfile.name + '.ts')
+
+    def _lines(self, item):
+        """Return the lines of item as a list of str or bytes (depending on
+        the file mode)."""
+        if isinstance(item, Batch):
+            lines = item
+            item_type = item.item_type
+        else:
+            lines = [item]
+            item_type = type(item)
+        if self.binary and item_type is str:
+            lines = [line.encode(self.encoding) for line in lines]
+        elif not self.binary and item_type is bytes:
+            lines = [line.decode(self.encoding, errors='ignore')
+                     for line in lines]
+        return lines
+
+    def _write(self, item):
+        term = self.terminator
+        lines = self._lines(item)
+        wall = mono = None
+        if isinstance(item, Batch):
+            wall, mono = item.rx_wall_ns, item.rx_mono_ns
+
+        if self.timestamps == 'prefix':
+            prefix = '%d,%d,' % (wall or 0, mono or 0)
+            if self.binary:
+                prefix = prefix.encode()
+            lines = [prefix + line for line in lines]
+        if self.binary:
+            term = term.encode(self.encoding)
+            data = term.join(lines) + term
+        else:
+            data = (term.join(lines) + term).encode(self.encoding)
+        # Timestamps first, so they are committed no later than the data
+        if self._ts_hdl is not None:
+            self._ts_hdl.write(TS_RECORD.pack(wall or 0, mono or 0,
+                                              len(lines)), lines=len(lines))
+        self._hdl.write(data, lines=len(lines))
+        self.lines_written += len(lines)
+        self.bytes_written += len(data)
+
+    def flush(self):
+        """Commit the buffered data to the file"""
+        for hdl in self._writers():
+            hdl.flush()
+
+    def _flush_timeout(self):
+        """Seconds until a time based commit or sync is due, or None"""
+        timeouts = [hdl.timeout() for hdl in self._writers()]
+        timeouts = [timeout for timeout in timeouts if timeout is not None]
+        return min(timeouts) if timeouts else None
 
     def log_rotate(self):
         """
@@ -40,10 +262,11 @@ class DataLogger(PluginInterface):
         if self._hdl is None:
             return
 
+        rotated = self._rotated_path()
         try:
-            self._hdl.flush()
-            self._hdl.close()
-            self._hdl = None
+            for hdl in self._writers():
+                hdl.close()
+            self._rotate_sidecar(rotated)
         except IOError:
             LOG.exception("IOError encountered rotating log file.")
             return
@@ -52,6 +275,45 @@ class DataLogger(PluginInterface):
         LOG.debug("LogRotate completed without exception, handle opened "
                   "on path %s", self._hdl.name)
 
+    def _rotated_path(self):
+        """Return the path the open data file was rotated (renamed) to, or
+        None if it was not renamed or cannot be found"""
+        path = Path(self._hdl.name)
+        try:
+            stat = os.fstat(self._hdl.fileno())
+        except (OSError, TypeError):
+            return None
+        try:
+            if os.path.samestat(stat, path.stat()):
+                return None
+        except OSError:
+            # Renamed, and not (yet) recreated
+            pass
+        try:
+            candidates = list(path.parent.iterdir())
+        except OSError:
+            return None
+        for candidate in candidates:
+            try:
+                if os.path.samestat(stat, candidate.stat()):
+                    return candidate
+            except OSError:
+                continue
+        return None
+
+    def _rotate_sidecar(self, rotated=None):
+        """Move the timestamp sidecar aside before it is reopened"""
+        tsfile = self.tsfile
+        if self._ts_hdl is None or not tsfile.exists():
+            return
+        if rotated is not None:
+            target = rotated.with_name(rotated.name + '.ts')
+        else:
+            target = tsfile.with_name('%s.%s' % (
+                tsfile.name, time.strftime('%Y%m%d-%H%M%S')))
+        os.replace(str(tsfile), str(target))
+        LOG.info("Rotated timestamp sidecar to %s", str(target))
+
     def run(self):
         try:
             self._get_fhandle()
@@ -61,20 +323,125 @@ class DataLogger(PluginInterface):
 
         while not self.exiting:
             try:
-                item = self.get(block=True, timeout=None)
-                if item is None:
-                    self.queue.task_done()
-                    continue
-                if isinstance(item, Command):
-                    if item.cmd == 'rotate':
-                        self.log_rotate()
-                else:
-                    self._hdl.write(item + '\n')
-                    self.context.blink()
-                    self.queue.task_done()
+                item = self.get(block=True, timeout=self._flush_timeout())
+            except queue.Empty:
+                try:
+                    for hdl in self._writers():
+                        hdl.service()
+                except IOError:
+                    LOG.exception("Error flushing data file.")
+                continue
+            try:
+                if item is not None:
+                    self._handle(item)
             except IOError:
                 continue
-        self._hdl.close()
+            finally:
+                self.queue.task_done()
+        self.close()
+
+    def _handle(self, item):
+        if isinstance(item, Command):
+            if item.cmd == 'rotate':
+                self.log_rotate()
+        else:
+            self._write(item)
+            self.context.blink()
+
+    async def handle(self, item):
+        # File writes block, so they are run in the loop's default executor.
+        # Items are handled one at a time, which keeps the writes in order.
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._handle_blocking, item)
+        self._schedule_service(loop)
+
+    def _handle_blocking(self, item):
+        with self._io_lock:
+            if self._hdl is None:
+                self._get_fhandle()
+            try:
+                self._handle(item)
+            except IOError:
+                LOG.exception("Error writing to data file.")
+
+    def _schedule_service(self, loop):
+        """(Re)arm the loop timer of the time based commit and sync, which
+        the threaded runtime does with the queue get timeout"""
+        if self._service_timer is not None:
+            self._service_timer.cancel()
+            self._service_timer = None
+        timeout = self._flush_timeout()
+        if timeout is not None:
+            self._service_timer = loop.call_later(timeout, self._on_service,
+                                                  loop)
+
+    def _on_service(self, loop):
+        self._service_timer = None
+        future = loop.run_in_executor(None, self._service_blocking)
+        future.add_done_callback(lambda _: self._schedule_service(loop))
+
+    def _service_blocking(self):
+        with self._io_lock:
+            try:
+                for hdl in self._writers():
+                    hdl.service()
+            except IOError:
+                LOG.exception("Error flushing data file.")
+
+    def close(self):
+        if self._service_timer is not None:
+            self._service_timer.cancel()
+            self._service_timer = None
+        if isinstance(self.queue, SpillChannel):
+            self._drain_spill()
+            self.queue.close()
+        with self._io_lock:
+            for hdl in self._writers():
+                try:
+                    hdl.close()
+                except IOError:
+                    LOG.exception("Error closing data file %s.", hdl.name)
+            self._hdl = self._ts_hdl = None
+
+    def _drain_spill(self):
+        """Write the items still held by the spill channel (in memory or in
+        the spill segment) before the file is closed, so the data which
+        survived a stall is not lost at exit."""
+        if self._hdl is None:
+            return
+        pending = self.queue.qsize()
+        if pending:
+            LOG.info("Writing %d items pending in the spill channel.",
+                     pending)
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if item is not None:
+                    self._handle(item)
+            except IOError:
+                LOG.exception("Error writing spilled items to data file.")
+                break
+            finally:
+                self.queue.task_done()
 
     def configure(self, **options):
         super().configure(**options)
+        if options.get('spill'):
+            self.queue = self._get_spill_channel(self.spill)
+        # Flush settings may be changed while running (e.g. by the tuner)
+        for hdl in self._writers():
+            hdl.flush_lines = self.flush_lines
+            hdl.flush_bytes = self.flush_bytes
+            hdl.flush_interval = self.flush_interval
+            hdl.sync_interval = self.sync_interval
+
+    def _get_spill_channel(self, spec):
+        if not isinstance(spec, dict):
+            spec = dict(path=spec)
+        return SpillChannel(spec['path'],
+                            threshold=spec.get('threshold') or 4 * 1024 ** 2,
+                            max_bytes=spec.get('max_bytes') or 0,
+                            name=Path(str(self.logfile)).name + '.spill')
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import os
+import re
+import select
+import logging
+import threading
+
+__all__ = ['MountInfo', 'MountWatcher', 'parse_mountinfo']
+LOG = logging.getLogger(__name__)
+
+MOUNTINFO = '/proc/self/mountinfo'
+_ESCAPE = re.compile(r'\\([0-7]{3})')
+
+
+def _unescape(path):
+    # The kernel escapes space, tab, newline and backslash as octal
+    return _ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), path)
+
+
+def parse_mountinfo(text) -> set:
+    """Return the set of mount points listed in mountinfo text (see
+    proc(5)), the mount point is the 5th field of each line."""
+    mounts = set()
+    for line in text.splitlines():
+        fields = line.split(' ')
+        if len(fields) > 4:
+            mounts.add(_unescape(fields[4]))
+    return mounts
+
+
+class MountInfo:
+    """
+    Mount table source reading /proc/self/mountinfo.
+
+    The kernel signals a change of the mount table by raising POLLPRI (and
+    POLLERR) on an open mountinfo file, the file must then be re-read from
+    the start.
+
+    """
+    events = select.POLLPRI | select.POLLERR if hasattr(select, 'POLLPRI') \
+        else 0
+
+    def __init__(self, path=MOUNTINFO):
+        self.path = path
+        self._fd = open(path, 'r')
+
+    @classmethod
+    def available(cls, path=MOUNTINFO) -> bool:
+        return hasattr(select, 'poll') and os.path.exists(path)
+
+    def fileno(self) -> int:
+        return self._fd.fileno()
+
+    def mounts(self) -> set:
+        self._fd.seek(0)
+        return parse_mountinfo(self._fd.read())
+
+    def close(self):
+        self._fd.close()
+
+
+class MountWatcher:
+    """
+    Event source (see :class:`atgmlogger.scheduler.Event`) which fires an
+    event when `mountpath` is mounted.
+
+    A thread blocks in poll() on the mount table source, and checks the
+    mount table only when the kernel reports a change, so the appearance of
+    a device is detected within milliseconds and nothing is polled while the
+    mount table is unchanged. If `mountpath` is already mounted when the
+    watcher starts the event is fired immediately.
+
+    Parameters
+    ----------
+    mountpath : str or Path
+    event : str, Optional
+        Name of the event fired, with `mountpath` as the event data
+    source : Callable[[], MountInfo], Optional
+        Factory for the mount table source, any object with the `events`
+        poll mask, fileno(), mounts() and close() (default reads
+        /proc/self/mountinfo)
+
+    """
+    def __init__(self, mountpath, event='mount', source=MountInfo):
+        self.mountpath = os.path.normpath(str(mountpath))
+        self.event = event
+        self._source_factory = source
+        self._source = None
+        self._thread = None
+        self._wake_r, self._wake_w = None, None
+        self._exit = threading.Event()
+        self.mounted = False
+        self.changes = 0
+
+    def start(self, fire):
+        """Start watching, `fire(event, data)` is called from the watcher
+        thread"""
+        self._source = self._source_factory()
+        self._wake_r, self._wake_w = os.pipe()
+        self._exit.clear()
+        self._check(fire)
+        self._thread = threading.Thread(target=self._watch, args=(fire, ),
+                                        name=self.__class__.__name__,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._exit.set()
+        os.write(self._wake_w, b'\0')
+        self._thread.join(timeout=1)
+        self._thread = None
+        self._source.close()
+        for fd in (self._wake_r, self._wake_w):
+            os.close(fd)
+
+    def _check(self, fire):
+        mounted = self.mountpath in self._source.mounts()
+        if mounted and not self.mounted:
+            LOG.info("Detected mount of %s", self.mountpath)
+            fire(self.event, self.mountpath)
+        self.mounted = mounted
+
+    def _watch(self, fire):
+        poller = select.poll()
+        poller.register(self._source.fileno(), self._source.events)
+        poller.register(self._wake_r, select.POLLIN)
+        while not self._exit.is_set():
+            try:
+                events = poller.poll()
+            except InterruptedError:
+                continue
+            if self._exit.is_set():
+                break
+            for fd, _ in events:
+                if fd == self._wake_r:
+                    continue
+                self.changes += 1
+                try:
+                    self._check(fire)
+                except Exception:
+                    LOG.exception("Exception checking mount table")
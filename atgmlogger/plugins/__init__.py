@@ -7,20 +7,53 @@ import logging
 import threading
 from importlib import import_module
 
+from ..channels import Channel, get_channel
+from ..cpusched import apply_policy, thread_names
+
 __all__ = ['PluginInterface', 'PluginDaemon', 'load_plugin']
 LOG = logging.getLogger(__name__)
 
 
 class PluginInterface(threading.Thread, metaclass=abc.ABCMeta):
     options = []
+    # Set True in plugins which handle Batch items in their run loop
+    batched = False
+    # Plugins may define a coroutine handler `async def handle(self, item)`,
+    # which is used by the asyncio runtime (see atgmlogger.aio) instead of
+    # running the plugin in its own thread
+    handle = None
+    # Default channel (see atgmlogger.channels.get_channel) of the plugin,
+    # this can be overridden by the 'channel' option in the plugin config
+    channel = None
+    # With broadcast fanout, a lossless plugin's cursor gates the dispatcher
+    # rather than skipping items when the plugin falls behind
+    lossless = False
 
     def __init__(self, daemon=False):
         super().__init__(name=self.__class__.__name__, daemon=daemon)
         self._exitSig = threading.Event()
-        self._queue = queue.Queue()
+        self._queue = get_channel(self.channel, key=self.coalesce_key)
         self._configured = False
         self._context = None
 
+    def start(self):
+        # The configured CPU affinity/scheduling class (see
+        # atgmlogger.cpusched) is applied by the new thread before the
+        # plugin's run(), start returns once it has been applied
+        run = self.run
+        applied = threading.Event()
+
+        def _run():
+            try:
+                apply_policy(thread_names(self, 'plugins'))
+            finally:
+                applied.set()
+            run()
+
+        self.run = _run
+        super().start()
+        applied.wait()
+
     def consumes(self, item) -> bool:
         return type(item) in self.consumer_type()
 
@@ -35,6 +68,12 @@ class PluginInterface(threading.Thread, metaclass=abc.ABCMeta):
     def condition(cls, *args):
         return False
 
+    @staticmethod
+    def coalesce_key(item):
+        """Return the key used to coalesce pending items of a 'coalesce'
+        policy channel, items with a key of None are never coalesced."""
+        return None
+
     @abc.abstractmethod
     def run(self):
         pass
@@ -49,6 +88,9 @@ class PluginInterface(threading.Thread, metaclass=abc.ABCMeta):
     def configure(self, **options):
         LOG.debug("Configuring Plugin: {} with options: {}".format(
             self.__class__.__name__, options))
+        if 'channel' in options:
+            self.queue = get_channel(options.pop('channel'),
+                                     key=self.coalesce_key)
         for key, value in options.items():
             lkey = str(key).lower()
             if lkey in self.options:
@@ -68,12 +110,37 @@ class PluginInterface(threading.Thread, metaclass=abc.ABCMeta):
             self.queue.put(None)
             self.join()
 
+    def close(self):
+        """Release resources held by the plugin, called by the asyncio runtime
+        when a coroutine plugin is stopped."""
+        pass
+
     def put(self, item):
+        if isinstance(self.queue, Channel):
+            # The channel applies its overflow policy
+            self.queue.put(item)
+            return
         try:
             self.queue.put_nowait(item)
         except queue.Full:
             pass
 
+    def stats(self) -> dict:
+        try:
+            return self.queue.stats()
+        except AttributeError:
+            return dict(pending=self.queue.qsize())
+
+    def put_batch(self, batch):
+        """Put a Batch of items on the queue. The batch is queued as a single
+        item if the plugin is `batched`, otherwise the items are queued
+        individually."""
+        if self.batched:
+            self.put(batch)
+        else:
+            for item in batch:
+                self.put(item)
+
     def get(self, block=True, timeout=None):
         """
         Wrapper around internal Queue object.
@@ -143,6 +210,18 @@ class PluginDaemon(threading.Thread, metaclass=abc.ABCMeta):
     def condition(cls, item=None):
         return False
 
+    @classmethod
+    def triggers(cls):
+        """
+        Return a list of triggers (Periodic, Rate or Event from
+        atgmlogger.scheduler) which start this daemon.
+
+        The default of None means :meth:`condition` is evaluated by the
+        Dispatcher for every item.
+
+        """
+        return None
+
     @classmethod
     def configure(cls, **options):
         for key, value in {str(k).lower(): v for k, v in options.items()
@@ -44,12 +44,12 @@ class _BlinkUntil(threading.Thread):
                 self._delegate(self._blink)
 
 
-# TODO: Consider limiting queue size, or inferring elsewhere the data rate
-# Limiting the queue might cause continuous blinks to be ignored if put with
-# nowait - this does cause random behavior where the continuous start signal
-# might be received but not the stop
 class GPIOListener(PluginInterface):
     options = ['mode', 'data_pin', 'usb_pin', 'freq']
+    # Pending blinks of each LED are coalesced so the queue cannot grow
+    # while the LEDs blink slower than the data rate. Continuous blink
+    # start/stop signals are never coalesced or dropped.
+    channel = {'maxsize': 20, 'policy': 'coalesce'}
 
     def __init__(self):
         super().__init__()
@@ -63,12 +63,17 @@ class GPIOListener(PluginInterface):
         self.freq = 0.04
 
         self._blink_until_sig = threading.Event()
-        # self.queue = queue.Queue(maxsize=20)
 
     @staticmethod
     def consumer_type():
         return {Blink}
 
+    @staticmethod
+    def coalesce_key(blink):
+        if blink.until_stopped:
+            return None
+        return blink.led
+
     def configure(self, **options):
         super().configure(**options)
         _mode = self.modes[getattr(self, 'mode', 'board')]
@@ -135,6 +140,7 @@ class GPIOListener(PluginInterface):
                     worker.start()
                     subthreads[blink.led] = worker
                     del worker
+                self.task_done()
             else:
                 self._blink(blink)
                 self.task_done()
@@ -10,6 +10,7 @@ from typing import Union
 
 from . import PluginDaemon
 from .. import POSIX
+from ..scheduler import Periodic, Rate
 
 __plugin__ = 'TimeSyncDaemon'
 LOG = logging.getLogger(__name__)
@@ -109,21 +110,23 @@ def set_system_time(timestamp):
 
 
 class TimeSyncDaemon(PluginDaemon):
-    options = ['interval', 'timetravel']
+    options = ['interval', 'period', 'timetravel']
     interval = 1000
-    _tick = -1
+    period = None
     timetravel = False
 
     @classmethod
-    def condition(cls, item=None):
-        if not isinstance(item, str):
-            return False
-        cls._tick += 1
-        return cls._tick % cls.interval == 0
+    def triggers(cls):
+        """Synchronize every `period` seconds if set, else on the first data
+        line and then every `interval` lines"""
+        if cls.period:
+            return [Periodic(float(cls.period))]
+        return [Rate(cls.interval, first=1)]
 
     @classmethod
-    def reset_tick(cls):
-        cls._tick = 0
+    def condition(cls, item=None):
+        # Started by its triggers, never by condition()
+        return False
 
     def _valid_time(self, timestamp):
         if not self.timetravel and timestamp > time.time():
@@ -137,8 +140,12 @@ class TimeSyncDaemon(PluginDaemon):
         if not self.data:
             raise ValueError("TimeSyncDaemon has no data set.")
         try:
-            self.reset_tick()
-            ts = timestamp_from_data(self.data)
+            data = self.data
+            if isinstance(data, bytes):
+                # Lines are only decoded when a sync is actually attempted
+                encoding = getattr(self.context, 'encoding', None) or 'utf-8'
+                data = data.decode(encoding, errors='ignore')
+            ts = timestamp_from_data(data)
             if ts is not None and self._valid_time(ts):
                 set_system_time(ts)
             else:
@@ -15,6 +15,8 @@ from pathlib import Path
 from typing import List
 
 from . import PluginDaemon
+from ..scheduler import Periodic, Event
+from ..mountwatch import MountInfo, MountWatcher
 
 __plugin__ = 'RemovableStorageHandler'
 CHECK_PLATFORM = True
@@ -105,6 +107,14 @@ class RemovableStorageHandler(PluginDaemon):
     def condition(cls, *args):
         return os.path.ismount(str(cls.mountpath))
 
+    @classmethod
+    def triggers(cls):
+        # Run when the kernel reports that mountpath was mounted, or fall
+        # back to checking for a mounted device once a second
+        if MountInfo.available():
+            return [Event('mount', source=MountWatcher(cls.mountpath))]
+        return [Periodic(1.0, check=cls.condition)]
+
     def __init__(self, **kwargs):
         LOG.debug("Initializing RemovableStorageHandler")
         super().__init__(**kwargs)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import os
+import math
+import select
+import logging
+
+import serial
+
+try:
+    import termios
+    HAVE_TERMIOS = True
+except ImportError:
+    HAVE_TERMIOS = False
+
+__all__ = ['InWaitingReader', 'PollReader', 'get_reader']
+LOG = logging.getLogger(__name__)
+
+DEFAULT_READ_SIZE = 2048
+# Default VMIN of the PollReader (the largest value termios allows). Unless
+# a burst is a multiple of VMIN bytes long, its tail is returned only when
+# the inter-byte timer (VTIME) expires, e.g. a 60 byte line at 10 Hz is
+# returned up to 100 ms after its last byte, in exchange for one wakeup per
+# line. Set vmin to the line length for low latency reads of fixed length
+# lines.
+DEFAULT_VMIN = 255
+
+
+class InWaitingReader:
+    """
+    Read strategy using the pyserial API: query the number of bytes waiting
+    in the input buffer then read that many (at least 1) bytes.
+
+    This works with any pyserial handle (including URL handlers such as
+    loop://), but wakes the reading thread for almost every byte received at
+    low data rates.
+
+    """
+    def __init__(self, handle, read_size=DEFAULT_READ_SIZE):
+        self._handle = handle
+        self.read_size = read_size
+        self.wakeups = 0
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        return dict(wakeups=self.wakeups, reads=self.wakeups, bytes=self.bytes)
+
+    def read(self) -> bytes:
+        size = max(1, min(self.read_size, self._handle.in_waiting))
+        data = self._handle.read(size)
+        self.wakeups += 1
+        self.bytes += len(data)
+        return data
+
+    def wakeup(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PollReader:
+    """
+    Low-wakeup read strategy which blocks in poll() on the port's file
+    descriptor.
+
+    If the descriptor is a terminal, VMIN and VTIME are configured so that
+    once data starts arriving the kernel completes a read only when `vmin`
+    bytes have been received, or the line has been idle for `read_gap`
+    seconds, i.e. roughly once per line or burst of lines instead of once
+    per byte. The kernel ignores VMIN/VTIME on a non-blocking descriptor
+    (pyserial opens ports with O_NONBLOCK), so the descriptor is switched
+    to blocking mode while the reader is in use; a read then blocks for at
+    most `read_gap` after data was received. VMIN is the smaller of `vmin`
+    and `read_size`, changing `read_size` updates it.
+
+    This trades latency for wakeups: the end of a burst which does not fill
+    VMIN bytes is only returned after `read_gap` seconds without data, see
+    DEFAULT_VMIN.
+
+    A wakeup pipe is registered alongside the port so that :meth:`wakeup` can
+    interrupt a blocked read without the use of a polling timeout.
+
+    Parameters
+    ----------
+    fd : int or object with fileno()
+        File descriptor or serial handle to read from
+    read_size : int, Optional
+        Maximum number of bytes returned by a read
+    read_gap : float, Optional
+        Inter-byte timeout (seconds) which ends a burst, rounded up to the
+        VTIME resolution of 0.1 seconds
+    timeout : float, Optional
+        Maximum time (seconds) to block waiting for data, default None
+        blocks until data is available or :meth:`wakeup` is called
+    vmin : int, Optional
+        Number of bytes (at most 255) which complete a read without waiting
+        for the inter-byte timeout
+
+    """
+    def __init__(self, fd, read_size=DEFAULT_READ_SIZE, read_gap=0.1,
+                 timeout=None, vmin=DEFAULT_VMIN):
+        if hasattr(fd, 'fileno'):
+            fd = fd.fileno()
+        self._fd = fd
+        self._read_size = read_size
+        self._read_gap = read_gap
+        self._vmin = max(1, min(255, int(vmin)))
+        self._timeout = None if timeout is None else int(timeout * 1000)
+        self._saved_attrs = None
+        self._was_blocking = None
+
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+        self._poll = select.poll()
+        self._poll.register(self._fd, select.POLLIN | select.POLLPRI)
+        self._poll.register(self._wake_r, select.POLLIN)
+
+        self.wakeups = 0
+        self.reads = 0
+        self.bytes = 0
+
+        self._configure_tty(min(self._vmin, read_size), read_gap)
+
+    @property
+    def read_size(self) -> int:
+        return self._read_size
+
+    @read_size.setter
+    def read_size(self, value):
+        self._read_size = value
+        if self._saved_attrs is not None:
+            self._configure_tty(min(self._vmin, value), self._read_gap)
+
+    def _configure_tty(self, vmin, read_gap):
+        if not HAVE_TERMIOS or not os.isatty(self._fd):
+            return
+        vtime = max(1, min(255, int(math.ceil(read_gap * 10))))
+        try:
+            attrs = termios.tcgetattr(self._fd)
+            if self._saved_attrs is None:
+                self._saved_attrs = termios.tcgetattr(self._fd)
+            # VMIN/VTIME are only honoured in non-canonical mode
+            attrs[3] &= ~termios.ICANON
+            attrs[6][termios.VMIN] = vmin
+            attrs[6][termios.VTIME] = vtime
+            termios.tcsetattr(self._fd, termios.TCSANOW, attrs)
+        except termios.error:
+            LOG.exception("Unable to set VMIN/VTIME on serial port, reads "
+                          "will not be coalesced.")
+            self._saved_attrs = None
+            return
+        LOG.debug("Serial port configured with VMIN=%d, VTIME=%d", vmin,
+                  vtime)
+        if self._was_blocking is None:
+            self._was_blocking = os.get_blocking(self._fd)
+            os.set_blocking(self._fd, True)
+
+    def stats(self) -> dict:
+        return dict(wakeups=self.wakeups, reads=self.reads, bytes=self.bytes)
+
+    def read(self) -> bytes:
+        """Block until data is available and return it, returns an empty
+        bytes object if woken by :meth:`wakeup` or on timeout."""
+        events = self._poll.poll(self._timeout)
+        self.wakeups += 1
+        data = b''
+        for fd, event in events:
+            if fd == self._wake_r:
+                os.read(self._wake_r, 512)
+            elif event & (select.POLLIN | select.POLLPRI):
+                data = os.read(self._fd, self.read_size)
+                self.reads += 1
+                if not data:
+                    raise serial.SerialException(
+                        "device reports readiness to read but returned no "
+                        "data (device disconnected?)")
+                self.bytes += len(data)
+            elif event & (select.POLLHUP | select.POLLERR | select.POLLNVAL):
+                raise serial.SerialException("Serial device hung up or "
+                                             "returned an error.")
+        return data
+
+    def wakeup(self):
+        try:
+            os.write(self._wake_w, b'\x00')
+        except (BlockingIOError, OSError):
+            pass
+
+    def close(self):
+        if self._saved_attrs is not None:
+            try:
+                termios.tcsetattr(self._fd, termios.TCSANOW, self._saved_attrs)
+            except termios.error:
+                pass
+            self._saved_attrs = None
+        if self._was_blocking is not None:
+            try:
+                os.set_blocking(self._fd, self._was_blocking)
+            except OSError:
+                pass
+            self._was_blocking = None
+        for fd in (self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def get_reader(handle, strategy=None, read_size=None, read_gap=None,
+               vmin=None):
+    """
+    Create a read strategy for a serial handle.
+
+    Parameters
+    ----------
+    handle : serial.Serial
+    strategy : str, Optional
+        'poll' or 'in_waiting' (default). The poll strategy requires a handle
+        with a real file descriptor, the in_waiting strategy is used as a
+        fallback if one is not available.
+    read_size : int, Optional
+    read_gap : float, Optional
+    vmin : int, Optional
+        VMIN of the poll strategy, see :class:`PollReader`
+
+    """
+    read_size = read_size or DEFAULT_READ_SIZE
+    if str(strategy).lower() == 'poll':
+        try:
+            fd = handle.fileno()
+        except (AttributeError, OSError, serial.SerialException):
+            LOG.warning("Serial handle has no file descriptor, falling back "
+                        "to in_waiting read strategy.")
+        else:
+            return PollReader(fd, read_size=read_size,
+                              read_gap=read_gap or 0.1,
+                              vmin=vmin or DEFAULT_VMIN)
+    return InWaitingReader(handle, read_size=read_size)
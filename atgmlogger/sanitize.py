@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import codecs
+import logging
+import itertools
+
+__all__ = ['Sanitizer', 'ILLEGAL_BYTES', 'POLICIES']
+LOG = logging.getLogger(__name__)
+
+# Control characters and 0xFF (seen as line noise on the meter output)
+ILLEGAL_BYTES = bytes(itertools.chain(range(0, 32), [255]))
+POLICIES = ('strip', 'replace', 'reject')
+
+
+class Sanitizer:
+    """
+    Remove illegal (control) bytes from raw serial lines and decode them.
+
+    Illegal bytes are found and removed in bulk with :meth:`bytes.translate`
+    rather than inspecting the line byte by byte.
+
+    Parameters
+    ----------
+    policy : str, Optional
+        Action taken for a line containing illegal bytes:
+        'strip' removes the illegal bytes,
+        'replace' substitutes each illegal byte with `replacement`,
+        'reject' drops the line entirely.
+    encoding : str, Optional
+        Text encoding of the serial data, e.g. utf-8 or latin-1
+    replacement : bytes, Optional
+        Single byte used by the 'replace' policy
+
+    """
+    def __init__(self, policy='strip', encoding='utf-8', replacement=b'?'):
+        policy = str(policy).lower()
+        if policy not in POLICIES:
+            raise ValueError("Invalid sanitize policy: {}, must be one of {}"
+                             .format(policy, POLICIES))
+        if len(replacement) != 1:
+            raise ValueError("Replacement must be a single byte.")
+        codecs.lookup(encoding)  # Raises LookupError for unknown encodings
+
+        self.policy = policy
+        self.encoding = encoding
+        self._table = bytes.maketrans(ILLEGAL_BYTES,
+                                      replacement * len(ILLEGAL_BYTES))
+
+        # Line counters per policy action, and total illegal bytes seen
+        self.lines = 0
+        self.dirty = 0
+        self.illegal = 0
+        self.stripped = 0
+        self.replaced = 0
+        self.rejected = 0
+
+    def stats(self) -> dict:
+        return dict(policy=self.policy, lines=self.lines, dirty=self.dirty,
+                    illegal=self.illegal, stripped=self.stripped,
+                    replaced=self.replaced, rejected=self.rejected)
+
+    def clean(self, line):
+        """
+        Apply the sanitize policy to a raw line, the line terminator is
+        removed.
+
+        Returns
+        -------
+        bytes or None
+            Sanitized line, or None if the line was rejected
+
+        """
+        line = bytes(line).rstrip(b'\r\n')
+        self.lines += 1
+        cleaned = line.translate(None, ILLEGAL_BYTES)
+        removed = len(line) - len(cleaned)
+        if not removed:
+            return line
+
+        self.dirty += 1
+        self.illegal += removed
+        if self.policy == 'strip':
+            self.stripped += 1
+            return cleaned
+        elif self.policy == 'replace':
+            self.replaced += 1
+            return line.translate(self._table)
+        else:
+            self.rejected += 1
+            return None
+
+    def decode(self, line):
+        """Sanitize and decode a raw line, returning a str or None if the
+        line was rejected."""
+        if isinstance(line, str):
+            return line
+        try:
+            cleaned = self.clean(line)
+        except TypeError:
+            return None
+        if cleaned is None:
+            return None
+        return cleaned.decode(self.encoding, errors='ignore')
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import math
+import time
+import logging
+import threading
+import collections
+
+__all__ = ['TimerWheel', 'Scheduler', 'Periodic', 'Rate', 'Event']
+LOG = logging.getLogger(__name__)
+
+
+class Periodic:
+    """
+    Trigger a daemon every `interval` seconds.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between triggers
+    check : Callable[[], bool], Optional
+        If specified the daemon is only started when check() returns True,
+        check is evaluated from the timer (never per data item).
+
+    """
+    def __init__(self, interval, check=None):
+        if interval <= 0:
+            raise ValueError("Periodic trigger interval must be positive.")
+        self.interval = interval
+        self.check = check
+
+
+class Rate:
+    """
+    Trigger a daemon once every `count` data lines, the daemon is passed the
+    line which completed the count.
+
+    Parameters
+    ----------
+    count : int
+        Lines between triggers
+    first : int, Optional
+        Lines before the first trigger (counted from when the trigger is
+        added), default `count`; e.g. 1 triggers on the first line
+
+    """
+    def __init__(self, count, first=None):
+        if count < 1:
+            raise ValueError("Rate trigger count must be at least 1.")
+        self.count = int(count)
+        self.first = self.count if first is None else int(first)
+        if self.first < 1:
+            raise ValueError("Rate trigger first count must be at least 1.")
+
+
+class Event:
+    """
+    Trigger a daemon when the named event is fired (see
+    :meth:`Scheduler.fire`), the daemon is passed the event data.
+
+    Parameters
+    ----------
+    name : str
+    source : Optional
+        Event source with start(fire) and stop() methods, e.g. a
+        :class:`atgmlogger.mountwatch.MountWatcher`. The source is started
+        with the dispatcher's fire method when the dispatcher runs, and
+        stopped when it exits.
+
+    """
+    def __init__(self, name, source=None):
+        self.name = name
+        self.source = source
+
+
+class _Timer:
+    __slots__ = ['tick', 'callback', 'args', 'cancelled']
+
+    def __init__(self, tick, callback, args):
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel: timers are placed in one of `slots` buckets by their
+    expiry tick, so scheduling and expiry are O(1) regardless of the number
+    of timers.
+
+    The wheel is driven by calling :meth:`advance`, it has no thread of its
+    own. Tick n expires at the time n * resolution (as returned by
+    :meth:`next_deadline`); ticks are computed from times so that a timer
+    never expires before its delay, and always expires when the wheel is
+    advanced to its deadline, whatever the float rounding.
+
+    Parameters
+    ----------
+    resolution : float, Optional
+        Length of a tick in seconds, timers fire at most one tick late
+    slots : int, Optional
+    clock : Callable[[], float], Optional
+        Monotonic time source
+
+    """
+    def __init__(self, resolution=0.05, slots=256, clock=time.monotonic):
+        self.resolution = resolution
+        self.clock = clock
+        self._slots = [[] for _ in range(slots)]
+        self._tick = self._tick_at(clock())
+        self._count = 0
+        self._next = None  # Cached earliest expiry tick
+
+    def __len__(self):
+        return self._count
+
+    def _deadline(self, tick) -> float:
+        return tick * self.resolution
+
+    def _tick_at(self, now) -> int:
+        """Return the last tick which expires at or before now"""
+        tick = math.floor(now / self.resolution)
+        # The quotient may be rounded across a tick boundary
+        while self._deadline(tick + 1) <= now:
+            tick += 1
+        while self._deadline(tick) > now:
+            tick -= 1
+        return tick
+
+    def schedule(self, delay, callback, *args) -> _Timer:
+        """Call callback(*args) after delay seconds, returns a timer handle
+        with a cancel() method."""
+        # Round up to a whole tick
+        expiry = self.clock() + delay
+        tick = self._tick_at(expiry)
+        if self._deadline(tick) < expiry:
+            tick += 1
+        tick = max(tick, self._tick + 1)
+        timer = _Timer(tick, callback, args)
+        self._slots[tick % len(self._slots)].append(timer)
+        self._count += 1
+        if self._next is not None and tick < self._next:
+            self._next = tick
+        return timer
+
+    def next_deadline(self):
+        """Return the (monotonic) time at which the next timer expires, or
+        None if no timers are scheduled."""
+        if not self._count:
+            return None
+        if self._next is None:
+            self._next = min(timer.tick for slot in self._slots
+                             for timer in slot)
+        return self._deadline(self._next)
+
+    def advance(self, now=None) -> int:
+        """Run the callbacks of all timers which have expired, returns the
+        number of callbacks run."""
+        if now is None:
+            now = self.clock()
+        target = self._tick_at(now)
+        if target <= self._tick:
+            return 0
+        nslots = len(self._slots)
+        if target - self._tick >= nslots:
+            # Every slot has expired timers, visit each slot once
+            indexes = range(nslots)
+        else:
+            indexes = [tick % nslots for tick in
+                       range(self._tick + 1, target + 1)]
+        self._tick = target
+
+        expired = []
+        for index in indexes:
+            slot = self._slots[index]
+            if not slot:
+                continue
+            keep = []
+            for timer in slot:
+                if timer.tick <= target:
+                    expired.append(timer)
+                else:
+                    keep.append(timer)
+            self._slots[index] = keep
+        self._count -= len(expired)
+        if expired:
+            self._next = None
+        expired.sort(key=lambda t: t.tick)
+        fired = 0
+        for timer in expired:
+            if timer.cancelled:
+                continue
+            timer.callback(*timer.args)
+            fired += 1
+        return fired
+
+
+class Scheduler:
+    """
+    Decide when daemon plugins are started, from the triggers they declare
+    (see PluginDaemon.triggers).
+
+    Periodic triggers are backed by a :class:`TimerWheel`; Rate triggers
+    compare the data line count (maintained by the Dispatcher with
+    :meth:`count`) with the next due count; Event triggers are fired by
+    name, from any thread, with :meth:`fire`.
+
+    :meth:`poll` returns the (daemon, data) pairs which are due, it is called
+    by the Dispatcher after each item and when the next timer expires.
+
+    """
+    def __init__(self, wheel=None):
+        self.wheel = wheel if wheel is not None else TimerWheel()
+        self.lines = 0
+        self._last = None
+        self._rates = []  # List[[next due count, count, daemon]]
+        self._next_rate = None
+        self._events = {}  # Dict[name: List[daemon]]
+        self._fired = collections.deque()
+        self._due = []
+        self._lock = threading.Lock()
+        self.sources = []
+
+    def add(self, daemon, trigger):
+        if isinstance(trigger, Periodic):
+            self.wheel.schedule(trigger.interval, self._periodic, daemon,
+                                trigger)
+        elif isinstance(trigger, Rate):
+            self._rates.append([self.lines + trigger.first, trigger.count,
+                                daemon])
+            self._next_rate = min(rate[0] for rate in self._rates)
+        elif isinstance(trigger, Event):
+            self._events.setdefault(trigger.name, []).append(daemon)
+            if trigger.source is not None:
+                self.sources.append(trigger.source)
+        else:
+            raise TypeError("Invalid trigger: {}".format(trigger))
+
+    def _periodic(self, daemon, trigger):
+        self.wheel.schedule(trigger.interval, self._periodic, daemon, trigger)
+        try:
+            if trigger.check is not None and not trigger.check():
+                return
+        except Exception:
+            LOG.exception("Exception in trigger check of %s", str(daemon))
+            return
+        self._due.append((daemon, self._last))
+
+    def start_sources(self, fire):
+        for source in self.sources:
+            try:
+                source.start(fire)
+            except (OSError, ValueError):
+                LOG.exception("Unable to start event source %s", str(source))
+
+    def stop_sources(self):
+        for source in self.sources:
+            source.stop()
+
+    def count(self, n, last):
+        """Record n data lines, last is the most recent"""
+        self.lines += n
+        self._last = last
+
+    def fire(self, event, data=None):
+        """Fire a named event, this may be called from any thread"""
+        with self._lock:
+            self._fired.append((event, data))
+
+    def next_deadline(self):
+        return self.wheel.next_deadline()
+
+    def due(self, now=None) -> bool:
+        """Cheap check of whether :meth:`poll` may return any daemons"""
+        if self._due or self._fired:
+            return True
+        if self._next_rate is not None and self.lines >= self._next_rate:
+            return True
+        deadline = self.wheel.next_deadline()
+        if deadline is None:
+            return False
+        return (self.wheel.clock() if now is None else now) >= deadline
+
+    def poll(self, now=None) -> list:
+        """Return a list of (daemon, data) which are due to be started"""
+        self.wheel.advance(now)
+        if self._next_rate is not None and self.lines >= self._next_rate:
+            for rate in self._rates:
+                if self.lines >= rate[0]:
+                    rate[0] = self.lines + rate[1]
+                    self._due.append((rate[2], self._last))
+            self._next_rate = min(rate[0] for rate in self._rates)
+        if self._fired:
+            with self._lock:
+                fired, self._fired = self._fired, collections.deque()
+            for event, data in fired:
+                for daemon in self._events.get(event, ()):
+                    self._due.append((daemon, data))
+        due, self._due = self._due, []
+        return due
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import os
+import re
+import struct
+import logging
+from pathlib import Path
+
+from .writers import GroupCommitWriter, _fdatasync
+
+__all__ = ['SegmentWriter', 'read_segment', 'iter_segments',
+           'segment_paths']
+LOG = logging.getLogger(__name__)
+
+# Segment header: magic, version, flags, sequence number, committed length
+SEG_MAGIC = b'ATGMSEG1'
+SEG_HEADER = struct.Struct('<8sIIQQ')
+SEG_VERSION = 1
+SEALED = 0x1
+# Data starts at the first block boundary after the header
+HEADER_SIZE = 4096
+BLOCK_SIZE = 4096
+SEGMENT_SIZE = 64 * 1024 ** 2
+
+
+def _read_header(fd):
+    header = os.pread(fd, SEG_HEADER.size, 0)
+    if len(header) < SEG_HEADER.size:
+        raise ValueError("Truncated segment header")
+    magic, version, flags, sequence, committed = SEG_HEADER.unpack(header)
+    if magic != SEG_MAGIC or version != SEG_VERSION:
+        raise ValueError("Not a segment file")
+    return flags, sequence, committed
+
+
+def segment_paths(path) -> list:
+    """Return the (sequence, path) of the segments of the data file `path`,
+    in order"""
+    path = Path(str(path))
+    pattern = re.compile(re.escape(path.name) + r'\.(\d+)\.seg$')
+    segments = []
+    for candidate in path.parent.glob(path.name + '.*.seg'):
+        match = pattern.match(candidate.name)
+        if match:
+            segments.append((int(match.group(1)), candidate))
+    return sorted(segments)
+
+
+def read_segment(path) -> bytes:
+    """Return the committed data of a segment file"""
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        _, _, committed = _read_header(fd)
+        return os.pread(fd, committed, HEADER_SIZE)
+    finally:
+        os.close(fd)
+
+
+def iter_segments(path):
+    """Yield the committed data of each segment of the data file `path`, in
+    order"""
+    for _, segment in segment_paths(path):
+        yield read_segment(segment)
+
+
+class SegmentWriter(GroupCommitWriter):
+    """
+    Group commit writer which stores a data file as a sequence of fixed
+    size, preallocated segment files.
+
+    Segments are named <logfile>.<sequence>.seg (e.g. gravdata.dat.000001.seg)
+    and preallocated with posix_fallocate, so appends do not allocate blocks
+    and the segments are not fragmented as they grow. Each segment starts
+    with a header block recording its committed data length, which is
+    updated after every commit; data follows the header. Use
+    :func:`read_segment` or :func:`iter_segments` to read the data.
+
+    A segment is sealed (truncated to its data and flagged in the header)
+    when it is full, when the file is rotated (:meth:`reopen`) and when the
+    writer is closed; a new segment is then started.
+
+    On open the last segment is continued if it was not sealed (the logger
+    crashed or lost power). The recorded length may lag the data (a commit
+    which was written but not recorded) or be ahead of it (a header written
+    back before its data), so the end of the data is found by scanning the
+    block at the recorded length, the data is truncated after the last
+    complete line (`terminator`) and the torn tail is zeroed. This reads a
+    constant amount of data however large the segments are. Binary data
+    (`text` False) may contain zero bytes, so the recorded length is
+    trusted and only complete records after it are kept; with an empty
+    terminator the recorded length is trusted as is.
+
+    Parameters
+    ----------
+    path : str or Path
+        Data file, the segments are created alongside it
+    segment_size : int, Optional
+        Data bytes per segment
+    terminator : bytes, Optional
+        Line terminator, used to find the last complete line on recovery
+    text : bool, Optional
+        The data is text, which contains no zero bytes; recovery may then
+        also find a recorded length which is ahead of the data
+
+    Other keyword arguments are passed to :class:`GroupCommitWriter`.
+
+    """
+    def __init__(self, path, segment_size=SEGMENT_SIZE, terminator=b'\n',
+                 text=False, **kwargs):
+        self.segment_size = int(segment_size)
+        self.terminator = terminator
+        self.text = text
+        self.segment = None  # type: Path
+        self.sequence = 0
+        self.committed = 0
+        self.segments_created = 0
+        self.recovered = 0
+        self.torn_bytes = 0
+        super().__init__(path, **kwargs)
+
+    @property
+    def name(self) -> str:
+        return str(self.segment)
+
+    def open(self):
+        segments = segment_paths(self.path)
+        if not segments:
+            self._new_segment(1)
+            return
+        sequence, segment = segments[-1]
+        fd = os.open(str(segment), os.O_RDWR)
+        try:
+            flags, _, committed = _read_header(fd)
+        except ValueError:
+            LOG.warning("Segment %s has an invalid header, starting a new "
+                        "segment.", str(segment))
+            flags = SEALED
+        if flags & SEALED:
+            os.close(fd)
+            self._new_segment(sequence + 1)
+            return
+        self._fd = fd
+        self.segment = segment
+        self.sequence = sequence
+        self.committed = self._recover(committed)
+
+    def _new_segment(self, sequence):
+        segment = self.path.with_name('%s.%06d.seg' % (self.path.name,
+                                                      sequence))
+        fd = os.open(str(segment), os.O_RDWR | os.O_CREAT | os.O_TRUNC,
+                     0o666)
+        try:
+            os.posix_fallocate(fd, 0, HEADER_SIZE + self.segment_size)
+        except (AttributeError, OSError) as e:
+            # The segment is sparse instead, it reads as zeros all the same
+            LOG.debug("Unable to preallocate segment %s: %s", str(segment), e)
+            os.ftruncate(fd, HEADER_SIZE + self.segment_size)
+        self._fd = fd
+        self.segment = segment
+        self.sequence = sequence
+        self.committed = 0
+        self._write_header()
+        self.segments_created += 1
+        LOG.info("Started data segment %s", str(segment))
+
+    def _write_header(self, flags=0):
+        os.pwrite(self._fd, SEG_HEADER.pack(SEG_MAGIC, SEG_VERSION, flags,
+                                            self.sequence, self.committed), 0)
+
+    def _recover(self, committed) -> int:
+        """Return the length of the data of an unsealed segment, after
+        zeroing its torn tail"""
+        # Binary data may contain zero bytes, only the space after the
+        # recorded length is known to be preallocated (zero) space
+        start = max(0, committed - BLOCK_SIZE) if self.text else committed
+        buf = bytearray()
+        # Read on from the recorded length until the preallocated space,
+        # normally this is the last block
+        while True:
+            chunk = os.pread(self._fd, BLOCK_SIZE,
+                             HEADER_SIZE + start + len(buf))
+            buf += chunk
+            if len(chunk) < BLOCK_SIZE or \
+                    (start + len(buf) > committed and 0 in chunk):
+                break
+        end = buf.find(b'\0', 0 if self.text else committed - start)
+        if end < 0:
+            end = len(buf)
+
+        if not self.terminator:
+            length = committed
+        elif not self.text:
+            # Recorded data is trusted, complete records written after it
+            # are kept
+            cut = buf.rfind(self.terminator, 0, end)
+            length = max(committed, start + cut + len(self.terminator)) \
+                if cut >= 0 else committed
+        else:
+            cut = buf.rfind(self.terminator, 0, end)
+            while cut < 0 and start > 0:
+                # No complete line in the block, step back a block
+                previous = max(0, start - BLOCK_SIZE)
+                buf[0:0] = os.pread(self._fd, start - previous,
+                                    HEADER_SIZE + previous)
+                end += start - previous
+                start = previous
+                cut = buf.rfind(self.terminator, 0, end)
+            length = start + cut + len(self.terminator) if cut >= 0 else 0
+
+        dirty = start + len(buf.rstrip(b'\0'))
+        if dirty > length:
+            os.pwrite(self._fd, bytes(dirty - length), HEADER_SIZE + length)
+            self.torn_bytes += dirty - length
+        if length != committed or dirty > length:
+            LOG.warning("Recovered segment %s: recorded length %d, data "
+                        "length %d, %d torn bytes removed.",
+                        str(self.segment), committed, length,
+                        max(0, dirty - length))
+        self.committed = length
+        self._write_header()
+        self.recovered += 1
+        return length
+
+    def _write(self, view):
+        while len(view):
+            space = self.segment_size - self.committed
+            if len(view) > space and \
+                    (not self.committed or len(view) > self.segment_size):
+                # Larger than a segment, fill this segment up to its last
+                # complete line (or to its end)
+                cut = bytes(view[:space]).rfind(self.terminator) \
+                    if self.terminator else -1
+                if cut >= 0:
+                    size = cut + len(self.terminator)
+                else:
+                    # Split a record only to fill an empty segment
+                    size = 0 if self.committed else space
+            else:
+                size = len(view)
+            if size > space or not size:
+                self._seal()
+                self._new_segment(self.sequence + 1)
+                continue
+            self._append(view[:size])
+            view = view[size:]
+
+    def _append(self, view):
+        written = 0
+        while written < len(view):
+            written += os.pwrite(self._fd, view[written:],
+                                 HEADER_SIZE + self.committed + written)
+            self.writes += 1
+        self.committed += len(view)
+        self._write_header()
+
+    def _seal(self):
+        """Truncate the segment to its data, flag it as sealed and close
+        it"""
+        fd = self._fd
+        try:
+            os.ftruncate(fd, HEADER_SIZE + self.committed)
+            self._write_header(SEALED)
+            if self.sync_interval is not None:
+                _fdatasync(fd)
+                self.syncs += 1
+        finally:
+            os.close(fd)
+            self._fd = None
+        LOG.debug("Sealed data segment %s with %d bytes", str(self.segment),
+                  self.committed)
+
+    def close(self):
+        if self._fd is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._seal()
+            self._first_unsynced = None
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(segment=str(self.segment), sequence=self.sequence,
+                     committed=self.committed,
+                     segments_created=self.segments_created,
+                     recovered=self.recovered, torn_bytes=self.torn_bytes)
+        return stats
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import struct
+import logging
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+__all__ = ['ShmRing']
+LOG = logging.getLogger(__name__)
+
+# Shared header layout, the producer and consumer indices are kept on
+# separate cache lines. Indices are free running byte counts, the offset in
+# the data region is index % capacity.
+# Producer: head, dropped records, dropped bytes, overflow events
+_PRODUCER = struct.Struct('<QQQQ')
+_PRODUCER_OFFSET = 0
+# Consumer: tail, followed by the (constant) capacity of the data region
+_CONSUMER = struct.Struct('<Q')
+_CONSUMER_OFFSET = 64
+_CAPACITY_OFFSET = 72
+_DATA_OFFSET = 128
+
+# Record header: length, monotonic ns, wall clock ns
+RECORD = struct.Struct('<Iqq')
+# Length value marking that the rest of the data region is unused and the
+# next record starts at offset 0
+_WRAP = 0xFFFFFFFF
+_ALIGN = 8
+
+
+def _aligned(length) -> int:
+    return (length + _ALIGN - 1) & ~(_ALIGN - 1)
+
+
+class ShmRing:
+    """
+    Single producer, single consumer ring buffer of variable length records
+    in a shared memory block, used to pass framed lines from the serial
+    listener process to the main process without pickling or locking.
+
+    Each record carries the receive timestamps (monotonic and wall clock ns)
+    of the read it was framed from.
+
+    The producer never blocks: if the consumer has fallen behind and a record
+    does not fit, the record is dropped and counted (`dropped`,
+    `dropped_bytes`); `overflows` counts the number of times the ring became
+    full.
+
+    The ring is created (and unlinked on close) by the main process. The
+    listener process, which is started by the forkserver (or spawned) rather
+    than forked from the main process, attaches to the block by name with
+    ``ShmRing(name=ring.name)``. Each side must only call its own methods
+    (:meth:`put` in the producer, :meth:`get` in the consumer).
+
+    Parameters
+    ----------
+    capacity : int, Optional
+        Size of the data region in bytes, rounded up to a multiple of 8
+    name : str, Optional
+        Name of an existing shared memory block to attach to, otherwise a new
+        block is created
+
+    Raises
+    ------
+    RuntimeError
+        If shared memory is not supported (Python < 3.8)
+
+    """
+    def __init__(self, capacity=1024 ** 2, name=None):
+        if shared_memory is None:
+            raise RuntimeError("Shared memory ring requires Python 3.8 or "
+                               "later.")
+        if name is None:
+            capacity = _aligned(max(int(capacity), 1024))
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=_DATA_OFFSET + capacity)
+            self._shm.buf[:_DATA_OFFSET] = bytes(_DATA_OFFSET)
+            struct.pack_into('<Q', self._shm.buf, _CAPACITY_OFFSET, capacity)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self._buf = self._shm.buf
+        # The block may be rounded up to a page by the OS, so the capacity is
+        # read back from the header
+        self.capacity = struct.unpack_from('<Q', self._buf,
+                                           _CAPACITY_OFFSET)[0]
+
+        # Local copies of this side's own index
+        self._head = self._load_producer()[0]
+        self._tail = self._load_tail()
+        self._full = False
+        # Consumer side counters
+        self.received = 0
+        self.high_water = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def _load_producer(self):
+        return _PRODUCER.unpack_from(self._buf, _PRODUCER_OFFSET)
+
+    def _load_tail(self) -> int:
+        return _CONSUMER.unpack_from(self._buf, _CONSUMER_OFFSET)[0]
+
+    def __len__(self):
+        """Return the number of bytes in use"""
+        return self._load_producer()[0] - self._load_tail()
+
+    def put(self, data, mono_ns=None, wall_ns=None) -> bool:
+        """
+        Append a record to the ring (producer only).
+
+        Returns
+        -------
+        bool
+            False if the record was dropped because the ring is full
+
+        """
+        cap = self.capacity
+        size = _aligned(RECORD.size + len(data))
+        head = self._head
+        pos = head % cap
+        contiguous = cap - pos
+        need = size if size <= contiguous else contiguous + size
+
+        if size > cap or cap - (head - self._load_tail()) < need:
+            _, dropped, dropped_bytes, overflows = self._load_producer()
+            if not self._full:
+                self._full = True
+                overflows += 1
+                LOG.warning("Shared memory ring is full, dropping records.")
+            _PRODUCER.pack_into(self._buf, _PRODUCER_OFFSET, head,
+                                dropped + 1, dropped_bytes + len(data),
+                                overflows)
+            return False
+        self._full = False
+
+        buf = self._buf
+        if size > contiguous:
+            struct.pack_into('<I', buf, _DATA_OFFSET + pos, _WRAP)
+            head += contiguous
+            pos = 0
+        offset = _DATA_OFFSET + pos
+        RECORD.pack_into(buf, offset, len(data), mono_ns or 0, wall_ns or 0)
+        offset += RECORD.size
+        buf[offset:offset + len(data)] = data
+        # Publish the record only after it has been written
+        self._head = head + size
+        struct.pack_into('<Q', buf, _PRODUCER_OFFSET, self._head)
+        return True
+
+    def get(self) -> list:
+        """
+        Remove and return all available records (consumer only) as a list of
+        (data, monotonic ns, wall clock ns) tuples.
+
+        """
+        records = []
+        head = self._load_producer()[0]
+        tail = self._tail
+        if head == tail:
+            return records
+        self.high_water = max(self.high_water, head - tail)
+
+        cap = self.capacity
+        buf = self._buf
+        while tail < head:
+            pos = tail % cap
+            offset = _DATA_OFFSET + pos
+            length = struct.unpack_from('<I', buf, offset)[0]
+            if length == _WRAP:
+                tail += cap - pos
+                continue
+            length, mono, wall = RECORD.unpack_from(buf, offset)
+            offset += RECORD.size
+            records.append((bytes(buf[offset:offset + length]), mono, wall))
+            tail += _aligned(RECORD.size + length)
+
+        self._tail = tail
+        _CONSUMER.pack_into(buf, _CONSUMER_OFFSET, tail)
+        self.received += len(records)
+        return records
+
+    def stats(self) -> dict:
+        _, dropped, dropped_bytes, overflows = self._load_producer()
+        return dict(capacity=self.capacity, used=len(self),
+                    high_water=self.high_water, received=self.received,
+                    dropped=dropped, dropped_bytes=dropped_bytes,
+                    overflows=overflows)
+
+    def close(self):
+        """Release the shared memory block, it is destroyed if this ring
+        created it."""
+        if self._shm is None:
+            return
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._shm = None
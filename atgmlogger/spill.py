@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import os
+import time
+import queue
+import pickle
+import struct
+import logging
+import threading
+import collections
+from pathlib import Path
+
+from .dispatcher import Batch
+
+__all__ = ['SpillChannel', 'item_size']
+LOG = logging.getLogger(__name__)
+
+# Spill record header: length of the pickled item
+_RECORD = struct.Struct('<I')
+
+
+def item_size(item) -> int:
+    """Approximate size in bytes of a data item (line or Batch)"""
+    if isinstance(item, (str, bytes)):
+        return len(item)
+    if isinstance(item, Batch):
+        return sum(len(line) for line in item)
+    return 0
+
+
+class SpillChannel:
+    """
+    Plugin queue which spills to disk when its consumer stalls.
+
+    Items are held in memory until the pending (in memory) data exceeds
+    `threshold` bytes. The channel is then degraded: every further item is
+    appended to a spill segment file in `path` (e.g. a tmpfs, or another
+    disk than the stalled one) through a large write buffer, so the spill
+    device sees large sequential writes. Once the in memory items have been
+    consumed, items are read back from the segment in order. When the
+    segment is fully drained it is deleted and the channel leaves the
+    degraded state.
+
+    If the segment reaches `max_bytes` (or cannot be written), items are
+    kept in memory again, after the spilled items.
+
+    If the channel is closed while the segment holds items which were not
+    read back, the segment is kept (and its path logged) instead of being
+    deleted.
+
+    Implements the :class:`queue.Queue` interface used by plugins.
+
+    Parameters
+    ----------
+    path : str or Path
+        Directory for the spill segment
+    threshold : int, Optional
+        In memory backlog (bytes) above which items are spilled
+    max_bytes : int, Optional
+        Maximum size of the spill segment, 0 for no limit
+    name : str, Optional
+        Spill segment file name
+    buffer_size : int, Optional
+        Spill write buffer size
+
+    """
+    def __init__(self, path, threshold=4 * 1024 ** 2, max_bytes=0,
+                 name='spill.seg', buffer_size=256 * 1024):
+        self.path = Path(str(path))
+        self.threshold = int(threshold)
+        self.max_bytes = int(max_bytes or 0)
+        self.buffer_size = buffer_size
+        self.filename = self.path.joinpath(name)
+
+        self._memory = collections.deque()
+        # Items put after the segment was full, delivered after the segment
+        self._overflow = collections.deque()
+        self._mem_bytes = 0
+        self._writer = None
+        self._reader = None
+        self._spilled = 0  # Items in the segment not yet read back
+        self._segment_bytes = 0
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        self._unfinished = 0
+
+        self.degraded_since = None
+        self.bytes_spilled = 0
+        self.items_spilled = 0
+        self.spill_events = 0
+        self.high_water_bytes = 0
+        self._degraded_time = 0.0
+
+    @property
+    def degraded(self) -> bool:
+        return self.degraded_since is not None
+
+    @property
+    def degraded_time(self) -> float:
+        """Total seconds spent in the degraded (spilling) state"""
+        total = self._degraded_time
+        if self.degraded_since is not None:
+            total += time.monotonic() - self.degraded_since
+        return total
+
+    def stats(self) -> dict:
+        return dict(policy='spill', pending=self.qsize(),
+                    memory_bytes=self._mem_bytes,
+                    high_water_bytes=self.high_water_bytes,
+                    degraded=self.degraded, spill_events=self.spill_events,
+                    bytes_spilled=self.bytes_spilled,
+                    items_spilled=self.items_spilled,
+                    spill_pending=self._spilled,
+                    degraded_time=self.degraded_time, dropped=0)
+
+    def qsize(self) -> int:
+        return len(self._memory) + self._spilled + len(self._overflow)
+
+    def empty(self) -> bool:
+        return not self.qsize()
+
+    def full(self) -> bool:
+        return False
+
+    def put(self, item, block=True, timeout=None):
+        with self._lock:
+            self._unfinished += 1
+            if self.degraded:
+                if self._overflow or not self._spill(item):
+                    self._overflow.append(item)
+            elif item is not None and \
+                    self._mem_bytes + item_size(item) > self.threshold and \
+                    self._start_spill():
+                if not self._spill(item):
+                    self._overflow.append(item)
+            else:
+                self._memory.append(item)
+                self._mem_bytes += item_size(item)
+                if self._mem_bytes > self.high_water_bytes:
+                    self.high_water_bytes = self._mem_bytes
+            self._not_empty.notify()
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def _start_spill(self) -> bool:
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._writer = self.filename.open('wb',
+                                              buffering=self.buffer_size)
+            self._reader = self.filename.open('rb')
+        except OSError:
+            LOG.exception("Unable to create spill segment %s",
+                          str(self.filename))
+            self._close_segment()
+            return False
+        self._segment_bytes = 0
+        self.degraded_since = time.monotonic()
+        self.spill_events += 1
+        LOG.warning("Data sink is stalled (%d bytes pending), spilling to "
+                    "%s", self._mem_bytes, str(self.filename))
+        return True
+
+    def _spill(self, item) -> bool:
+        if self._writer is None:
+            return False
+        data = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.max_bytes and \
+                self._segment_bytes + len(data) > self.max_bytes:
+            return False
+        try:
+            self._writer.write(_RECORD.pack(len(data)))
+            self._writer.write(data)
+        except OSError:
+            LOG.exception("Error writing spill segment")
+            return False
+        self._segment_bytes += _RECORD.size + len(data)
+        self._spilled += 1
+        self.items_spilled += 1
+        self.bytes_spilled += item_size(item)
+        return True
+
+    def _unspill(self):
+        """Read the next item back from the segment"""
+        header = self._reader.read(_RECORD.size)
+        if len(header) < _RECORD.size:
+            # The record is still in the write buffer
+            self._writer.flush()
+            header += self._reader.read(_RECORD.size - len(header))
+        length, = _RECORD.unpack(header)
+        data = self._reader.read(length)
+        if len(data) < length:
+            self._writer.flush()
+            data += self._reader.read(length - len(data))
+        self._spilled -= 1
+        return pickle.loads(data)
+
+    def _close_segment(self, unlink=True):
+        for hdl in (self._writer, self._reader):
+            if hdl is not None:
+                hdl.close()
+        self._writer = self._reader = None
+        if not unlink:
+            return
+        try:
+            os.unlink(str(self.filename))
+        except OSError:
+            pass
+
+    def _recover(self):
+        self._close_segment()
+        elapsed = time.monotonic() - self.degraded_since
+        self._degraded_time += elapsed
+        self.degraded_since = None
+        LOG.warning("Data sink recovered after %.1f s, %d bytes spilled in "
+                    "total", elapsed, self.bytes_spilled)
+
+    def _pop(self):
+        if self._memory:
+            item = self._memory.popleft()
+            self._mem_bytes -= item_size(item)
+            return item
+        if self._spilled:
+            item = self._unspill()
+        else:
+            item = self._overflow.popleft()
+        if not self._spilled and not self._overflow:
+            self._recover()
+        return item
+
+    def get(self, block=True, timeout=None):
+        with self._not_empty:
+            if not block:
+                if not self.qsize():
+                    raise queue.Empty
+            elif timeout is None:
+                while not self.qsize():
+                    self._not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self.qsize():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._not_empty.wait(remaining)
+            return self._pop()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def task_done(self):
+        with self._lock:
+            self._unfinished -= 1
+            if self._unfinished <= 0:
+                if self._unfinished < 0:
+                    self._unfinished = 0
+                    raise ValueError('task_done() called too many times')
+                self._all_done.notify_all()
+
+    def join(self):
+        with self._all_done:
+            while self._unfinished:
+                self._all_done.wait()
+
+    def close(self):
+        with self._lock:
+            if self._writer is None:
+                return
+            if self._spilled:
+                LOG.error("Closing spill channel with %d items not read back, "
+                          "the last %d records of spill segment %s were not "
+                          "delivered.", self.qsize(), self._spilled,
+                          str(self.filename))
+            self._close_segment(unlink=not self._spilled)
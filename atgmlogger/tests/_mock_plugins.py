@@ -69,6 +69,52 @@ class ComplexModule(PluginInterface):
         pass
 
 
+class BatchModule(PluginInterface):
+    batched = True
+
+    def __init__(self):
+        super().__init__()
+        self.accumulator = []
+        self.batches = 0
+
+    @staticmethod
+    def consumer_type():
+        return {SimplePacket}
+
+    def run(self):
+        while not self.exiting:
+            item = self.queue.get(block=True, timeout=None)
+            if item is None:
+                self.task_done()
+                continue
+            self.batches += 1
+            self.accumulator.extend(packet.value for packet in item)
+            self.task_done()
+
+    def configure(self, **options):
+        pass
+
+
+class TextModule(PluginInterface):
+    def __init__(self):
+        super().__init__()
+        self.accumulator = []
+
+    @staticmethod
+    def consumer_type():
+        return {str}
+
+    def run(self):
+        while not self.exiting:
+            item = self.queue.get(block=True, timeout=None)
+            if item is not None:
+                self.accumulator.append(item)
+            self.task_done()
+
+    def configure(self, **options):
+        pass
+
+
 class TestLogger:
     def __init__(self):
         self.data = []
@@ -76,3 +122,27 @@ class TestLogger:
     def log(self, level, data):
         self.data.append((level, data))
 
+
+class AsyncModule(PluginInterface):
+    """Plugin with a coroutine handler, run as a task by the
+    AsyncDispatcher"""
+    def __init__(self):
+        super().__init__()
+        self.accumulator = []
+        self.closed = False
+
+    @staticmethod
+    def consumer_type():
+        return {str}
+
+    async def handle(self, item):
+        self.accumulator.append(item)
+
+    def close(self):
+        self.closed = True
+
+    def run(self):
+        pass
+
+    def configure(self, **options):
+        pass
@@ -19,21 +19,50 @@ def cfg_dict():
             "baudrate": 57600,
             "bytesize": 8,
             "parity": "N",
-            "stopbits": 1
+            "stopbits": 1,
+            "batch": False,
+            "sanitize": "strip",
+            "reader": "in_waiting",
+            "read_size": 2048,
+            "read_gap": 0.1,
+            "vmin": 255,
+            "encoding": "utf-8",
+            "binary": False,
+            "framer": "newline",
+            "process": False,
+            "ring_size": 1048576
         },
         "logging": {
-            "logdir": "/var/log/atgmlogger"
+            "logdir": "/var/log/atgmlogger",
+            "timestamps": None,
+            "capture": False,
+            "spill": None,
+            "flush_lines": 1,
+            "flush_bytes": 65536,
+            "flush_interval": 1.0,
+            "sync_interval": None,
+            "segments": False,
+            "compression": None
         },
         "usb": {
             "mount": "/media/removable",
             "copy_level": "debug"
         },
+        "ports": [],
+        "dispatcher": {
+            "runtime": "threaded",
+            "fanout": "queue",
+            "ring_size": 1024
+        },
+        "scheduling": {},
+        "autotune": False,
         "plugins": {
             "gpio": {
                 "mode": "board",
                 "data_pin": 11,
                 "usb_pin": 13,
-                "freq": 0.04
+                "freq": 0.04,
+                "channel": {"maxsize": 20, "policy": "coalesce"}
             },
             "usb": {
                 "mountpath": "/media/removable",
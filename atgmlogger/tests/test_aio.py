@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+import tty
+from pathlib import Path
+
+import pytest
+import serial
+
+from atgmlogger.aio import AsyncDispatcher
+from atgmlogger.atgmlogger import SerialListener
+from atgmlogger.logger import DataLogger
+
+pytest.importorskip('termios')
+LINE = "$UW,81242,-1948,557,4807924,307,872,204,6978,7541,-70,305,266," \
+       "4903912,0.000000,0.000000,0.0000,0.0000,{idx}"
+
+
+@pytest.fixture
+def port():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    hdl = serial.Serial(os.ttyname(slave), baudrate=57600)
+    yield master, hdl
+    hdl.close()
+    for fd in (master, slave):
+        os.close(fd)
+
+
+def test_async_dispatcher(port, tmpdir):
+    from ._mock_plugins import AsyncModule, TextModule
+    master, hdl = port
+    logfile = Path(str(tmpdir)).joinpath('gravdata.dat')
+
+    dispatcher = AsyncDispatcher(private_registry=True)
+    dispatcher.register(DataLogger, logfile=logfile)
+    dispatcher.register(AsyncModule)
+    dispatcher.register(TextModule)
+    dispatcher.attach(SerialListener(hdl, collector=dispatcher.message_queue,
+                                     batch=True))
+    thread = threading.Thread(target=dispatcher.run)
+    thread.start()
+
+    lines = [LINE.format(idx=i) for i in range(100)]
+    for i in range(0, 100, 10):
+        os.write(master, '\r\n'.join(lines[i:i + 10]).encode() + b'\r\n')
+    plugin = None
+    try:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            plugin = dispatcher.get_instance_of(AsyncModule)
+            if plugin is not None and len(plugin.accumulator) == 100:
+                break
+            time.sleep(0.01)
+    finally:
+        dispatcher.exit(join=True)
+        thread.join(timeout=5)
+    assert not thread.is_alive()
+
+    assert lines == plugin.accumulator
+    assert plugin.closed
+    # Blocking plugins still run in their own thread
+    assert lines == dispatcher.get_instance_of(TextModule).accumulator
+    with logfile.open('r') as fd:
+        assert lines == [line.strip() for line in fd]
+    assert 2 == dispatcher.stats()['tasks']  # DataLogger and AsyncModule
+
+
+class FakeSource:
+    def __init__(self):
+        self.started = 0
+        self.stopped = 0
+        self.fire = None
+
+    def start(self, fire):
+        self.started += 1
+        self.fire = fire
+
+    def stop(self):
+        self.stopped += 1
+
+
+def test_async_trigger_sources():
+    from atgmlogger.plugins import PluginDaemon
+    from atgmlogger.scheduler import Periodic, Event
+    source = FakeSource()
+    runs = []
+
+    class MountDaemon(PluginDaemon):
+        @classmethod
+        def condition(cls, *args):
+            return False
+
+        @classmethod
+        def triggers(cls):
+            # The periodic check re-arms the timer without running the job
+            return [Periodic(0.05, check=lambda: False),
+                    Event('mount', source=source)]
+
+        def run(self):
+            runs.append(self.data)
+
+    dispatcher = AsyncDispatcher(private_registry=True)
+    dispatcher.register(MountDaemon)
+    thread = threading.Thread(target=dispatcher.run)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 2
+        while dispatcher.wakeups < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Re-arming the periodic timer leaves the event source running
+        assert 1 == source.started
+        assert 0 == source.stopped
+        source.fire('mount', '/media/removable')
+        while '/media/removable' not in runs and \
+                time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert '/media/removable' in runs
+    finally:
+        dispatcher.exit(join=True)
+        thread.join(timeout=5)
+    assert 1 == source.stopped
+
+
+def test_async_data_logger_executor(tmpdir):
+    import asyncio
+    import queue
+    from atgmlogger.dispatcher import AppContext
+    logfile = Path(str(tmpdir)).joinpath('gravdata.dat')
+    logger = DataLogger()
+    logger.set_context(AppContext(queue.Queue()))
+    logger.configure(logfile=logfile)
+    threads = []
+    write = logger._handle
+
+    def handle(item):
+        threads.append(threading.get_ident())
+        write(item)
+    logger._handle = handle
+
+    loop = asyncio.new_event_loop()
+    try:
+        for i in range(5):
+            loop.run_until_complete(logger.handle(LINE.format(idx=i)))
+    finally:
+        loop.close()
+    logger.close()
+    # The file is written off the event loop thread
+    assert 5 == len(threads)
+    assert threading.get_ident() not in threads
+    with logfile.open('r') as fd:
+        assert [LINE.format(idx=i) for i in range(5)] == \
+            [line.strip() for line in fd]
+
+
+
+def test_async_data_logger_group_commit(tmpdir):
+    import asyncio
+    import queue
+    from atgmlogger.dispatcher import AppContext
+    logfile = Path(str(tmpdir)).joinpath('gravdata.dat')
+    logger = DataLogger()
+    logger.set_context(AppContext(queue.Queue()))
+    logger.configure(logfile=logfile, flush_lines=10, flush_interval=0.2)
+
+    loop = asyncio.new_event_loop()
+    try:
+        for i in range(3):
+            loop.run_until_complete(logger.handle(LINE.format(idx=i)))
+        # The lines are not committed after every item
+        assert 0 == logger.flushes
+        assert 0 == logfile.stat().st_size
+        # but by the loop timer, flush_interval after the first line
+        loop.run_until_complete(asyncio.sleep(0.5))
+        assert 1 == logger.flushes
+        assert logger._service_timer is None
+    finally:
+        loop.close()
+    logger.close()
+    with logfile.open('r') as fd:
+        assert [LINE.format(idx=i) for i in range(3)] == \
+            [line.strip() for line in fd]
+
+def test_async_listener_reader(port):
+    import termios
+    from atgmlogger.atgmlogger import _get_listener
+    from atgmlogger.readers import InWaitingReader
+    master, hdl = port
+    attrs = termios.tcgetattr(hdl.fileno())
+    # The event loop reads the port, the listener's reader is never used
+    listener = _get_listener(hdl, params={'reader': 'poll'}, capture=False,
+                             external=True)
+    assert isinstance(listener.reader, InWaitingReader)
+    assert attrs == termios.tcgetattr(hdl.fileno())
+    assert not os.get_blocking(hdl.fileno())
+
+
+def test_async_dispatcher_run_once():
+    dispatcher = AsyncDispatcher(private_registry=True)
+    dispatcher.exit()
+    dispatcher.run()
+    # The worker pool and serial ports are closed by the first run
+    with pytest.raises(RuntimeError):
+        dispatcher.run()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from atgmlogger.autotune import AutoTuner
+from atgmlogger.logger import DataLogger
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeDispatcher:
+    def __init__(self, logger):
+        self.logger = logger
+
+    def get_instance_of(self, klass):
+        return self.logger if isinstance(self.logger, klass) else None
+
+
+class CountingLogger(DataLogger):
+    # Counters set by the test instead of the file writer
+    flushes = 0
+    flush_time = 0.0
+
+
+class FakeReader:
+    read_size = 2048
+
+
+@pytest.mark.parametrize('rate,line_size,latency,expected', [
+    # 1 Hz: every line is flushed as it arrives
+    (1.0, 120, 0.001, dict(flush_lines=1, flush_interval=0.499,
+                           read_size=256)),
+    # 20 Hz: lines expected within the target are flushed together
+    (20.0, 120, 0.001, dict(flush_lines=9, flush_interval=0.499,
+                            read_size=2048)),
+    # A slow write leaves less of the target to batch lines
+    (20.0, 120, 0.25, dict(flush_lines=5, flush_interval=0.25,
+                           read_size=1024)),
+    (1000.0, 120, 0.0, dict(flush_lines=500, flush_interval=0.5,
+                            read_size=4096)),
+    (0.1, 10, 1.0, dict(flush_lines=1, flush_interval=0.05, read_size=64)),
+])
+def test_choose(rate, line_size, latency, expected):
+    tuner = AutoTuner([], target_latency=0.5)
+    assert expected == tuner.choose(rate, line_size, latency)
+
+
+def test_tune():
+    clock = FakeClock()
+    logger = CountingLogger()
+    reader = FakeReader()
+    tuner = AutoTuner([FakeDispatcher(logger)], readers=[reader, object()],
+                      target_latency=0.5, clock=clock)
+    assert [reader] == tuner.readers
+
+    # Baseline, then no data
+    assert {} == tuner.tune()
+    clock.now += 10
+    assert {} == tuner.tune()
+    assert 1 == logger.flush_lines
+
+    clock.now += 10
+    logger.lines_written += 200
+    logger.bytes_written += 200 * 100
+    logger.flushes += 200
+    logger.flush_time += 200 * 0.001
+    settings = tuner.tune()['gravdata.dat']
+    assert dict(flush_lines=9, flush_interval=0.499, read_size=1024) == \
+        settings
+    assert 9 == logger.flush_lines
+    assert 0.499 == logger.flush_interval
+    assert 1024 == reader.read_size
+    stats = tuner.stats()
+    assert 1 == stats['tunings']
+    assert pytest.approx(20.0) == stats['measured']['gravdata.dat']['rate']
+
+
+def test_baseline_waits_for_logger():
+    # The asyncio runtime creates the DataLogger after the tuner is started
+    dispatcher = FakeDispatcher(None)
+    tuner = AutoTuner([dispatcher], warmup=0.5, interval=60)
+    tuner.start()
+    try:
+        time.sleep(0.2)
+        assert {} == tuner._samples
+        logger = CountingLogger()
+        dispatcher.logger = logger
+        deadline = time.monotonic() + 2
+        while not tuner._samples and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert 'gravdata.dat' in tuner._samples
+        # Data received during the warmup is tuned for after the warmup
+        logger.lines_written += 10
+        logger.bytes_written += 10 * 100
+        while not tuner.tunings and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert 1 == tuner.tunings
+        assert 'gravdata.dat' in tuner.settings
+    finally:
+        tuner.exit(join=True)
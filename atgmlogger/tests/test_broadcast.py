@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+
+import pytest
+
+from atgmlogger.broadcast import BroadcastRing
+from atgmlogger.dispatcher import Batch, Dispatcher
+
+
+def _drain(cursor):
+    items = []
+    while True:
+        try:
+            items.append(cursor.get_nowait())
+        except queue.Empty:
+            return items
+
+
+def test_broadcast_cursors():
+    ring = BroadcastRing(size=10)
+    assert 16 == ring.size
+    first = ring.subscribe()
+    second = ring.subscribe(types={int})
+    for i in range(10):
+        ring.publish(i)
+    ring.publish('text')
+
+    assert list(range(10)) + ['text'] == _drain(first)
+    assert list(range(10)) == _drain(second)
+    assert 0 == first.lag == second.lag
+    assert 11 == ring.stats()['published']
+
+
+def test_broadcast_batches():
+    ring = BroadcastRing(size=16)
+    batched = ring.subscribe(types={str}, batched=True)
+    lines = ring.subscribe(types={str})
+    text = ring.subscribe(types={str}, batched=True)
+    binary = Batch([b'line 1', b'line 2'], item_type=bytes)
+    ring.publish(Batch(['a', 'b']))
+    ring.publish(binary)
+
+    assert [['a', 'b'], ['line 1', 'line 2']] == _drain(batched)
+    assert ['a', 'b', 'line 1', 'line 2'] == _drain(lines)
+    assert str is _drain(text)[1].item_type
+
+
+def test_broadcast_lagging_cursor():
+    ring = BroadcastRing(size=8)
+    fast = ring.subscribe()
+    slow = ring.subscribe()
+    for i in range(20):
+        ring.publish(i)
+        assert i == fast.get_nowait()
+    assert 20 == slow.lag
+
+    # The slow cursor skips to the oldest item still in the ring
+    assert list(range(12, 20)) == _drain(slow)
+    assert 12 == slow.stats()['dropped']
+    assert 0 == fast.stats()['dropped']
+
+
+def test_broadcast_lossless_gates_producer():
+    ring = BroadcastRing(size=4)
+    cursor = ring.subscribe(lossless=True)
+    received = []
+
+    def consume():
+        for _ in range(100):
+            received.append(cursor.get(timeout=2))
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    for i in range(100):
+        ring.publish(i)
+    consumer.join(timeout=5)
+    assert list(range(100)) == received
+    assert 0 == cursor.dropped
+
+
+def test_dispatch_broadcast():
+    from ._mock_plugins import (BasicModule, BatchModule, SimplePacket,
+                                TextModule)
+    dispatcher = Dispatcher(private_registry=True, fanout='broadcast',
+                            ring_size=64)
+    for klass in (BasicModule, BatchModule, TextModule):
+        # Lossless, so that the cursors gate the (much faster) dispatcher
+        dispatcher.register(type(klass.__name__, (klass, ),
+                                 {'lossless': True}))
+    dispatcher.start()
+    for i in range(0, 1000, 10):
+        dispatcher.put(Batch((SimplePacket(j) for j in range(i, i + 10)),
+                             item_type=SimplePacket))
+    dispatcher.put(b'bytes line')
+    dispatcher.message_queue.join()
+    dispatcher.exit(join=True)
+
+    basic = dispatcher.get_instance_of(BasicModule)
+    assert list(range(1000)) == basic.accumulator
+    assert 0 == basic.stats()['dropped']
+    assert 100 == dispatcher.get_instance_of(BatchModule).batches
+    assert ['bytes line'] == dispatcher.get_instance_of(TextModule).accumulator
+
+
+def test_invalid_fanout():
+    with pytest.raises(ValueError):
+        Dispatcher(fanout='unknown')
+
+
+def test_broadcast_dead_lossless_cursor():
+    ring = BroadcastRing(size=4, check_interval=0.05)
+    cursor = ring.subscribe(lossless=True)
+    # The consumer exits (e.g. the plugin crashed) after one item
+    consumer = threading.Thread(target=cursor.get, kwargs={'timeout': 2})
+    consumer.start()
+    ring.publish(0)
+    consumer.join(timeout=2)
+    assert cursor.thread is consumer
+
+    producer = threading.Thread(target=lambda: [ring.publish(i)
+                                                for i in range(1, 20)])
+    producer.start()
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+    assert 19 == ring.published
+    assert not cursor.lossless
+    assert 1 == ring.stats()['released']
+
+
+def test_dispatch_broadcast_channel_warning(caplog):
+    from ._mock_plugins import BasicModule, SimplePacket
+    dispatcher = Dispatcher(private_registry=True, fanout='broadcast')
+    dispatcher.register(type('CoalescingModule', (BasicModule, ),
+                             {'channel': {'maxsize': 8,
+                                          'policy': 'coalesce'}}))
+    dispatcher.start()
+    dispatcher.put(SimplePacket(1))
+    dispatcher.message_queue.join()
+    dispatcher.exit(join=True)
+    assert 'ignored with broadcast fanout' in caplog.text
+    assert [1] == dispatcher.get_instance_of(BasicModule).accumulator
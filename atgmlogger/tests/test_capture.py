@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+from atgmlogger.atgmlogger import SerialListener
+from atgmlogger.capture import RawCapture, read_capture
+
+LINE = b"$UW,81242,-1948,557,4807924,307,872,204,6978,7541,-70,305,266," \
+       b"4903912,0.000000,0.000000,0.0000,0.0000,00000000001646\r\n"
+
+
+def test_raw_capture(tmpdir):
+    path = Path(str(tmpdir)).joinpath('raw.bin')
+    capture = RawCapture(path)
+    capture.start()
+    chunks = [b'\xff\x00garbage', LINE[:10], LINE[10:]]
+    for i, chunk in enumerate(chunks):
+        capture.capture(chunk, i, 1000 + i)
+    capture.exit(join=True)
+
+    records = list(read_capture(path))
+    assert [(1000 + i, i, chunk) for i, chunk in enumerate(chunks)] == records
+    assert 0 == capture.stats()['dropped_bytes']
+
+
+def test_raw_capture_size_limit(tmpdir):
+    path = Path(str(tmpdir)).joinpath('raw.bin')
+    capture = RawCapture(path, max_bytes=512)
+    capture.start()
+    for i in range(10):
+        capture.capture(LINE, i, i)
+    capture.exit(join=True)
+
+    assert path.stat().st_size <= 512
+    assert 3 == len(list(read_capture(path)))
+    assert capture.stats()['dropped_bytes'] == 7 * len(LINE)
+
+
+def test_listener_capture(tmpdir, handle):
+    path = Path(str(tmpdir)).joinpath('raw.bin')
+    capture = RawCapture(path)
+    capture.start()
+    listener = SerialListener(handle, capture=capture)
+    handle.write(b'\x01\x02' + LINE)
+    assert b'\x01\x02' + LINE == listener.readline()
+    capture.exit(join=True)
+
+    data = b''.join(chunk for _, _, chunk in read_capture(path))
+    assert b'\x01\x02' + LINE == data
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+
+import pytest
+
+from atgmlogger.channels import Channel, get_channel
+from atgmlogger.dispatcher import Blink
+
+
+def _drain(channel):
+    items = []
+    while not channel.empty():
+        items.append(channel.get_nowait())
+        channel.task_done()
+    return items
+
+
+def test_channel_unbounded():
+    channel = get_channel()
+    for i in range(1000):
+        channel.put(i)
+    assert list(range(1000)) == _drain(channel)
+    assert 1000 == channel.high_water
+    assert 0 == channel.dropped
+    with pytest.raises(queue.Empty):
+        channel.get(timeout=0.01)
+
+
+def test_channel_drop_oldest():
+    channel = get_channel(5)
+    assert 'drop-oldest' == channel.policy
+    for i in range(10):
+        channel.put(i)
+    # The exit sentinel is never dropped
+    channel.put(None)
+    assert [5, 6, 7, 8, 9, None] == _drain(channel)
+    assert 5 == channel.dropped
+    assert 6 == channel.high_water
+    channel.join()
+
+
+def test_channel_drop_newest():
+    channel = Channel(maxsize=5, policy='drop-newest')
+    for i in range(10):
+        channel.put(i)
+    assert [0, 1, 2, 3, 4] == _drain(channel)
+    assert {'policy': 'drop-newest', 'maxsize': 5, 'pending': 0,
+            'received': 10, 'dropped': 5, 'coalesced': 0,
+            'high_water': 5} == channel.stats()
+
+
+def test_channel_block():
+    channel = Channel(maxsize=2, policy='block')
+    channel.put(0)
+    channel.put(1)
+    with pytest.raises(queue.Full):
+        channel.put_nowait(2)
+    with pytest.raises(queue.Full):
+        channel.put(2, timeout=0.01)
+
+    producer = threading.Thread(target=channel.put, args=(2,))
+    producer.start()
+    assert 0 == channel.get(timeout=1)
+    producer.join(timeout=1)
+    assert not producer.is_alive()
+    assert [1, 2] == [channel.get(), channel.get()]
+    assert 0 == channel.dropped
+
+
+def test_channel_coalesce_blinks():
+    channel = get_channel({'maxsize': 3, 'policy': 'coalesce'},
+                          key=lambda b: None if b.until_stopped else b.led)
+    for _ in range(50):
+        channel.put(Blink('data'))
+    start = Blink('usb', continuous=True)
+    channel.put(start)
+    channel.put(Blink('usb'))
+    channel.put(Blink('gps'))  # Full, the oldest blink ('data') is dropped
+    stop = Blink('usb', continuous=True)
+    channel.put(stop)  # Drops the 'usb' blink, never the continuous start
+
+    items = _drain(channel)
+    assert [start, Blink, stop] == [b if b.until_stopped else Blink
+                                    for b in items]
+    assert ['usb', 'gps', 'usb'] == [b.led for b in items]
+    assert 49 == channel.coalesced
+    assert 2 == channel.dropped
+    channel.join()
+
+
+def test_plugin_channel_option():
+    from ._mock_plugins import BasicModule, SimplePacket
+    plugin = BasicModule()
+    assert isinstance(plugin.queue, Channel)
+    assert 0 == plugin.queue.maxsize
+    # BasicModule overrides configure, use the base implementation
+    super(BasicModule, plugin).configure(
+        channel={'maxsize': 10, 'policy': 'drop-oldest'})
+    for i in range(100):
+        plugin.put(SimplePacket(i))
+    assert 90 == plugin.stats()['dropped']
+    assert 10 == plugin.stats()['pending']
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        Channel(maxsize=1, policy='unknown')
+
+
+def test_priority_channel():
+    from atgmlogger.channels import PriorityChannel
+    from atgmlogger.dispatcher import Command
+    channel = PriorityChannel(indicator_maxsize=4)
+    lines = ['line %d' % i for i in range(100)]
+    rotate = Command('rotate')
+    for i, line in enumerate(lines):
+        channel.put_nowait(Blink('data'))
+        channel.put_nowait(Blink('data', frequency=i))
+        channel.put_nowait(line)
+        if i == 50:
+            channel.put_nowait(rotate)
+    start = Blink('usb', priority=1, continuous=True)
+    channel.put_nowait(start)
+
+    # Data (and commands, in order) are delivered before any indicator
+    items = _drain(channel)
+    assert lines[:51] + [rotate] + lines[51:] == items[:101]
+    blinks = items[101:]
+    assert [start] == blinks[:1]
+    assert 4 == len(blinks[1:])
+
+    stats = channel.stats()
+    assert 101 == stats['data']['received']
+    assert 0 == stats['data']['dropped']
+    assert 99 == stats['indicator']['coalesced']
+    assert 201 - 99 - 5 == stats['indicator']['dropped']
+    assert 5 == stats['indicator']['high_water']
+    channel.join()
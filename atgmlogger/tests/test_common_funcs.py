@@ -41,6 +41,34 @@ def test_decode():
     assert decoded_str == res
 
 
+def test_sanitizer_policies():
+    from atgmlogger.sanitize import Sanitizer
+
+    line = b'\xff\x01$UW,81251,2489\r\n'
+    strip = Sanitizer(policy='strip')
+    assert '$UW,81251,2489' == strip.decode(line)
+    assert '$UW,81251,2489' == strip.decode(b'$UW,81251,2489\r\n')
+    assert 2 == strip.lines
+    assert 1 == strip.stripped
+    assert 2 == strip.illegal
+
+    replace = Sanitizer(policy='replace')
+    assert '??$UW,81251,2489' == replace.decode(line)
+    assert 1 == replace.replaced
+
+    reject = Sanitizer(policy='reject')
+    assert reject.decode(line) is None
+    assert 1 == reject.rejected
+
+    latin = Sanitizer(encoding='latin-1')
+    assert '\xb0C' == latin.decode(b'\xb0C\n')
+
+    with pytest.raises(ValueError):
+        Sanitizer(policy='ignore')
+    with pytest.raises(LookupError):
+        Sanitizer(encoding='not-an-encoding')
+
+
 def test_convert_gps_time():
     gpsweek = 1984
     gpssec = 596080
@@ -83,6 +111,23 @@ def test_timestamp_from_data():
     assert res is None
 
 
+def test_timesync_encoding(monkeypatch):
+    import queue
+    from atgmlogger.dispatcher import AppContext
+    from atgmlogger.plugins import timesync
+
+    synced = []
+    monkeypatch.setattr(timesync, 'set_system_time', synced.append)
+    data = '$UW,81251,2489,4779,4807953,307,874,201,-8919,7232,211,977,' \
+           '266,4897355,0.000000,0.000000,0.0000,0.0000,20990115203005'
+    # Bytes lines are decoded with the serial encoding of the context
+    context = AppContext(queue.Queue(), encoding='utf-16-le')
+    timesync.TimeSyncDaemon(context=context,
+                            data=data.encode('utf-16-le')).run()
+    expected = datetime.datetime(2099, 1, 15, 20, 30, 5).timestamp()
+    assert [expected] == synced
+
+
 @pytest.mark.skip("Broken due to refactoring of parse_args into __main__.py")
 def test_parse_args():
     from atgmlogger.runconfig import rcParams
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import os
+import bz2
+import gzip
+import lzma
+from pathlib import Path
+
+import pytest
+
+from atgmlogger.compression import CompressingWriter, read_compressed
+from atgmlogger.logger import DataLogger
+
+OPENERS = {'gzip': gzip.open, 'bz2': bz2.open, 'lzma': lzma.open}
+
+
+class MockAppContext:
+    def blink(self, *args, **kwargs):
+        pass
+
+
+def _line(i):
+    return b'$UW,81242,-1948,557,4807924,307,872,204,6978,7541,%d\n' % i
+
+
+@pytest.fixture
+def path(tmpdir):
+    return Path(str(tmpdir)).joinpath('gravdata.dat')
+
+
+@pytest.mark.parametrize('method', ['gzip', 'bz2', 'lzma'])
+def test_compressing_writer(path, method):
+    writer = CompressingWriter(path, method=method, flush_lines=100)
+    data = b''.join(_line(i) for i in range(1000))
+    for i in range(1000):
+        writer.write(_line(i))
+    writer.close()
+
+    assert writer.path.name.startswith('gravdata.dat.')
+    assert data == read_compressed(writer.path)
+    # The file is readable by the standard library
+    with OPENERS[method](str(writer.path), 'rb') as fd:
+        assert data == fd.read()
+    stats = writer.stats()
+    assert 10 == stats['flushes']
+    assert stats['ratio'] > 2
+
+
+@pytest.mark.parametrize('method', ['gzip', 'bz2', 'lzma'])
+def test_read_after_crash(path, method):
+    writer = CompressingWriter(path, method=method, flush_lines=10)
+    for i in range(25):
+        writer.write(_line(i))
+    # Crash with the last block uncommitted
+    os.close(writer._fd)
+    writer._fd = None
+    assert b''.join(_line(i) for i in range(20)) == \
+        read_compressed(writer.path)
+
+    # A torn flush block
+    size = writer.path.stat().st_size
+    with writer.path.open('r+b') as fd:
+        fd.truncate(size - 3)
+    data = read_compressed(writer.path)
+    assert data.endswith(b'\n')
+    assert b''.join(_line(i) for i in range(20)).startswith(data)
+
+
+def test_compressed_logger(path):
+    logger = DataLogger()
+    logger.set_context(MockAppContext())
+    logger.configure(logfile=path, compression={'method': 'gzip'},
+                     flush_lines=50)
+    lines = ['$UW,81242,-1948,557,4807924,%d' % i for i in range(500)]
+    logger.start()
+    for line in lines:
+        logger.put(line)
+    logger.exit(join=True)
+
+    assert not path.exists()
+    data = read_compressed(path.with_name('gravdata.dat.gz')).decode()
+    assert lines == data.splitlines()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+
+import pytest
+
+from atgmlogger import cpusched
+from atgmlogger.isolation import isolated
+from atgmlogger.logger import DataLogger
+from atgmlogger.runconfig import rcParams
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'sched_setaffinity'),
+                                reason="sched_setaffinity is unavailable")
+CPU = min(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') \
+    else 0
+
+
+def _in_thread(func):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(func()))
+    thread.start()
+    thread.join()
+    return result
+
+
+def test_thread_names():
+    assert ['datalogger', 'logger', 'plugins'] == \
+        cpusched.thread_names(DataLogger, 'plugins')
+    assert ['datalogger', 'logger', 'plugins'] == \
+        cpusched.thread_names(isolated(DataLogger), 'plugins')
+
+
+def test_apply_policy():
+    config = {'listener': {'cpus': [CPU], 'policy': 'batch', 'nice': 1},
+              'plugins': {'cpus': [CPU]}}
+
+    def apply():
+        applied = cpusched.apply_policy(['listener', 'plugins'],
+                                        config=config)
+        return dict(applied=applied, cpus=os.sched_getaffinity(0),
+                    policy=os.sched_getscheduler(0))
+
+    result = _in_thread(apply)
+    assert {'cpus': [CPU], 'policy': 'batch', 'priority': 0,
+            'nice': 1} == result['applied']
+    assert {CPU} == result['cpus']
+    assert os.SCHED_BATCH == result['policy']
+    # Only the calling thread is affected
+    assert os.SCHED_OTHER == os.sched_getscheduler(0)
+    assert {} == cpusched.apply_policy('dispatcher', config=config)
+
+
+def test_apply_policy_fallback():
+    config = {'listener': {'cpus': [1 << 16], 'policy': 'bogus',
+                           'nice': 1}}
+    result = _in_thread(lambda: cpusched.apply_policy('listener',
+                                                      config=config))
+    # Settings which cannot be applied are skipped
+    assert {'nice': 1} == result
+
+
+def test_policy_restored():
+    config = {'daemons': {'cpus': [CPU]}}
+
+    def run():
+        before = os.sched_getaffinity(0)
+        with cpusched.policy(['usb', 'daemons'], config=config):
+            during = os.sched_getaffinity(0)
+        return dict(before=before, during=during,
+                    after=os.sched_getaffinity(0))
+
+    result = _in_thread(run)
+    assert {CPU} == result['during']
+    assert result['before'] == result['after']
+
+
+def test_daemon_policy():
+    from atgmlogger.dispatcher import Dispatcher
+    from atgmlogger.plugins import PluginDaemon
+    ran = threading.Event()
+    result = {}
+
+    class PinnedDaemon(PluginDaemon):
+        @classmethod
+        def condition(cls, item=None):
+            return True
+
+        def run(self):
+            result['cpus'] = os.sched_getaffinity(0)
+            result['thread'] = threading.current_thread().name
+            ran.set()
+
+    rcParams['scheduling'] = {'pinneddaemon': {'cpus': [CPU]}}
+    dispatcher = Dispatcher(private_registry=True)
+    try:
+        dispatcher._start_daemon(PinnedDaemon, None)
+        assert ran.wait(2)
+    finally:
+        dispatcher._workers.shutdown(wait=True, timeout=1)
+        del rcParams.config['scheduling']
+    # Run on a dedicated worker, which applied the policy when it started
+    assert {CPU} == result['cpus']
+    assert 'DaemonWorker-pinneddaemon' == result['thread']
+
+
+def test_plugin_policy():
+    from ._mock_plugins import BasicModule
+    rcParams['scheduling'] = {'basicmodule': {'cpus': [CPU]}}
+    try:
+        plugin = BasicModule()
+        plugin.start()
+        try:
+            if getattr(plugin, 'native_id', None) is None:
+                pytest.skip("Thread native ids are unavailable")
+            assert {CPU} == os.sched_getaffinity(plugin.native_id)
+        finally:
+            plugin.exit()
+    finally:
+        del rcParams.config['scheduling']
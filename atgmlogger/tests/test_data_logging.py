@@ -1,13 +1,23 @@
 # -*- coding: utf-8 -*-
 
+import os
 from pathlib import Path
 
-from atgmlogger.logger import DataLogger
+from atgmlogger.dispatcher import Batch
+from atgmlogger.logger import DataLogger, read_timestamps
 
 LINE = "$UW,81242,-1948,557,4807924,307,872,204,6978,7541,-70,305,266," \
        "4903912,0.000000,0.000000,0.0000,0.0000,{idx}"
 
 
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
 class MockAppContext:
     def blink(self, *args, **kwargs):
         pass
@@ -40,3 +50,169 @@ def test_simple_logger(tmpdir):
     with log_file.open('r') as fd:
         for i, line in enumerate(fd):
             assert accumulator[i] == line.strip()
+
+
+def test_batch_logger(tmpdir):
+    log_file = Path(str(tmpdir.mkdir('logs'))).joinpath('gravdata.dat')
+
+    logger = DataLogger()
+    logger.set_context(MockAppContext())
+    logger.configure(logfile=log_file)
+
+    accumulator = [LINE.format(idx=i) for i in range(1000)]
+    logger.start()
+    for i in range(0, 1000, 8):
+        logger.put_batch(Batch(accumulator[i:i + 8]))
+    logger.exit(join=True)
+
+    with log_file.open('r') as fd:
+        assert accumulator == [line.strip() for line in fd]
+
+
+def test_binary_logger(tmpdir):
+    log_file = Path(str(tmpdir.mkdir('logs'))).joinpath('gravdata.dat')
+
+    logger = DataLogger()
+    logger.set_context(MockAppContext())
+    logger.configure(logfile=log_file, binary=True)
+
+    accumulator = [LINE.format(idx=i) for i in range(100)]
+    logger.start()
+    logger.put(accumulator[0].encode())
+    logger.put(accumulator[1])
+    logger.put_batch(Batch((line.encode() for line in accumulator[2:]),
+                           item_type=bytes))
+    logger.exit(join=True)
+
+    with log_file.open('r') as fd:
+        assert accumulator == [line.strip() for line in fd]
+
+
+def test_timestamp_logger(tmpdir):
+    log_file = Path(str(tmpdir.mkdir('logs'))).joinpath('gravdata.dat')
+
+    logger = DataLogger()
+    logger.set_context(MockAppContext())
+    logger.configure(logfile=log_file, timestamps='sidecar')
+
+    logger.start()
+    logger.put_batch(Batch([LINE.format(idx=0), LINE.format(idx=1)],
+                           rx_mono_ns=100, rx_wall_ns=1000))
+    logger.put(LINE.format(idx=2))
+    logger.put_batch(Batch([LINE.format(idx=3)], rx_mono_ns=200,
+                           rx_wall_ns=2000))
+    logger.exit(join=True)
+
+    with log_file.open('r') as fd:
+        assert 4 == len(fd.readlines())
+    stamps = list(read_timestamps(logger.tsfile))
+    assert [(1000, 100), (1000, 100), (0, 0), (2000, 200)] == stamps
+
+
+def test_timestamp_prefix(tmpdir):
+    log_file = Path(str(tmpdir.mkdir('logs'))).joinpath('gravdata.dat')
+
+    logger = DataLogger()
+    logger.set_context(MockAppContext())
+    logger.configure(logfile=log_file, timestamps='prefix')
+    logger.start()
+    logger.put_batch(Batch([LINE.format(idx=0)], rx_mono_ns=100,
+                           rx_wall_ns=1000))
+    logger.exit(join=True)
+
+    with log_file.open('r') as fd:
+        assert '1000,100,' + LINE.format(idx=0) == fd.read().strip()
+
+
+def test_flush_lines(tmpdir):
+    log_file = Path(str(tmpdir.mkdir('logs'))).joinpath('gravdata.dat')
+
+    clock = FakeClock()
+    logger = DataLogger()
+    logger.set_context(MockAppContext())
+    logger.configure(logfile=log_file, flush_lines=10, flush_interval=0.25)
+    logger.clock = clock
+    logger._get_fhandle()
+    for i in range(25):
+        logger._handle(LINE.format(idx=i))
+    # Two flushes of 10 lines, the last 5 lines are held until the interval
+    assert 2 == logger.flushes
+    assert 20 == len(log_file.read_text().splitlines())
+    assert 0.25 == logger._flush_timeout()
+
+    clock.now += 0.125
+    logger._hdl.service()
+    assert 2 == logger.flushes
+    clock.now += 0.125
+    assert 0 == logger._flush_timeout()
+    logger._hdl.service()
+    assert 3 == logger.flushes
+    assert 25 == len(log_file.read_text().splitlines())
+    logger.close()
+
+
+def test_timestamp_sidecar_rotate(tmpdir):
+    log_file = Path(str(tmpdir.mkdir('logs'))).joinpath('gravdata.dat')
+
+    logger = DataLogger()
+    logger.set_context(MockAppContext())
+    logger.configure(logfile=log_file, timestamps='sidecar')
+    logger._get_fhandle()
+    logger._write(Batch([LINE.format(idx=0)], rx_mono_ns=100,
+                        rx_wall_ns=1000))
+    # Rotated as logrotate does, by renaming the file before the signal
+    rotated = log_file.with_name('gravdata.dat.1')
+    os.rename(str(log_file), str(rotated))
+    logger.log_rotate()
+    logger._write(Batch([LINE.format(idx=1)], rx_mono_ns=200,
+                        rx_wall_ns=2000))
+    logger.close()
+
+    assert [(1000, 100)] == list(read_timestamps(str(rotated) + '.ts'))
+    assert [(2000, 200)] == list(read_timestamps(logger.tsfile))
+    assert LINE.format(idx=1) == log_file.read_text().strip()
+
+    # A file which was not renamed keeps the timestamps in a suffixed file
+    logger._get_fhandle()
+    logger.log_rotate()
+    logger.close()
+    suffixed = [path for path in log_file.parent.iterdir()
+                if path.name.startswith('gravdata.dat.ts.')]
+    assert 1 == len(suffixed)
+
+
+def test_timestamps_mode():
+    import pytest
+    from atgmlogger.atgmlogger import _get_timestamps
+    from atgmlogger.runconfig import rcParams
+    try:
+        rcParams['logging.timestamps'] = 'sidecar'
+        assert 'sidecar' == _get_timestamps()
+        rcParams['logging.timestamps'] = 'sidcar'
+        with pytest.raises(ValueError):
+            _get_timestamps()
+        rcParams['logging.timestamps'] = False
+        assert _get_timestamps() is None
+    finally:
+        rcParams.config['logging'].pop('timestamps', None)
+
+
+def test_logger_options(tmpdir):
+    from atgmlogger.atgmlogger import _get_dispatcher
+    from atgmlogger.runconfig import rcParams
+    saved = rcParams['logging']
+    try:
+        rcParams['logging'] = {'logdir': str(tmpdir), 'flush_lines': 10,
+                               'sync_interval': 5.0,
+                               'segments': {'size': 1024 ** 2},
+                               'compression': 'gzip'}
+        dispatcher = _get_dispatcher(plugins={}, params={'port': 'loop://'},
+                                     private_registry=True)
+    finally:
+        rcParams['logging'] = saved
+    params = dispatcher._params[DataLogger]
+    assert 10 == params['flush_lines']
+    assert 5.0 == params['sync_interval']
+    assert {'size': 1024 ** 2} == params['segments']
+    assert 'gzip' == params['compression']
+    assert 'flush_interval' not in params
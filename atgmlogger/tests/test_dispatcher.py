@@ -70,6 +70,42 @@ def test_dispatch_selective_load(dispatcher):
     assert cm is None
 
 
+def test_dispatch_batch(dispatcher):
+    from atgmlogger.dispatcher import Batch
+    from ._mock_plugins import BasicModule, BatchModule, SimplePacket
+    dispatcher.register(BasicModule)
+    dispatcher.register(BatchModule)
+    dispatcher.start()
+    for i in range(0, Q_LEN, 10):
+        dispatcher.put(Batch((SimplePacket(j) for j in range(i, i + 10)),
+                             item_type=SimplePacket))
+    dispatcher.message_queue.join()
+    dispatcher.exit(join=True)
+
+    bm = dispatcher.get_instance_of(BasicModule)
+    batch_mod = dispatcher.get_instance_of(BatchModule)
+    # Non-batched plugins receive the items individually
+    assert list(range(Q_LEN)) == bm.accumulator
+    assert list(range(Q_LEN)) == batch_mod.accumulator
+    assert Q_LEN // 10 == batch_mod.batches
+
+
+def test_dispatch_bytes_to_text(dispatcher):
+    from atgmlogger.dispatcher import Batch
+    from ._mock_plugins import TextModule
+    dispatcher.register(TextModule)
+    dispatcher.start()
+    dispatcher.put(b'$UW,81242,-1948')
+    dispatcher.put(Batch([b'line 1', b'line 2'], item_type=bytes))
+    dispatcher.put('text line')
+    dispatcher.message_queue.join()
+    dispatcher.exit(join=True)
+
+    tm = dispatcher.get_instance_of(TextModule)
+    assert ['$UW,81242,-1948', 'line 1', 'line 2', 'text line'] == \
+        tm.accumulator
+
+
 def test_load_plugin(dispatcher):
     plugin = load_plugin('basic_plugin', path="%s.plugins" % __package__,
                          register=True)
@@ -124,3 +160,26 @@ def test_oneshot_plugin(dispatcher):
     #
     # dispatcher.exit(join=True)
     # assert not dispatcher.is_alive()
+
+
+def test_dispatcher_tickless(monkeypatch):
+    import time
+    from atgmlogger import dispatcher as dispatcher_mod
+    from atgmlogger.dispatcher import Dispatcher
+    from ._mock_plugins import BasicModule
+    monkeypatch.setattr(dispatcher_mod, 'POLL_INTV', 0.01)
+
+    disp = Dispatcher(private_registry=True)
+    disp.register(BasicModule)
+    disp.start()
+    time.sleep(0.2)
+    # No wakeups while idle
+    assert 0 == disp.stats()['wakeups']
+    disp.put("Line 1")
+    disp.message_queue.join()
+    assert 1 == disp.stats()['wakeups']
+
+    start = time.monotonic()
+    disp.exit(join=True)
+    assert not disp.is_alive()
+    assert time.monotonic() - start < 0.5
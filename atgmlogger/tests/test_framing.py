@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+from atgmlogger.atgmlogger import SerialListener
+from atgmlogger.framing import LineFramer
+
+LINE = b"$UW,81242,-1948,557,4807924,307,872,204,6978,7541,-70,305,266," \
+       b"4903912,0.000000,0.000000,0.0000,0.0000,00000000001646\r\n"
+
+
+def test_framer_multiple_lines():
+    framer = LineFramer(capacity=1024)
+    lines = framer.feed(LINE * 3 + LINE[:20])
+    assert [LINE] * 3 == lines
+    assert 20 == len(framer)
+
+    lines = framer.feed(LINE[20:])
+    assert [LINE] == lines
+    assert 0 == len(framer)
+    assert 4 == framer.frames
+
+
+def test_framer_split_chunks():
+    framer = LineFramer(capacity=256)
+    data = LINE * 10
+    lines = []
+    for i in range(0, len(data), 7):
+        lines.extend(framer.feed(data[i:i + 7]))
+    assert [LINE] * 10 == lines
+
+
+def test_framer_chunk_larger_than_capacity():
+    framer = LineFramer(capacity=len(LINE) + 1)
+    lines = framer.feed(LINE * 50)
+    assert [LINE] * 50 == lines
+    assert 0 == framer.overflows
+
+
+def test_framer_overflow():
+    framer = LineFramer(capacity=64)
+    for _ in range(10):
+        assert [] == framer.feed(b'\xff' * 50)
+    assert len(framer) <= framer.capacity
+    assert framer.overflows > 0
+
+    # Garbage up to the next delimiter is discarded, then framing resumes
+    lines = framer.feed(b'garbage\nline 1\nline 2\n')
+    assert [b'line 1\n', b'line 2\n'] == lines
+    assert 500 + len(b'garbage\n') == framer.discarded
+
+
+def test_framer_multibyte_delimiter():
+    framer = LineFramer(capacity=64, delimiter=b'\r\n')
+    assert [] == framer.feed(b'abc\r')
+    assert [b'abc\r\n', b'def\r\n'] == framer.feed(b'\ndef\r\n')
+
+
+def test_listener_readline(handle):
+    listener = SerialListener(handle)
+    handle.write(LINE * 5)
+    for _ in range(5):
+        assert LINE == listener.readline()
+
+
+def _nmea(body):
+    from atgmlogger.framing import _xor8
+    return b'$' + body + b'*' + ('%02X' % _xor8(body)).encode()
+
+
+def test_fixed_length_framer():
+    from atgmlogger.framing import get_framer
+    # str parameters are encoded as latin-1
+    framer = get_framer({'type': 'fixed', 'size': 8, 'sync': '\u00aaU'})
+    assert not framer.text
+    record = b'\xaa\x55' + bytes(range(6))
+    frames = framer.feed(record * 3 + b'\x00\x01' + record[:5])
+    assert [record] * 3 == frames
+    assert [record] == framer.feed(record[5:])
+    assert 1 == framer.errors
+    assert 2 == framer.discarded
+
+
+def test_delimited_nmea_framer():
+    from atgmlogger.framing import get_framer
+    framer = get_framer({'type': 'delimited', 'checksum': 'nmea'})
+    good = _nmea(b'GPGGA,123519,4807.038,N,01131.000,E')
+    bad = good[:-2] + b'00'
+    data = b'noise' + good + b'\r\n' + bad + b'\r\n' + good + b'\r\n'
+    frames = []
+    for i in range(0, len(data), 5):
+        frames.extend(framer.feed(data[i:i + 5]))
+    assert [good, good] == frames
+    assert 1 == framer.errors
+
+
+def test_delimited_crc_framer():
+    import binascii
+    from atgmlogger.framing import DelimitedFramer
+    framer = DelimitedFramer(start=b'\x02', end=b'\x03', checksum='crc16')
+    assert not framer.text
+    payload = bytes(range(4, 40))
+    crc = binascii.crc_hqx(payload, 0xFFFF).to_bytes(2, 'big')
+    frame = b'\x02' + payload + b'\x03' + crc
+    corrupt = b'\x02' + payload[::-1] + b'\x03' + crc
+    assert [frame, frame] == framer.feed(frame + corrupt + frame)
+    assert 1 == framer.errors
+
+
+def test_get_framer_invalid():
+    import pytest
+    from atgmlogger.framing import get_framer
+    with pytest.raises(ValueError):
+        get_framer('unknown')
+    with pytest.raises(ValueError):
+        get_framer({'type': 'fixed'})
+    with pytest.raises(ValueError):
+        get_framer({'type': 'fixed', 'size': 2, 'sync': b'\xaa\x55\x01'})
+
+
+def test_framer_text():
+    from atgmlogger.framing import framer_text, get_framer
+    specs = [None, 'newline', {'type': 'fixed', 'size': 8},
+             {'type': 'delimited'},
+             {'type': 'delimited', 'checksum': 'crc16'},
+             {'type': 'delimited', 'checksum': 'CRC16', 'text': True}]
+    for spec in specs:
+        assert get_framer(spec).text == framer_text(spec)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import queue
+from pathlib import Path
+
+import pytest
+
+from atgmlogger.dispatcher import AppContext, Blink
+from atgmlogger.isolation import isolated, IsolatedPlugin
+from atgmlogger.plugins import PluginInterface, PluginDaemon
+
+pytest.importorskip('termios')
+
+
+class FileModule(PluginInterface):
+    options = ['path']
+
+    @staticmethod
+    def consumer_type():
+        return {str}
+
+    def run(self):
+        with open(self.path, 'a') as fd:
+            while not self.exiting:
+                item = self.get()
+                if item is None:
+                    self.task_done()
+                    break
+                if item == 'crash':
+                    os._exit(1)
+                fd.write('%d %s\n' % (os.getpid(), item))
+                fd.flush()
+                self.context.blink(led='data')
+                self.task_done()
+
+
+class PidDaemon(PluginDaemon):
+    options = ['path']
+    path = None
+
+    @classmethod
+    def condition(cls, item=None):
+        return True
+
+    def run(self):
+        Path(self.path).write_text(str(os.getpid()))
+        self.context.blink(led='usb')
+
+
+def _read(path):
+    return [line.split(' ', 1) for line in
+            Path(path).read_text().splitlines()]
+
+
+def test_isolated_plugin(tmpdir):
+    path = str(Path(str(tmpdir)).joinpath('out.txt'))
+    klass = isolated(FileModule)
+    assert issubclass(klass, IsolatedPlugin)
+    assert {str} == klass.consumer_type()
+
+    collector = queue.Queue()
+    plugin = klass()
+    plugin.set_context(AppContext(collector))
+    plugin.configure(path=path)
+    plugin.start()
+    for i in range(100):
+        plugin.put('line %d' % i)
+    plugin.exit(join=True)
+    assert not plugin.is_alive()
+
+    lines = _read(path)
+    assert ['line %d' % i for i in range(100)] == [line for _, line in lines]
+    assert {str(os.getpid())} != {pid for pid, _ in lines}
+    # Context items are relayed to the parent
+    deadline = time.monotonic() + 2
+    while collector.qsize() < 100 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert 100 == collector.qsize()
+    assert isinstance(collector.get_nowait(), Blink)
+
+
+def test_isolated_plugin_restart(tmpdir):
+    path = str(Path(str(tmpdir)).joinpath('out.txt'))
+    klass = isolated(FileModule)
+    klass.min_backoff = 0
+    plugin = klass()
+    plugin.set_context(AppContext(queue.Queue()))
+    plugin.configure(path=path)
+    plugin.start()
+    try:
+        plugin.put('before')
+        plugin.put('crash')
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            process = plugin.process
+            if process is not None and not process.is_alive():
+                break
+            time.sleep(0.01)
+        plugin.put('after')
+    finally:
+        plugin.exit(join=True)
+
+    lines = _read(path)
+    assert ['before', 'after'] == [line for _, line in lines]
+    assert lines[0][0] != lines[1][0]
+    assert 1 == plugin.stats()['restarts']
+
+
+def test_isolated_daemon(tmpdir):
+    path = Path(str(tmpdir)).joinpath('pid.txt')
+    klass = isolated(PidDaemon)
+    assert issubclass(klass, PidDaemon)
+    klass.configure(path=str(path))
+    collector = queue.Queue()
+    klass(context=AppContext(collector)).run()
+    assert str(os.getpid()) != path.read_text()
+    assert 'usb' == collector.get(timeout=1).led
+
+
+def test_isolated_daemon_subclass(tmpdir):
+    path = Path(str(tmpdir)).joinpath('pid.txt')
+    # Subclasses of the isolated class run the wrapped daemon's run method
+    klass = type('Subclass', (isolated(PidDaemon), ), {})
+    klass.configure(path=str(path))
+    collector = queue.Queue()
+    klass(context=AppContext(collector)).run()
+    assert str(os.getpid()) != path.read_text()
+    assert 'usb' == collector.get(timeout=1).led
+
+
+def test_isolate_local_class():
+    # The class is pickled to the child process
+    with pytest.raises(TypeError):
+        isolated(type('LocalModule', (FileModule, ), {}))
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import select
+import threading
+
+import pytest
+
+from atgmlogger.mountwatch import MountInfo, MountWatcher, parse_mountinfo
+
+pytest.importorskip('termios')
+
+MOUNTINFO = "22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw\n" \
+            "25 22 0:5 / /dev rw,nosuid shared:2 - devtmpfs udev rw\n"
+USB = "40 22 8:17 / /media/removable rw,relatime shared:20 - vfat " \
+      "/dev/sdb1 rw\n"
+
+
+class FakeMountInfo:
+    """Mount table source signalled through a pipe"""
+    events = select.POLLIN
+    table = MOUNTINFO
+    pipe = None
+
+    def __init__(self):
+        self._r, self._w = os.pipe()
+        FakeMountInfo.pipe = self
+
+    def change(self, table):
+        FakeMountInfo.table = table
+        os.write(self._w, b'\0')
+
+    def fileno(self):
+        return self._r
+
+    def mounts(self):
+        if select.select([self._r], [], [], 0)[0]:
+            os.read(self._r, 64)
+        return parse_mountinfo(self.table)
+
+    def close(self):
+        os.close(self._r)
+        os.close(self._w)
+
+
+def _wait_for(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return predicate()
+
+
+def test_parse_mountinfo():
+    text = MOUNTINFO + r"41 22 8:33 / /media/my\040disk rw - vfat /dev/sdc1 rw"
+    assert {'/', '/dev', '/media/my disk'} == parse_mountinfo(text)
+
+
+def test_mount_watcher():
+    FakeMountInfo.table = MOUNTINFO
+    fired = []
+    lock = threading.Lock()
+
+    def fire(event, data):
+        with lock:
+            fired.append((event, data))
+
+    watcher = MountWatcher('/media/removable/', source=FakeMountInfo)
+    watcher.start(fire)
+    try:
+        source = FakeMountInfo.pipe
+        source.change(MOUNTINFO + "26 22 0:6 / /run rw - tmpfs tmpfs rw\n")
+        assert _wait_for(lambda: watcher.changes == 1)
+        assert [] == fired
+
+        source.change(MOUNTINFO + USB)
+        assert _wait_for(lambda: fired)
+        assert [('mount', '/media/removable')] == fired
+
+        # Unrelated changes while mounted do not fire again
+        source.change(MOUNTINFO + USB + "26 22 0:6 / /run rw - tmpfs "
+                                        "tmpfs rw\n")
+        assert _wait_for(lambda: watcher.changes == 3)
+        source.change(MOUNTINFO)
+        assert _wait_for(lambda: not watcher.mounted)
+        source.change(MOUNTINFO + USB)
+        assert _wait_for(lambda: len(fired) == 2)
+    finally:
+        watcher.stop()
+
+
+def test_mount_watcher_already_mounted():
+    FakeMountInfo.table = MOUNTINFO + USB
+    fired = []
+    watcher = MountWatcher('/media/removable', event='usb',
+                           source=FakeMountInfo)
+    watcher.start(lambda *args: fired.append(args))
+    watcher.stop()
+    assert [('usb', '/media/removable')] == fired
+
+
+@pytest.mark.skipif(not MountInfo.available(),
+                    reason="/proc/self/mountinfo is not available")
+def test_mountinfo():
+    source = MountInfo()
+    try:
+        assert '/' in source.mounts()
+        assert source.events & select.POLLPRI
+    finally:
+        source.close()
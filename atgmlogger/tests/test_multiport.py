@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import threading
+import tty
+
+import pytest
+import serial
+
+from atgmlogger.atgmlogger import SerialListener, SerialMultiplexer
+from atgmlogger.dispatcher import Dispatcher
+
+pytest.importorskip('termios')
+LINE = b"$UW,81242,-1948,557,4807924,307,872,204,6978,7541,-70,305,266," \
+       b"4903912,0.000000,0.000000,0.0000,0.0000,00000000001646\r\n"
+GPS = b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n"
+
+
+@pytest.fixture
+def ports():
+    pairs = []
+    for _ in range(2):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        pairs.append((master, slave,
+                      serial.Serial(os.ttyname(slave), baudrate=57600)))
+    yield pairs
+    for master, slave, hdl in pairs:
+        hdl.close()
+        for fd in (master, slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def test_private_registry():
+    from ._mock_plugins import BasicModule, ComplexModule
+    first = Dispatcher(private_registry=True)
+    second = Dispatcher(private_registry=True)
+    first.register(BasicModule)
+    second.register(ComplexModule)
+
+    assert BasicModule in first
+    assert ComplexModule not in first
+    assert ComplexModule in second
+    assert BasicModule not in Dispatcher._listeners
+    assert ComplexModule not in Dispatcher._listeners
+
+
+def test_multiplexer(ports):
+    collectors = [queue.Queue(), queue.Queue()]
+    listeners = [SerialListener(hdl, collector=collector)
+                 for (_, _, hdl), collector in zip(ports, collectors)]
+    mux = SerialMultiplexer(listeners)
+    thread = threading.Thread(target=mux.listen)
+    thread.start()
+
+    os.write(ports[0][0], LINE * 3)
+    os.write(ports[1][0], GPS[:20])
+    os.write(ports[1][0], GPS[20:] + GPS)
+
+    try:
+        for _ in range(3):
+            assert LINE.decode().strip() == collectors[0].get(timeout=2)
+        for _ in range(2):
+            assert GPS.decode().strip() == collectors[1].get(timeout=2)
+    finally:
+        mux.exit()
+        thread.join(timeout=2)
+    assert not thread.is_alive()
+    assert collectors[0].get(timeout=1) is None
+    assert collectors[1].get(timeout=1) is None
+
+
+def test_multiport_ignores_process(ports, tmpdir):
+    from atgmlogger.atgmlogger import _get_multiport
+    from atgmlogger.runconfig import rcParams
+    config = rcParams.config
+    saved = {key: config.get(key) for key in ('serial', 'logging', 'ports')}
+    try:
+        rcParams['serial'] = {'baudrate': 57600, 'process': True}
+        rcParams['logging'] = {'logdir': str(tmpdir)}
+        rcParams['ports'] = [{'name': 'port%d' % i, 'port': hdl.port,
+                              'plugins': {}}
+                             for i, (_, _, hdl) in enumerate(ports)]
+        mux, dispatchers = _get_multiport()
+        try:
+            assert all(type(listener) is SerialListener
+                       for listener in mux.listeners)
+        finally:
+            for dispatcher in dispatchers:
+                dispatcher.detach_all()
+            for listener in mux.listeners:
+                listener.close()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                config.pop(key, None)
+            else:
+                config[key] = value
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+import tty
+
+import pytest
+import serial
+
+from atgmlogger.readers import PollReader, InWaitingReader, get_reader
+
+termios = pytest.importorskip('termios')
+LINE = b"$UW,81242,-1948,557,4807924,307,872,204,6978,7541,-70,305,266," \
+       b"4903912,0.000000,0.000000,0.0000,0.0000,00000000001646\r\n"
+
+
+@pytest.fixture
+def pty_pair():
+    master, slave = os.openpty()
+    # Configure the slave as pyserial would configure a serial port
+    tty.setraw(slave)
+    yield master, slave
+    for fd in (master, slave):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+def test_poll_reader_burst(pty_pair):
+    master, slave = pty_pair
+    reader = PollReader(slave, read_size=4096, read_gap=0.1)
+    attrs = termios.tcgetattr(slave)
+    assert not attrs[3] & termios.ICANON
+    assert 255 == attrs[6][termios.VMIN]
+
+    os.write(master, LINE * 5)
+    data = b''
+    while len(data) < len(LINE) * 5:
+        data += reader.read()
+    assert LINE * 5 == data
+    # The burst is returned in a few large reads rather than one wakeup per
+    # byte (the pty driver transfers at most 64 bytes per read call)
+    assert reader.reads <= len(data) // 64 + 1
+    reader.close()
+
+
+def test_poll_reader_wakeup(pty_pair):
+    master, slave = pty_pair
+    reader = PollReader(slave)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(reader.read()))
+    thread.start()
+    reader.wakeup()
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+    assert [b''] == result
+    reader.close()
+
+
+def test_get_reader_fallback(handle):
+    # loop:// handles have no file descriptor
+    reader = get_reader(handle, strategy='poll')
+    assert isinstance(reader, InWaitingReader)
+    handle.write(LINE)
+    data = b''
+    while len(data) < len(LINE):
+        data += reader.read()
+    assert LINE == data
+
+
+def test_poll_reader_serial_handle(pty_pair):
+    master, slave = pty_pair
+    # pyserial opens the port non-blocking, which disables VMIN/VTIME
+    hdl = serial.Serial(os.ttyname(slave), baudrate=57600)
+    reader = PollReader(hdl, read_size=4096, read_gap=0.1)
+    assert os.get_blocking(hdl.fileno())
+
+    def send():
+        for i in range(0, len(LINE), 4):
+            os.write(master, LINE[i:i + 4])
+            time.sleep(0.002)
+    thread = threading.Thread(target=send)
+    thread.start()
+    data = b''
+    while len(data) < len(LINE):
+        data += reader.read()
+    thread.join()
+    assert LINE == data
+    assert reader.reads <= 3
+
+    # The tuned read size updates VMIN
+    reader.read_size = 64
+    assert 64 == termios.tcgetattr(hdl.fileno())[6][termios.VMIN]
+    reader.close()
+    assert not os.get_blocking(hdl.fileno())
+    hdl.close()
+
+
+def test_poll_reader_vmin(pty_pair):
+    master, slave = pty_pair
+    # A short (60 byte) line, the pty driver transfers at most 64 bytes
+    line = LINE[:58] + b'\r\n'
+    reader = PollReader(slave, read_size=4096, read_gap=1.0, vmin=len(line))
+    assert len(line) == termios.tcgetattr(slave)[6][termios.VMIN]
+    os.write(master, line)
+    start = time.monotonic()
+    data = b''
+    while len(data) < len(line):
+        data += reader.read()
+    # A complete line does not wait for the inter-byte timeout
+    assert time.monotonic() - start < 0.5
+    assert line == data
+    reader.close()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from atgmlogger.dispatcher import Dispatcher, Batch
+from atgmlogger.plugins import PluginDaemon
+from atgmlogger.scheduler import TimerWheel, Scheduler, Periodic, Rate, Event
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_timer_wheel():
+    clock = FakeClock()
+    wheel = TimerWheel(resolution=0.1, slots=8, clock=clock)
+    fired = []
+    wheel.schedule(0.25, fired.append, 'a')
+    wheel.schedule(0.5, fired.append, 'b')
+    # Longer than a revolution of the wheel
+    wheel.schedule(2.0, fired.append, 'c')
+    cancelled = wheel.schedule(0.3, fired.append, 'x')
+    cancelled.cancel()
+    assert 4 == len(wheel)
+    assert pytest.approx(100.3) == wheel.next_deadline()
+
+    clock.now = 100.2
+    assert 0 == wheel.advance()
+    clock.now = 100.35
+    assert 1 == wheel.advance()
+    assert ['a'] == fired
+    clock.now = 101.0
+    wheel.advance()
+    assert ['a', 'b'] == fired
+    assert pytest.approx(102.0) == wheel.next_deadline()
+    clock.now = 110.0
+    wheel.advance()
+    assert ['a', 'b', 'c'] == fired
+    assert 0 == len(wheel)
+    assert wheel.next_deadline() is None
+
+
+def test_timer_wheel_rounding():
+    clock = FakeClock(0.0)
+    wheel = TimerWheel(resolution=0.05, clock=clock)
+    fired = []
+    # 43 * 0.05 / 0.05 rounds below 43
+    wheel.schedule(2.15, fired.append, 'a')
+    clock.now = wheel.next_deadline()
+    assert 1 == wheel.advance()
+
+    # A delay just past a tick boundary is rounded up, never down
+    clock.now = 1.0
+    wheel.schedule(0.5 + 1e-9, fired.append, 'b')
+    assert wheel.next_deadline() >= 1.5 + 1e-9
+    clock.now = wheel.next_deadline()
+    assert 1 == wheel.advance()
+    assert ['a', 'b'] == fired
+
+
+def test_scheduler_triggers():
+    clock = FakeClock()
+    scheduler = Scheduler(TimerWheel(resolution=0.1, clock=clock))
+    mounted = []
+    scheduler.add('rate', Rate(10))
+    scheduler.add('event', Event('mount'))
+    scheduler.add('periodic', Periodic(1.0, check=lambda: bool(mounted)))
+    with pytest.raises(TypeError):
+        scheduler.add('bad', object())
+
+    scheduler.count(9, 'line 9')
+    assert not scheduler.due()
+    assert [] == scheduler.poll()
+    scheduler.count(1, 'line 10')
+    assert scheduler.due()
+    assert [('rate', 'line 10')] == scheduler.poll()
+    scheduler.count(25, 'line 35')
+    assert [('rate', 'line 35')] == scheduler.poll()
+
+    scheduler.fire('mount', '/media/removable')
+    scheduler.fire('unknown')
+    assert [('event', '/media/removable')] == scheduler.poll()
+
+    # The check is evaluated from the timer, the trigger is rescheduled
+    # whether or not it passes
+    clock.now = 101.0
+    assert [] == scheduler.poll()
+    mounted.append(True)
+    clock.now = 102.0
+    assert scheduler.due()
+    assert [('periodic', 'line 35')] == scheduler.poll()
+    assert pytest.approx(103.0) == scheduler.next_deadline()
+
+
+class RateDaemon(PluginDaemon):
+    runs = []
+    checked = 0
+
+    @classmethod
+    def condition(cls, item=None):
+        cls.checked += 1
+        return False
+
+    @classmethod
+    def triggers(cls):
+        return [Rate(10), Event('sync')]
+
+    def run(self):
+        self.runs.append(self.data)
+
+
+def test_dispatcher_triggers():
+    dispatcher = Dispatcher(private_registry=True)
+    dispatcher.register(RateDaemon)
+    dispatcher.start()
+    try:
+        for i in range(15):
+            dispatcher.put("Line %d" % i)
+        deadline = time.monotonic() + 2
+        while not RateDaemon.runs and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # A trigger is skipped while the previous run is in flight
+        while dispatcher._workers.in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        dispatcher.put(Batch(["Line %d" % i for i in range(15, 25)]))
+        deadline = time.monotonic() + 2
+        while len(RateDaemon.runs) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert ["Line 9", "Line 24"] == RateDaemon.runs
+
+        dispatcher.fire('sync', 'now')
+        deadline = time.monotonic() + 2
+        while len(RateDaemon.runs) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert 'now' == RateDaemon.runs[-1]
+        while dispatcher._workers.in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert 3 == dispatcher.stats()['daemons']['RateDaemon']['runs']
+    finally:
+        dispatcher.exit(join=True)
+    # Daemons declaring triggers are not checked per item
+    assert 0 == RateDaemon.checked
+
+
+def test_rate_first():
+    scheduler = Scheduler(TimerWheel(clock=FakeClock()))
+    scheduler.add('rate', Rate(10, first=1))
+    scheduler.count(1, 'line 1')
+    assert [('rate', 'line 1')] == scheduler.poll()
+    scheduler.count(9, 'line 10')
+    assert [] == scheduler.poll()
+    scheduler.count(1, 'line 11')
+    assert [('rate', 'line 11')] == scheduler.poll()
+    with pytest.raises(ValueError):
+        Rate(10, first=0)
+
+
+def test_timesync_first_line():
+    from atgmlogger.plugins.timesync import TimeSyncDaemon
+    scheduler = Scheduler(TimerWheel(clock=FakeClock()))
+    for trigger in TimeSyncDaemon.triggers():
+        scheduler.add(TimeSyncDaemon, trigger)
+    # The clock is synchronized from the first data line
+    scheduler.count(1, 'line 1')
+    assert [(TimeSyncDaemon, 'line 1')] == scheduler.poll()
+    scheduler.count(TimeSyncDaemon.interval - 1, 'line 1000')
+    assert [] == scheduler.poll()
+    scheduler.count(1, 'line 1001')
+    assert [(TimeSyncDaemon, 'line 1001')] == scheduler.poll()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+import os
+from pathlib import Path
+
+import pytest
+
+from atgmlogger.logger import DataLogger
+from atgmlogger.segments import (SegmentWriter, read_segment, iter_segments,
+                                 segment_paths, HEADER_SIZE, SEG_HEADER,
+                                 SEG_MAGIC, SEG_VERSION)
+
+
+class MockAppContext:
+    def blink(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def path(tmpdir):
+    return Path(str(tmpdir)).joinpath('gravdata.dat')
+
+
+def _line(i):
+    return b'$UW,81242,-1948,557,4807924,%d\n' % i
+
+
+def _crash(writer):
+    """Close the segment without sealing it, as after a power cut"""
+    os.close(writer._fd)
+    writer._fd = None
+
+
+def test_segment_store(path):
+    writer = SegmentWriter(path, segment_size=1024, flush_lines=4)
+    segment = writer.segment
+    assert path.name + '.000001.seg' == segment.name
+    # Preallocated
+    assert HEADER_SIZE + 1024 == segment.stat().st_size
+    data = b''.join(_line(i) for i in range(100))
+    for i in range(100):
+        writer.write(_line(i))
+    writer.close()
+
+    assert 1 < len(segment_paths(path))
+    assert data == b''.join(iter_segments(path))
+    # Sealed segments are truncated to their data
+    assert HEADER_SIZE + len(read_segment(segment)) == segment.stat().st_size
+    assert writer.stats()['segments_created'] == len(segment_paths(path))
+
+
+def test_commit_larger_than_segment(path):
+    writer = SegmentWriter(path, segment_size=256, flush_bytes=4096)
+    data = b''.join(_line(i) for i in range(40))
+    for i in range(40):
+        writer.write(_line(i))
+    writer.close()
+
+    segments = [read_segment(segment) for _, segment in segment_paths(path)]
+    assert data == b''.join(segments)
+    for segment in segments:
+        # Split at line boundaries, within the preallocated size
+        assert len(segment) <= 256
+        assert segment.endswith(b'\n')
+    for _, segment in segment_paths(path):
+        assert segment.stat().st_size <= HEADER_SIZE + 256
+
+    # Without a terminator the commit is split at the segment size
+    binary = path.with_name('binary.dat')
+    writer = SegmentWriter(binary, segment_size=100, terminator=b'')
+    writer.write(bytes(range(250)))
+    writer.close()
+    assert [100, 100, 50] == [len(read_segment(segment))
+                              for _, segment in segment_paths(binary)]
+
+
+def test_reopen_seals_segment(path):
+    writer = SegmentWriter(path, flush_lines=1)
+    writer.write(_line(0))
+    writer.reopen()
+    writer.write(_line(1))
+    writer.close()
+    assert [_line(0), _line(1)] == list(iter_segments(path))
+
+    # A sealed segment is not continued
+    writer = SegmentWriter(path)
+    assert 3 == writer.sequence
+    writer.close()
+
+
+def test_recover_torn_tail(path):
+    writer = SegmentWriter(path, flush_lines=1)
+    for i in range(10):
+        writer.write(_line(i))
+    segment, committed = writer.segment, writer.committed
+    # A complete line and a torn line were written, but not recorded in the
+    # header
+    os.pwrite(writer._fd, _line(10) + _line(11)[:12], HEADER_SIZE + committed)
+    _crash(writer)
+
+    writer = SegmentWriter(path, flush_lines=1)
+    assert segment == writer.segment
+    assert committed + len(_line(10)) == writer.committed
+    assert 12 == writer.torn_bytes
+    writer.write(_line(11))
+    writer.close()
+    assert b''.join(_line(i) for i in range(12)) == read_segment(segment)
+
+
+def test_recover_header_ahead(path):
+    writer = SegmentWriter(path, flush_lines=1, text=True)
+    for i in range(200):
+        writer.write(_line(i))
+    segment, committed = writer.segment, writer.committed
+    # The header was written back, but the last commit was lost
+    os.pwrite(writer._fd, SEG_HEADER.pack(SEG_MAGIC, SEG_VERSION, 0, 1,
+                                          committed + 100), 0)
+    _crash(writer)
+
+    writer = SegmentWriter(path, text=True)
+    assert committed == writer.committed
+    writer.close()
+    assert b''.join(_line(i) for i in range(200)) == read_segment(segment)
+
+
+def test_recover_binary_records(path):
+    records = [b'\x00\x01%c\x00\x00\xaa\x55\x00' % i for i in range(10)]
+    writer = SegmentWriter(path, terminator=b'', flush_lines=1)
+    for record in records:
+        writer.write(record)
+    segment = writer.segment
+    # A record written but not recorded in the header
+    os.pwrite(writer._fd, b'\x00\x00\xff', HEADER_SIZE + writer.committed)
+    _crash(writer)
+
+    writer = SegmentWriter(path, terminator=b'')
+    assert 80 == writer.committed
+    assert 3 == writer.torn_bytes
+    writer.write(b'\x01\x00')
+    writer.close()
+    assert b''.join(records) + b'\x01\x00' == read_segment(segment)
+
+
+def test_segmented_logger(path):
+    logger = DataLogger()
+    logger.set_context(MockAppContext())
+    logger.configure(logfile=path, segments={'size': 4096}, flush_lines=8)
+    lines = ['$UW,81242,-1948,557,4807924,%d' % i for i in range(500)]
+    logger.start()
+    for line in lines:
+        logger.put(line)
+    logger.exit(join=True)
+
+    assert not path.exists()
+    assert 1 < len(segment_paths(path))
+    data = b''.join(iter_segments(path)).decode()
+    assert lines == data.splitlines()
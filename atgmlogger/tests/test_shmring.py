@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import tty
+
+import pytest
+
+shmring = pytest.importorskip('atgmlogger.shmring')
+if shmring.shared_memory is None:
+    pytest.skip("multiprocessing.shared_memory is not available",
+                allow_module_level=True)
+
+LINE = b"$UW,81242,-1948,557,4807924,307,872,204,6978,7541,-70,305,266," \
+       b"4903912,0.000000,0.000000,0.0000,0.0000,00000000001646"
+
+
+@pytest.fixture
+def ring():
+    ring = shmring.ShmRing(capacity=1024)
+    yield ring
+    ring.close()
+
+
+def test_ring_put_get(ring):
+    assert [] == ring.get()
+    assert ring.put(LINE, 10, 20)
+    assert ring.put(b'', 11, 21)
+    assert [(LINE, 10, 20), (b'', 11, 21)] == ring.get()
+    assert 0 == len(ring)
+    assert 2 == ring.stats()['received']
+
+
+def test_ring_wrap(ring):
+    # Records of varying length wrap around the data region many times
+    expected = []
+    received = []
+    for i in range(200):
+        data = LINE[:i % len(LINE)]
+        assert ring.put(data, i, i)
+        expected.append((data, i, i))
+        if i % 3 == 0:
+            received.extend(ring.get())
+    received.extend(ring.get())
+    assert expected == received
+
+
+def test_ring_overflow(ring):
+    count = 0
+    while ring.put(LINE):
+        count += 1
+    assert not ring.put(LINE)
+    stats = ring.stats()
+    assert 1 == stats['overflows']
+    assert 2 == stats['dropped']
+    assert 2 * len(LINE) == stats['dropped_bytes']
+    assert count == len(ring.get())
+
+    # The ring accepts records again once the consumer has caught up
+    assert ring.put(LINE)
+    assert [LINE] == [data for data, _, _ in ring.get()]
+
+
+def test_ring_attach(ring):
+    other = shmring.ShmRing(name=ring.name)
+    try:
+        assert ring.capacity == other.capacity
+        ring.put(LINE, 1, 2)
+        assert [(LINE, 1, 2)] == other.get()
+    finally:
+        other.close()
+
+
+def test_process_listener():
+    pytest.importorskip('termios')
+    from atgmlogger.atgmlogger import ProcessListener
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    listener = ProcessListener({'port': os.ttyname(slave),
+                                'baudrate': 57600})
+    thread = threading.Thread(target=listener.listen)
+    thread.start()
+    try:
+        assert listener.ready.wait(timeout=5)
+        os.write(master, (LINE + b'\r\n') * 5)
+        for _ in range(5):
+            assert LINE.decode() == listener.collector.get(timeout=5)
+    finally:
+        listener.exit()
+        thread.join(timeout=5)
+        for fd in (master, slave):
+            os.close(fd)
+    assert not thread.is_alive()
+    assert not listener.process.is_alive()
+
+
+def test_process_listener_orphaned():
+    pytest.importorskip('termios')
+    from atgmlogger.atgmlogger import ProcessListener
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    listener = ProcessListener({'port': os.ttyname(slave),
+                                'baudrate': 57600})
+    try:
+        assert listener.ready.wait(timeout=5)
+        # As if the main process had died without stopping the listener
+        listener._lifeline.close()
+        listener.process.join(timeout=5)
+        assert 0 == listener.process.exitcode
+    finally:
+        listener.close()
+        for fd in (master, slave):
+            os.close(fd)
+
+
+def test_ring_collector_broken_pipe(ring):
+    from atgmlogger.atgmlogger import _RingCollector
+    from atgmlogger.dispatcher import Batch
+    bell_r, bell_w = os.pipe()
+    os.close(bell_r)
+    try:
+        with pytest.raises(SystemExit):
+            _RingCollector(ring, bell_w).put_nowait(Batch([LINE]))
+    finally:
+        os.close(bell_w)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+from pathlib import Path
+
+import pytest
+
+from atgmlogger.dispatcher import Batch, Command
+from atgmlogger.logger import DataLogger
+from atgmlogger.spill import SpillChannel
+
+LINE = "$UW,81242,-1948,557,4807924,307,872,204,6978,7541,-70,305,266," \
+       "4903912,0.000000,0.000000,0.0000,0.0000,{idx:014d}"
+SIZE = len(LINE.format(idx=0))
+
+
+def _drain(channel):
+    items = []
+    while not channel.empty():
+        items.append(channel.get_nowait())
+        channel.task_done()
+    return items
+
+
+def test_spill_channel(tmpdir):
+    path = Path(str(tmpdir)).joinpath('spill')
+    channel = SpillChannel(path, threshold=10 * SIZE)
+    lines = [LINE.format(idx=i) for i in range(100)]
+    for line in lines[:50]:
+        channel.put(line)
+    channel.put(Batch(lines[50:60]))
+    channel.put(Command('rotate'))
+    for line in lines[60:]:
+        channel.put(line)
+    channel.put(None)
+
+    assert channel.degraded
+    assert channel.filename.exists()
+    stats = channel.stats()
+    assert 10 == len(channel._memory)
+    assert 1 == stats['spill_events']
+    assert 90 * SIZE == stats['bytes_spilled']
+    assert 10 * SIZE == stats['high_water_bytes']
+    assert 93 == channel.qsize()
+
+    items = _drain(channel)
+    assert lines[:50] == items[:50]
+    assert lines[50:60] == list(items[50])
+    assert 'rotate' == items[51].cmd
+    assert lines[60:] == items[52:-1]
+    assert items[-1] is None
+    channel.join()
+
+    # Recovered once the segment is drained
+    assert not channel.degraded
+    assert not channel.filename.exists()
+    assert channel.stats()['degraded_time'] > 0
+    with pytest.raises(queue.Empty):
+        channel.get(timeout=0.01)
+
+
+def test_spill_channel_max_bytes(tmpdir):
+    channel = SpillChannel(str(tmpdir), threshold=2 * SIZE,
+                           max_bytes=5 * SIZE)
+    lines = [LINE.format(idx=i) for i in range(20)]
+    for line in lines:
+        channel.put(line)
+    # The segment is full, later items are kept in memory in order
+    assert 0 < channel.items_spilled < 18
+    assert lines == _drain(channel)
+    assert not channel.degraded
+
+
+def test_data_logger_spill(tmpdir):
+    log_file = Path(str(tmpdir.mkdir('logs'))).joinpath('gravdata.dat')
+    spill_dir = Path(str(tmpdir)).joinpath('spill')
+    stalled = threading.Event()
+    resume = threading.Event()
+
+    class StallingLogger(DataLogger):
+        def _write(self, item):
+            if not stalled.is_set():
+                stalled.set()
+                resume.wait(5)
+            super()._write(item)
+
+    logger = StallingLogger()
+    logger.set_context(type('Context', (), {'blink': lambda self: None})())
+    logger.configure(logfile=log_file, spill=dict(path=str(spill_dir),
+                                                  threshold=1000))
+    assert isinstance(logger.queue, SpillChannel)
+    assert 'gravdata.dat.spill' == logger.queue.filename.name
+
+    lines = [LINE.format(idx=i) for i in range(200)]
+    logger.start()
+    logger.put(lines[0])
+    assert stalled.wait(2)
+    for line in lines[1:]:
+        logger.put(line)
+    assert logger.queue.degraded
+    resume.set()
+    logger.exit(join=True)
+
+    with log_file.open('r') as fd:
+        assert lines == [line.strip() for line in fd]
+    stats = logger.stats()
+    assert stats['bytes_spilled'] > 0
+    assert not stats['degraded']
+
+
+def test_spill_channel_close_degraded(tmpdir):
+    channel = SpillChannel(str(tmpdir), threshold=2 * SIZE)
+    for i in range(10):
+        channel.put(LINE.format(idx=i))
+    assert channel.degraded
+    channel.close()
+    # Items which were not read back are kept on disk
+    assert channel.filename.exists()
+    assert channel.filename.stat().st_size > 0
+
+
+def test_data_logger_close_degraded(tmpdir):
+    log_file = Path(str(tmpdir.mkdir('logs'))).joinpath('gravdata.dat')
+    stalled = threading.Event()
+    resume = threading.Event()
+
+    class StallingLogger(DataLogger):
+        def _write(self, item):
+            if not stalled.is_set():
+                stalled.set()
+                resume.wait(5)
+            super()._write(item)
+
+    logger = StallingLogger()
+    logger.set_context(type('Context', (), {'blink': lambda self: None})())
+    logger.configure(logfile=log_file, spill=dict(path=str(tmpdir),
+                                                  threshold=1000))
+    lines = [LINE.format(idx=i) for i in range(200)]
+    logger.start()
+    logger.put(lines[0])
+    assert stalled.wait(2)
+    for line in lines[1:]:
+        logger.put(line)
+    assert logger.queue.degraded
+    # Shut down without waiting for the backlog, as on an interrupt
+    logger._exitSig.set()
+    resume.set()
+    logger.join(timeout=5)
+
+    with log_file.open('r') as fd:
+        assert lines == [line.strip() for line in fd]
+    assert not logger.queue.filename.exists()
+
+
+@pytest.mark.parametrize('runtime, fanout', [('asyncio', None),
+                                             (None, 'broadcast')])
+def test_spill_unsupported(tmpdir, caplog, runtime, fanout):
+    from atgmlogger.atgmlogger import _get_dispatcher
+    from atgmlogger.runconfig import rcParams
+    config = rcParams.config
+    saved = {key: config.get(key) for key in ('logging', 'dispatcher')}
+    try:
+        rcParams['logging'] = {'logdir': str(tmpdir), 'spill': str(tmpdir)}
+        rcParams['dispatcher'] = {'fanout': fanout}
+        dispatcher = _get_dispatcher(plugins={}, params={'port': 'loop://'},
+                                     private_registry=True, runtime=runtime)
+        dispatcher.detach_all()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                config.pop(key, None)
+            else:
+                config[key] = value
+    assert 'logging.spill is only supported' in caplog.text
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from atgmlogger.workers import WorkerPool
+
+
+class Job:
+    pass
+
+
+def test_worker_pool():
+    pool = WorkerPool(workers=2)
+    release = threading.Event()
+    done = threading.Event()
+    finished = []
+
+    def callback(key, error):
+        finished.append((key, error))
+        if len(finished) == 3:
+            done.set()
+
+    def fail():
+        raise ValueError("job failed")
+
+    assert pool.submit(Job, release.wait, callback)
+    assert pool.busy(Job)
+    # At most one job per key in flight
+    assert not pool.submit(Job, release.wait, callback)
+    assert pool.submit('other', lambda: None, callback)
+    assert pool.submit('failing', fail, callback)
+    release.set()
+    assert done.wait(2)
+
+    assert not pool.busy(Job)
+    assert 0 == pool.in_flight
+    assert (Job, None) in finished
+    assert isinstance(dict(finished)['failing'], ValueError)
+    stats = pool.stats()
+    assert 1 == stats['Job']['runs']
+    assert 1 == stats['Job']['rejected']
+    assert 1 == stats['failing']['errors']
+    assert stats['Job']['max_duration'] >= stats['Job']['mean_duration'] > 0
+    # The same worker threads run every job
+    assert 2 == len(pool._threads)
+
+    pool.shutdown(wait=True, timeout=1)
+    assert not any(thread.is_alive() for _, thread in pool._threads)
+    assert not pool.submit(Job, release.wait)
+
+
+def test_worker_pool_lanes():
+    lanes = {}
+    done = threading.Event()
+
+    def initializer(lane):
+        lanes[threading.current_thread().name] = lane
+
+    pool = WorkerPool(workers=1, initializer=initializer)
+    assert pool.submit(Job, lambda: None)
+    assert pool.submit('pinned', done.set, lane='usb')
+    assert done.wait(2)
+    pool.shutdown(wait=True, timeout=1)
+    # Each worker is initialized once, with its lane
+    assert {'DaemonWorker-0': None, 'DaemonWorker-usb': 'usb'} == lanes
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import pytest
+
+from atgmlogger.writers import GroupCommitWriter
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def path(tmpdir):
+    return Path(str(tmpdir)).joinpath('data.dat')
+
+
+def test_commit_bytes_and_lines(path):
+    writer = GroupCommitWriter(path, flush_bytes=32, flush_lines=4)
+    writer.write(b'0123456789\n')
+    writer.write(b'0123456789\n')
+    assert 22 == writer.pending
+    assert b'' == path.read_bytes()
+    # Bytes limit
+    writer.write(b'0123456789\n')
+    assert 0 == writer.pending
+    assert 33 == len(path.read_bytes())
+    # Lines limit
+    for _ in range(4):
+        writer.write(b'1\n')
+    assert 41 == len(path.read_bytes())
+    assert 2 == writer.writes
+    assert 33 == writer.stats()['max_unflushed_bytes']
+    writer.close()
+    assert writer.closed
+
+
+def test_commit_interval(path):
+    clock = FakeClock()
+    writer = GroupCommitWriter(path, flush_interval=0.5, clock=clock)
+    assert writer.timeout() is None
+    writer.write(b'line\n')
+    clock.now += 0.2
+    writer.write(b'line\n')
+    assert pytest.approx(0.3) == writer.timeout()
+    writer.service()
+    assert b'' == path.read_bytes()
+
+    clock.now += 0.4
+    assert 0 == writer.timeout()
+    writer.service()
+    assert b'line\nline\n' == path.read_bytes()
+    assert writer.timeout() is None
+    assert pytest.approx(0.6) == writer.stats()['max_unflushed_time']
+    writer.close()
+
+
+def test_sync_interval(path, monkeypatch):
+    synced = []
+    monkeypatch.setattr('atgmlogger.writers._fdatasync', synced.append)
+    clock = FakeClock()
+    writer = GroupCommitWriter(path, flush_lines=1, sync_interval=2.0,
+                               clock=clock)
+    writer.write(b'line\n')
+    assert [] == synced
+    # The sync is due sync_interval after the oldest unsynced commit
+    assert pytest.approx(2.0) == writer.timeout()
+    clock.now += 1.0
+    writer.write(b'line\n')
+    assert pytest.approx(1.0) == writer.timeout()
+    clock.now += 1.0
+    writer.service()
+    assert [writer.fileno()] == synced
+    assert writer.timeout() is None
+    assert pytest.approx(2.0) == writer.stats()['max_unsynced_time']
+
+    # Every commit is synced with a 0 interval
+    writer.sync_interval = 0
+    writer.write(b'line\n')
+    assert 2 == len(synced)
+    writer.close()
+    assert 2 == writer.syncs
+
+
+def test_reopen(path):
+    writer = GroupCommitWriter(path, flush_lines=10)
+    writer.write(b'before\n')
+    rotated = path.with_name('data.dat.1')
+    path.rename(rotated)
+    writer.reopen()
+    writer.write(b'after\n')
+    writer.close()
+    assert b'before\n' == rotated.read_bytes()
+    assert b'after\n' == path.read_bytes()
+    assert 13 == writer.bytes_written
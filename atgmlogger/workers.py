@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import time
+import queue
+import logging
+import threading
+
+__all__ = ['WorkerPool']
+LOG = logging.getLogger(__name__)
+
+
+class _JobStats:
+    __slots__ = ['runs', 'rejected', 'errors', 'wait', 'max_wait',
+                 'duration', 'max_duration']
+
+    def __init__(self):
+        self.runs = 0
+        self.rejected = 0
+        self.errors = 0
+        self.wait = 0.0
+        self.max_wait = 0.0
+        self.duration = 0.0
+        self.max_duration = 0.0
+
+    def as_dict(self) -> dict:
+        runs = self.runs or 1
+        return dict(runs=self.runs, rejected=self.rejected,
+                    errors=self.errors, mean_wait=self.wait / runs,
+                    max_wait=self.max_wait,
+                    mean_duration=self.duration / runs,
+                    max_duration=self.max_duration)
+
+
+class WorkerPool:
+    """
+    Small persistent pool of worker threads used to run daemon plugin jobs,
+    so a trigger does not create (and later reap) a thread of its own.
+
+    Each job is submitted with a key (the daemon class); at most one job per
+    key is queued or running at a time, a submission for a busy key is
+    rejected. When a job finishes its callback (if any) is called from the
+    worker thread with the key and the exception raised by the job, or None.
+
+    The time each job waited for a worker and the time it ran for are
+    recorded per key, see :meth:`stats`.
+
+    A job may be submitted to a `lane`, the jobs of each lane are run by a
+    dedicated worker thread (started on the first submission to the lane)
+    instead of the shared workers. Every worker calls `initializer` with
+    its lane (None for the shared workers) when it starts, e.g. to apply a
+    CPU/scheduling policy once to the thread rather than per job.
+
+    A pool which has been shut down rejects every submission, it cannot be
+    restarted.
+
+    Parameters
+    ----------
+    workers : int, Optional
+        Number of shared worker threads, started on the first submission
+    name : str, Optional
+        Worker thread name prefix
+    initializer : Callable[[lane], None], Optional
+        Called by each worker thread when it starts
+
+    """
+    def __init__(self, workers=2, name='DaemonWorker', initializer=None):
+        self.workers = max(1, int(workers))
+        self.name = name
+        self.initializer = initializer
+        self._jobs = {None: queue.Queue()}  # Dict[lane: Queue]
+        self._threads = []
+        self._shared = 0
+        self._in_flight = set()
+        self._stats = {}  # Dict[key: _JobStats]
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def busy(self, key) -> bool:
+        return key in self._in_flight
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def submit(self, key, func, callback=None, lane=None) -> bool:
+        """Queue func() to be run by a worker (of `lane` if specified),
+        returns False if a job for key is already in flight or the pool is
+        shut down."""
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _JobStats()
+            if self._closed or key in self._in_flight:
+                stats.rejected += 1
+                return False
+            self._in_flight.add(key)
+            jobs = self._jobs.get(lane)
+            if jobs is None:
+                jobs = self._jobs[lane] = queue.Queue()
+                self._start_worker(lane)
+            elif lane is None and self._shared < self.workers:
+                self._shared += 1
+                self._start_worker(None)
+        jobs.put((key, func, callback, time.monotonic()))
+        return True
+
+    def _start_worker(self, lane):
+        suffix = len(self._threads) if lane is None else lane
+        thread = threading.Thread(target=self._work, args=(lane,),
+                                  daemon=True,
+                                  name='%s-%s' % (self.name, suffix))
+        thread.start()
+        self._threads.append((lane, thread))
+
+    def _work(self, lane):
+        if self.initializer is not None:
+            try:
+                self.initializer(lane)
+            except Exception:
+                LOG.exception("Exception initializing worker thread")
+        jobs = self._jobs[lane]
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            key, func, callback, queued = job
+            started = time.monotonic()
+            error = None
+            try:
+                func()
+            except Exception as e:
+                error = e
+                LOG.exception("Exception in daemon job %s", str(key))
+            finished = time.monotonic()
+            with self._lock:
+                self._in_flight.discard(key)
+                stats = self._stats[key]
+                stats.runs += 1
+                stats.errors += error is not None
+                stats.wait += started - queued
+                stats.max_wait = max(stats.max_wait, started - queued)
+                stats.duration += finished - started
+                stats.max_duration = max(stats.max_duration,
+                                         finished - started)
+            if callback is not None:
+                try:
+                    callback(key, error)
+                except Exception:
+                    LOG.exception("Exception in daemon job callback")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {getattr(key, '__name__', str(key)): stats.as_dict()
+                    for key, stats in self._stats.items()}
+
+    def shutdown(self, wait=False, timeout=None):
+        """Stop the workers after the queued jobs have run"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        for lane, _ in threads:
+            self._jobs[lane].put(None)
+        if wait:
+            for _, thread in threads:
+                thread.join(timeout=timeout)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# This file is part of ATGMLogger https://github.com/bradyzp/atgmlogger
+
+import os
+import time
+import logging
+from pathlib import Path
+
+__all__ = ['GroupCommitWriter']
+LOG = logging.getLogger(__name__)
+
+_fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+
+class GroupCommitWriter:
+    """
+    File writer which commits data in groups.
+
+    Written data accumulates in a memory buffer, which is written to the
+    file with a single write syscall (a group commit) when it holds
+    `flush_bytes` bytes or `flush_lines` lines, or when the oldest data in
+    it is `flush_interval` seconds old. The time based flush is performed by
+    :meth:`service`, which the owner calls when :meth:`timeout` expires.
+
+    If `sync_interval` is set the file is fdatasync'ed once the oldest data
+    written since the last sync is `sync_interval` seconds old (0 syncs
+    after every commit), and when the file is closed.
+
+    Data at risk
+    ------------
+    Data is lost if the process dies while it is buffered, i.e. for at most
+    flush_interval seconds (plus the time to write it). After a power cut,
+    data is on the storage device at most flush_interval + sync_interval
+    seconds (plus the write and sync time) after it was written. Without a
+    sync_interval this is left to the kernel writeback, on Linux up to
+    vm.dirty_expire_centisecs (30 s by default) plus the writeback interval.
+    The observed worst cases are reported by :meth:`stats` as
+    max_unflushed_time and max_unsynced_time.
+
+    Parameters
+    ----------
+    path : str or Path
+        File to write, it is created or truncated
+    flush_bytes : int, Optional
+        Buffered bytes which trigger a commit
+    flush_lines : int, Optional
+        Buffered lines which trigger a commit, 0 for no line limit
+    flush_interval : float, Optional
+        Maximum seconds data is buffered
+    sync_interval : float, Optional
+        Maximum seconds between a commit and the fdatasync which makes it
+        durable, default None does not sync
+
+    """
+    def __init__(self, path, flush_bytes=64 * 1024, flush_lines=0,
+                 flush_interval=1.0, sync_interval=None, clock=time.monotonic):
+        self.path = Path(str(path))
+        self.flush_bytes = flush_bytes
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval
+        self._clock = clock
+        self._fd = None
+        self._buffer = bytearray()
+        self._lines = 0
+        # Times of the oldest unflushed and the oldest unsynced data
+        self._first_write = None
+        self._first_unsynced = None
+
+        self.writes = 0
+        self.flushes = 0
+        self.bytes_written = 0
+        self.write_time = 0.0
+        self.syncs = 0
+        self.sync_time = 0.0
+        self.errors = 0
+        self.max_unflushed_time = 0.0
+        self.max_unflushed_bytes = 0
+        self.max_unsynced_time = 0.0
+
+        self.open()
+
+    @property
+    def name(self) -> str:
+        return str(self.path)
+
+    @property
+    def closed(self) -> bool:
+        return self._fd is None
+
+    @property
+    def pending(self) -> int:
+        """Buffered bytes not yet written to the file"""
+        return len(self._buffer)
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def open(self):
+        self._fd = os.open(str(self.path),
+                           os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+
+    def write(self, data, lines=1):
+        """Buffer data (bytes) containing `lines` lines, committing the
+        buffer if it is full"""
+        if not self._buffer:
+            self._first_write = self._clock()
+        self._buffer += data
+        self._lines += lines
+        if len(self._buffer) >= self.flush_bytes or \
+                (self.flush_lines and self._lines >= self.flush_lines):
+            self.flush()
+
+    def flush(self):
+        """Write the buffer to the file, and sync it if due"""
+        if not self._buffer:
+            return
+        size = len(self._buffer)
+        start = self._clock()
+        view = memoryview(self._buffer)
+        try:
+            self._write(view)
+        except OSError:
+            # The data is dropped, as a line buffered file would
+            self.errors += 1
+            raise
+        finally:
+            view.release()
+            now = self._clock()
+            self.write_time += now - start
+            self.max_unflushed_time = max(self.max_unflushed_time,
+                                          now - self._first_write)
+            self.max_unflushed_bytes = max(self.max_unflushed_bytes, size)
+            if self._first_unsynced is None:
+                self._first_unsynced = self._first_write
+            del self._buffer[:]
+            self._lines = 0
+            self._first_write = None
+        self.flushes += 1
+        self.bytes_written += size
+        if self._sync_due(now):
+            self.sync()
+
+    def _write(self, view):
+        written = 0
+        while written < len(view):
+            written += os.write(self._fd, view[written:])
+            self.writes += 1
+
+    def _sync_due(self, now) -> bool:
+        return self.sync_interval is not None and \
+            self._first_unsynced is not None and \
+            now >= self._first_unsynced + self.sync_interval
+
+    def sync(self):
+        """fdatasync the data written to the file"""
+        if self._first_unsynced is None or self._fd is None:
+            return
+        start = self._clock()
+        _fdatasync(self._fd)
+        now = self._clock()
+        self.syncs += 1
+        self.sync_time += now - start
+        self.max_unsynced_time = max(self.max_unsynced_time,
+                                     now - self._first_unsynced)
+        self._first_unsynced = None
+
+    def deadline(self):
+        """Monotonic time of the next time based flush or sync, or None"""
+        deadlines = []
+        if self._first_write is not None:
+            deadlines.append(self._first_write + (self.flush_interval or 0))
+        if self.sync_interval is not None and \
+                self._first_unsynced is not None:
+            deadlines.append(self._first_unsynced + self.sync_interval)
+        return min(deadlines) if deadlines else None
+
+    def timeout(self):
+        """Seconds until :meth:`service` is due, or None"""
+        deadline = self.deadline()
+        if deadline is None:
+            return None
+        return max(0, deadline - self._clock())
+
+    def service(self):
+        """Perform the time based flush and sync which are due"""
+        now = self._clock()
+        if self._first_write is not None and \
+                now >= self._first_write + (self.flush_interval or 0):
+            self.flush()
+        elif self._sync_due(now):
+            self.sync()
+
+    def reopen(self):
+        """Commit and close the file, then create it again (e.g. after the
+        file was rotated)"""
+        self.close()
+        self.open()
+
+    def close(self):
+        if self._fd is None:
+            return
+        try:
+            self.flush()
+            if self.sync_interval is not None:
+                self.sync()
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._first_unsynced = None
+
+    def stats(self) -> dict:
+        return dict(pending_bytes=len(self._buffer), writes=self.writes,
+                    flushes=self.flushes, bytes_written=self.bytes_written,
+                    syncs=self.syncs, errors=self.errors,
+                    write_time=self.write_time, sync_time=self.sync_time,
+                    max_unflushed_time=self.max_unflushed_time,
+                    max_unflushed_bytes=self.max_unflushed_bytes,
+                    max_unsynced_time=self.max_unsynced_time)
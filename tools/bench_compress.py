@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+# coding: utf-8
+"""Compare the CPU cost and file size of the compressing DataLogger sink
+(gzip, bz2, lzma) with the plain group commit writer.
+
+An hour (by default) of AT1M lines is written at each line rate, committing
+(a flush point) every BLOCK seconds of data. The CPU time is reported as a
+share of one core at that line rate."""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from atgmlogger.writers import GroupCommitWriter  # noqa: E402
+from atgmlogger.compression import CompressingWriter  # noqa: E402
+
+SAMPLE = Path(__file__).resolve().parents[1].joinpath(
+    'atgmlogger', 'tests', 'data', 'raw_sample_nosync.txt')
+
+
+def sample_lines():
+    with SAMPLE.open('rb') as fd:
+        return [line.strip() + b'\n' for line in fd if line.strip()]
+
+
+def bench(lines, rate, duration, block, method, level=None):
+    count = int(rate * duration)
+    options = dict(flush_lines=max(1, int(rate * block)),
+                   flush_bytes=1024 ** 3)
+    with tempfile.TemporaryDirectory() as logdir:
+        path = Path(logdir).joinpath('gravdata.dat')
+        if method is None:
+            writer = GroupCommitWriter(path, **options)
+        else:
+            writer = CompressingWriter(path, method=method, level=level,
+                                       **options)
+        start = time.process_time()
+        for i in range(count):
+            writer.write(lines[i % len(lines)])
+        writer.close()
+        cpu = time.process_time() - start
+        size = writer.path.stat().st_size
+    return cpu, writer.bytes_written, size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog="bench_compress", description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-d', '--duration', type=int, default=3600,
+                        help="Seconds of data written at each rate")
+    parser.add_argument('-r', '--rate', type=int, nargs='+',
+                        default=[10, 100])
+    parser.add_argument('-b', '--block', type=float, nargs='+',
+                        default=[1, 10, 60],
+                        help="Seconds of data per flush point")
+    opts = parser.parse_args(sys.argv[1:])
+
+    lines = sample_lines()
+    for rate in opts.rate:
+        print("%d Hz, %d s of data:" % (rate, opts.duration))
+        for block in opts.block:
+            base_cpu, raw, _ = bench(lines, rate, opts.duration, block, None)
+            print("  flush every %g s (%d lines)" % (block,
+                                                     max(1, rate * block)))
+            print("    %-6s cpu %7.3f s (%6.3f%% core)  %10d bytes" % (
+                'plain', base_cpu, 100 * base_cpu / opts.duration, raw))
+            for method in ['gzip', 'bz2', 'lzma']:
+                cpu, raw, size = bench(lines, rate, opts.duration, block,
+                                       method)
+                print("    %-6s cpu %7.3f s (%6.3f%% core)  %10d bytes  "
+                      "ratio %5.1fx  +%.1f us/line" % (
+                          method, cpu, 100 * cpu / opts.duration, size,
+                          raw / size,
+                          1e6 * (cpu - base_cpu) / (rate * opts.duration)))
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+# coding: utf-8
+"""Microbenchmark comparing the original list-comprehension based
+SerialListener.decode with the translate table Sanitizer."""
+
+import sys
+import timeit
+import argparse
+import itertools
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from atgmlogger.sanitize import Sanitizer  # noqa: E402
+
+SAMPLE = Path(__file__).resolve().parents[1].joinpath(
+    'atgmlogger', 'tests', 'data', 'raw_sample_nosync.txt')
+# AT1A (airborne) raw line with GPS week and seconds of week
+AT1A_LINES = [
+    b'$UW,81251,2489,4779,4807953,307,874,201,-8919,7232,211,1984,'
+    b'596080.000\r\n',
+    b'$UW,81248,-1883,1279,4807928,308,885,206,6749,7414,-118,1984,'
+    b'596080.100\r\n',
+]
+ILLEGAL_CHARS = list(itertools.chain(range(0, 32), [255, 256]))
+
+
+def legacy_decode(bytearr, encoding='utf-8'):
+    if isinstance(bytearr, str):
+        return bytearr
+    try:
+        raw = bytes([c for c in bytearr if c not in ILLEGAL_CHARS])
+        decoded = raw.decode(encoding, errors='ignore').strip('\r\n')
+    except AttributeError:
+        decoded = None
+    return decoded
+
+
+def at1m_lines():
+    with SAMPLE.open('rb') as fd:
+        return [line for line in fd if line.strip()][:100]
+
+
+def bench(name, lines, number):
+    def run_legacy():
+        for line in lines:
+            legacy_decode(line)
+
+    results = {}
+    for policy in ['strip', 'replace', 'reject']:
+        sanitizer = Sanitizer(policy=policy)
+
+        def run_new():
+            for line in lines:
+                sanitizer.decode(line)
+        results[policy] = min(timeit.repeat(run_new, number=number, repeat=5))
+
+    legacy = min(timeit.repeat(run_legacy, number=number, repeat=5))
+    per_line = 1e6 / (number * len(lines))
+    print("%s (%d lines x %d):" % (name, len(lines), number))
+    print("  legacy          %8.3f us/line" % (legacy * per_line))
+    for policy, result in results.items():
+        print("  %-15s %8.3f us/line  (%.1fx)" % (
+            policy, result * per_line, legacy / result))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog="bench_decode", description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--number', type=int, default=200)
+    opts = parser.parse_args(sys.argv[1:])
+
+    marine = at1m_lines()
+    bench("AT1M", marine, opts.number)
+    bench("AT1A", AT1A_LINES * 50, opts.number)
+    dirty = [b'\xff\x01' + line[:40] + b'\x00' + line[40:] for line in marine]
+    bench("AT1M with noise", dirty, opts.number)
@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+# coding: utf-8
+"""Compare CPU time, context switches and thread count of the threaded
+Dispatcher and the asyncio runtime (AsyncDispatcher), logging lines written
+to a pseudo terminal at a fixed rate.
+
+Each runtime is run in a forked process, the data source is another
+process so that only the logger is measured."""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import resource
+import tempfile
+import tty
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import serial  # noqa: E402
+
+from atgmlogger.aio import AsyncDispatcher  # noqa: E402
+from atgmlogger.atgmlogger import SerialListener  # noqa: E402
+from atgmlogger.dispatcher import Dispatcher  # noqa: E402
+from atgmlogger.logger import DataLogger  # noqa: E402
+
+LINE = b"$UW,81242,-1948,557,4807924,307,872,204,6978,7541,-70,305,266," \
+       b"4903912,0.000000,0.000000,0.0000,0.0000,00000000001646\r\n"
+
+
+def _threads(pid) -> int:
+    with open('/proc/%d/status' % pid) as fd:
+        for line in fd:
+            if line.startswith('Threads:'):
+                return int(line.split()[1])
+    return 0
+
+
+def _writer(master, rate, duration):
+    period = 1.0 / rate
+    deadline = time.monotonic() + duration
+    next_t = time.monotonic()
+    # Don't block once the logger has exited and stopped reading
+    os.set_blocking(master, False)
+    while next_t < deadline:
+        try:
+            os.write(master, LINE)
+        except BlockingIOError:
+            pass
+        next_t += period
+        time.sleep(max(0, next_t - time.monotonic()))
+    os._exit(0)
+
+
+def _logger(runtime, slave, logdir, duration, report):
+    hdl = serial.Serial(os.ttyname(slave), baudrate=57600)
+    logfile = Path(logdir).joinpath('%s.dat' % runtime)
+    if runtime == 'asyncio':
+        dispatcher = AsyncDispatcher(private_registry=True)
+        dispatcher.register(DataLogger, logfile=logfile)
+        dispatcher.attach(SerialListener(
+            hdl, collector=dispatcher.message_queue))
+        signal.signal(signal.SIGALRM, lambda *args: dispatcher.exit())
+        signal.alarm(duration)
+        dispatcher.run()
+    else:
+        dispatcher = Dispatcher(private_registry=True)
+        dispatcher.register(DataLogger, logfile=logfile)
+        listener = SerialListener(hdl, collector=dispatcher.message_queue)
+
+        # Only set the exit flag in the handler, the main thread may hold
+        # the collector queue lock when the signal arrives
+        signal.signal(signal.SIGALRM, lambda *args: listener.sigExit.set())
+        signal.alarm(duration)
+        dispatcher.start()
+        listener.listen()
+        dispatcher.exit(join=True)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    os.write(report, ("%f %f %d %d\n" % (
+        usage.ru_utime, usage.ru_stime, usage.ru_nvcsw,
+        usage.ru_nivcsw)).encode())
+    os._exit(0)
+
+
+def bench(runtime, rate, duration):
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    report_r, report_w = os.pipe()
+    with tempfile.TemporaryDirectory() as logdir:
+        logger = os.fork()
+        if logger == 0:
+            _logger(runtime, slave, logdir, duration, report_w)
+        time.sleep(0.5)
+        writer = os.fork()
+        if writer == 0:
+            _writer(master, rate, duration + 1)
+
+        time.sleep(duration / 2)
+        threads = _threads(logger)
+        os.waitpid(logger, 0)
+        os.waitpid(writer, 0)
+    utime, stime, nvcsw, nivcsw = os.read(report_r, 256).split()
+    for fd in (master, slave, report_r, report_w):
+        os.close(fd)
+    cpu = float(utime) + float(stime)
+    print("  %-8s %5d Hz  cpu %6.3f s (%5.2f%%)  ctx switches %6d  "
+          "threads %d" % (runtime, rate, cpu, 100 * cpu / duration,
+                          int(nvcsw) + int(nivcsw), threads))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog="bench_runtime", description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-d', '--duration', type=int, default=10)
+    parser.add_argument('-r', '--rate', type=int, nargs='+',
+                        default=[10, 100, 1000])
+    opts = parser.parse_args(sys.argv[1:])
+
+    for rate in opts.rate:
+        for runtime in ['threaded', 'asyncio']:
+            bench(runtime, rate, opts.duration)